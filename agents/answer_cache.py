@@ -0,0 +1,253 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from schema import State
+from tools.db_tools import aget_data_version
+from tools.schema_catalog import aget_catalog
+from tools.schema_index import get_schema_index
+from utilis.executor import run_blocking
+
+# State keys replayed on a cache hit
+CACHED_KEYS = [
+    "intent_summary", "assumptions", "tables", "plan",
+    "sql_query", "safe_sql_query", "data", "result_columns", "truncated", "final_response"
+]
+
+
+def normalize_query(query: str) -> str:
+    """Lower-cases and strips punctuation so trivially different phrasings share a key."""
+    return " ".join(re.sub(r"[^\w\s]", " ", (query or "").lower()).split())
+
+
+# Words that flip the answer while barely moving the embedding, grouped by what they mean
+DIRECTIONS = {
+    "rank:high": r"highest|largest|biggest|greatest|best|top|most|max(?:imum)?",
+    "rank:low": r"lowest|smallest|least|fewest|worst|bottom|min(?:imum)?",
+    "cmp:gt": r"above|over|greater|more than|higher than|exceed(?:s|ed|ing)?",
+    "cmp:lt": r"below|under|less than|fewer than|lower than",
+    "order:asc": r"asc(?:ending)?",
+    "order:desc": r"desc(?:ending)?",
+    "trend:up": r"increas(?:e|ed|es|ing)|grow(?:th|n|s|ing)?|grew|ris(?:e|es|ing)|rose|gain(?:s|ed)?",
+    "trend:down": r"decreas(?:e|ed|es|ing)|declin(?:e|ed|es|ing)|f[ae]ll(?:s|ing)?|drop(?:s|ped)?",
+}
+DIRECTION_PATTERNS = {tag: re.compile(rf"\b(?:{words})\b", re.IGNORECASE) for tag, words in DIRECTIONS.items()}
+
+
+def literal_signature(query: str, metrics=()) -> frozenset:
+    """
+    Numbers and ticker-like tokens of the question, its direction and comparator words, and the
+    schema columns it asks about. Embeddings barely separate "AAPL 2022" from "MSFT 2023" or
+    "highest revenue" from "lowest revenue", so a semantic match is only accepted when these agree exactly.
+    """
+    literals = set(re.findall(r"\b(?:\d[\d.,]*|[A-Z]{2,5})\b", query or ""))
+    literals |= {tag for tag, pattern in DIRECTION_PATTERNS.items() if pattern.search(query or "")}
+    return frozenset(literals | {f"col:{column}" for column in metrics})
+
+
+async def question_signature(query: str) -> frozenset:
+    try:
+        metrics = get_schema_index(await aget_catalog()).metric_columns(query)
+    except Exception as e:
+        print(f"[CACHE] Schema index unavailable for the signature: {e}")
+        metrics = ()
+    return literal_signature(query, metrics)
+
+
+class AnswerCache:
+    """
+    Bounded LRU of full pipeline results keyed on (data version, normalised resolved query).
+    Entries expire after `ttl` seconds; a miss on the exact key falls back to the most similar
+    cached question of the same data version and literal signature when its embedding
+    similarity reaches `similarity`.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 3600, similarity: float = 0.95):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._embeddings: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+
+    def remember_embedding(self, query: str, embedding):
+        """Keeps the lookup-time embedding so the later store does not have to recompute it."""
+        with self._lock:
+            self._embeddings[query] = np.asarray(embedding, dtype=np.float32)
+            self._embeddings.move_to_end(query)
+            while len(self._embeddings) > self.max_size:
+                self._embeddings.popitem(last=False)
+
+    def get(self, query: str, version: str, signature: frozenset = frozenset()) -> dict | None:
+        now = time.monotonic()
+        key = f"{version}|{query}"
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["stored_at"] > self.ttl:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["exact_hits"] += 1
+                return entry["payload"]
+
+            match = self._nearest(query, version, signature, now)
+            if match is not None:
+                self._entries.move_to_end(match)
+                self.stats["semantic_hits"] += 1
+                return self._entries[match]["payload"]
+
+            self.stats["misses"] += 1
+            return None
+
+    def _nearest(self, query: str, version: str, signature: frozenset, now: float) -> str | None:
+        embedding = self._embeddings.get(query)
+        if embedding is None:
+            return None
+        candidates = [
+            (key, entry["embedding"]) for key, entry in self._entries.items()
+            if entry["version"] == version and entry["signature"] == signature
+            and entry["embedding"] is not None and now - entry["stored_at"] <= self.ttl
+        ]
+        if not candidates:
+            return None
+
+        matrix = np.stack([vector for _, vector in candidates])
+        scores = matrix @ embedding / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(embedding) + 1e-12)
+        best = int(np.argmax(scores))
+        return candidates[best][0] if scores[best] >= self.similarity else None
+
+    def put(self, query: str, version: str, payload: dict, signature: frozenset = frozenset()):
+        key = f"{version}|{query}"
+        with self._lock:
+            self._entries[key] = {
+                "version": version,
+                "signature": signature,
+                "embedding": self._embeddings.get(query),
+                "payload": payload,
+                "stored_at": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            self.stats["stores"] += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._embeddings.clear()
+
+    def snapshot_stats(self) -> dict:
+        with self._lock:
+            lookups = self.stats["exact_hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+            hits = self.stats["exact_hits"] + self.stats["semantic_hits"]
+            return {
+                **self.stats,
+                "size": len(self._entries),
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SEMANTIC_MATCHING = os.getenv("ANSWER_CACHE_SEMANTIC", "true").lower() in ("1", "true", "yes")
+
+answer_cache = AnswerCache(
+    max_size=int(os.getenv("ANSWER_CACHE_SIZE", 512)),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", 3600)),
+    similarity=float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95)),
+)
+
+# The data version query is cheap, but there is no need to run it on every request
+_VERSION = {"value": None, "checked_at": 0.0}
+VERSION_CHECK_INTERVAL = float(os.getenv("ANSWER_CACHE_VERSION_INTERVAL", 30))
+
+
+async def current_version() -> str:
+    """Schema fingerprint plus the latest metadata_versions row; any change invalidates cached answers."""
+    catalog = await aget_catalog()
+    if time.monotonic() - _VERSION["checked_at"] >= VERSION_CHECK_INTERVAL:
+        try:
+            _VERSION["value"] = await aget_data_version()
+        except Exception as e:
+            print(f"[CACHE] Data version check failed: {e}")
+            _VERSION["value"] = None
+        _VERSION["checked_at"] = time.monotonic()
+    return f"{catalog['fingerprint']}:{_VERSION['value']}"
+
+
+# Background load of the embedding model started by the first lookup when no warm-up runs
+_MODEL_LOAD: dict = {"task": None}
+
+
+def _load_finished(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"[CACHE] Embedding model failed to load, semantic matching stays off: {task.exception()}")
+
+
+async def _embed(query: str):
+    from rag.embeddings import embeddings_loaded, get_embeddings
+    from rag.warmup import rag_warmup
+    # Never wait for the model here (loading may download it): until it is loaded, by the warm-up
+    # or by the background load started below, lookups are exact only
+    if not embeddings_loaded():
+        if not rag_warmup.active and _MODEL_LOAD["task"] is None:
+            _MODEL_LOAD["task"] = asyncio.create_task(run_blocking(get_embeddings))
+            _MODEL_LOAD["task"].add_done_callback(_load_finished)
+        raise RuntimeError("embedding model is still loading")
+    return await run_blocking(lambda: get_embeddings().embed_query(query))
+
+
+async def cache_lookup_node(state: State):
+    if not ANSWER_CACHE_ENABLED:
+        return {"cache_hit": False}
+
+    raw_query = state.get("resolved_query") or state.get("user_query", "")
+    query = normalize_query(raw_query)
+    try:
+        version = await current_version()
+    except Exception as e:
+        print(f"[CACHE] Lookup skipped: {e}")
+        return {"cache_hit": False, "cache_version": ""}
+
+    if SEMANTIC_MATCHING:
+        try:
+            answer_cache.remember_embedding(query, await _embed(query))
+        except Exception as e:
+            print(f"[CACHE] Embedding unavailable, exact matching only: {e}")
+
+    payload = answer_cache.get(query, version, await question_signature(raw_query))
+    if payload is None:
+        return {"cache_hit": False, "cache_version": version}
+
+    print(f"[CACHE] Answer cache hit for: {query}")
+    return {**payload, "route": "SQL_QUERY", "error": "", "cache_hit": True, "cache_version": version}
+
+
+async def cache_store_node(state: State):
+    if not ANSWER_CACHE_ENABLED or state.get("cache_hit") or not state.get("cache_version"):
+        return {}
+    # Only successful database answers are stable enough to reuse; answers shaped by a
+    # clarification choice belong to that conversation
+    if state.get("route") != "SQL_QUERY" or state.get("error") or not state.get("data") or state.get("human_choice"):
+        return {}
+
+    raw_query = state.get("resolved_query") or state.get("user_query", "")
+    answer_cache.put(
+        normalize_query(raw_query),
+        state["cache_version"],
+        {key: state.get(key) for key in CACHED_KEYS},
+        await question_signature(raw_query)
+    )
+    return {}
+
+
+def route_after_cache(state: State):
+    return "hit" if state.get("cache_hit") else "miss"
@@ -1,18 +1,36 @@
+import os
+
 from utilis.get_llm import get_llm
+from utilis.token_usage import CHARS_PER_TOKEN
 from schema import State
 
-def answer_generator(state: State):
-    llm = get_llm()
+# Prompt budget for the result table, in tokens
+ANSWER_DATA_TOKENS = int(os.getenv("ANSWER_DATA_TOKENS", 2000))
 
-    data = state.get("data", [])
-    
-    raw_data_str = str(data)
-    limit = 8000 * 4 
-    
-    if len(raw_data_str) > limit:
-        truncated_data = raw_data_str[:limit] + "\n... [Data Truncated for Length] ..."
-    else:
-        truncated_data = raw_data_str
+def format_rows(data, columns=None, limit=ANSWER_DATA_TOKENS * CHARS_PER_TOKEN):
+    """Renders result rows as a pipe-separated table, stopping at `limit` characters."""
+    if not data:
+        return "No rows returned."
+    names = [col["name"] for col in columns] if columns else list(data[0].keys())
+
+    lines = [" | ".join(names)]
+    size = len(lines[0])
+    for i, row in enumerate(data):
+        line = " | ".join("NULL" if row.get(name) is None else str(row.get(name)) for name in names)
+        size += len(line) + 1
+        if size > limit:
+            lines.append(f"... [{len(data) - i} more rows truncated for length] ...")
+            break
+        lines.append(line)
+    return "\n".join(lines)
+
+async def answer_generator(state: State):
+    llm = get_llm(agent="answer")
+
+    data = state.get("data") or []
+    truncated_data = format_rows(data, state.get("result_columns"))
+    if state.get("truncated"):
+        truncated_data += f"\n(Result capped at {len(data)} rows by the server.)"
 
     query_to_use = state.get("resolved_query") or state.get("user_query", "")
     route = state.get("route", "SQL_QUERY")
@@ -53,7 +71,7 @@ def answer_generator(state: State):
     - Do NOT include any meta-instructions or parentheticals in the final output.
     """
 
-    ai_response = llm.invoke(prompt).content
+    ai_response = (await llm.ainvoke(prompt)).content
 
     return {
         "final_response": ai_response
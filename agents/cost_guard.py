@@ -0,0 +1,56 @@
+import os
+
+from schema import State
+from tools.connect_db import connect_db
+from tools.db_tools import aexplain_query
+
+COST_GUARD_ENABLED = os.getenv("COST_GUARD_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def _thresholds():
+    return (
+        float(os.getenv("MAX_QUERY_COST", 500_000)),
+        float(os.getenv("MAX_QUERY_ROWS", 1_000_000)),
+    )
+
+
+async def cost_guard_node(state: State):
+    """
+    Asks the Postgres planner for an estimate before anything runs. Queries whose estimated
+    cost, or any intermediate row count, exceeds the thresholds go back to the generator.
+    """
+    if not COST_GUARD_ENABLED:
+        return {}
+
+    print("\n[COST GUARD] Node: Explaining SQL")
+    query = state.get("safe_sql_query") or state.get("sql_query")
+    attempts = state.get("validation_retries", 0)
+
+    try:
+        estimate = await aexplain_query(query, connect_db())
+    except Exception as e:
+        # The planner already rejects bad casts, unknown functions etc. without executing anything
+        message = str(getattr(e, "orig", None) or e)
+        print(f"[COST GUARD] EXPLAIN failed: {message}")
+        return {
+            "ready": False,
+            "error": f"Database Planning Error: {message}",
+            "error_source": "cost_guard",
+            "validation_retries": attempts + 1,
+        }
+
+    max_cost, max_rows = _thresholds()
+    print(f"[COST GUARD] Estimated cost {estimate['total_cost']:.0f}, largest step {estimate['max_rows']} rows ({estimate['heaviest_node']})")
+    if estimate["total_cost"] <= max_cost and estimate["max_rows"] <= max_rows:
+        return {"ready": True}
+
+    return {
+        "ready": False,
+        "error": (
+            f"Query rejected as too expensive: estimated cost {estimate['total_cost']:.0f} (limit {max_cost:.0f}), "
+            f"{estimate['max_rows']} rows in {estimate['heaviest_node']} (limit {max_rows:.0f}). "
+            "Add filters on indexed columns, avoid cross joins and aggregate instead of returning raw history."
+        ),
+        "error_source": "cost_guard",
+        "validation_retries": attempts + 1,
+    }
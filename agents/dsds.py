@@ -1,6 +1,4 @@
-import json
-import ast
-from typing import Dict, Literal
+from typing import Literal
 
 from schema import State, AgentDecision, RefinerOutput
 from langgraph.graph import StateGraph, START, END
@@ -8,6 +6,7 @@ from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 from utilis.get_llm import get_llm
+from tools.schema_catalog import render_schema
 
 # No top-level LLM initialization to avoid startup crashes
 parser = PydanticOutputParser(pydantic_object=RefinerOutput)
@@ -65,38 +64,17 @@ Map to tables and intent.
 # Chains are now initialized within the nodes that use them
 
 
-def compress_schema(schema: Dict, max_cols_per_table: int = 6):
-    compressed = {}
-    for table, col_data in schema.items():
-        
-        if isinstance(col_data, str):
-            try:
-                cols = ast.literal_eval(col_data)
-            except:
-                cols = []
-        else:
-            cols = col_data
-            
-        formatted_cols = []
-        for col in cols[:max_cols_per_table]:
-            if isinstance(col, tuple) and len(col) == 2:
-                formatted_cols.append(f"{col[0]}({col[1]})")
-            else:
-                formatted_cols.append(str(col))
-        compressed[table] = formatted_cols
-    return compressed
-
-def detect_critical_ambiguity(state: State):
+async def detect_critical_ambiguity(state: State):
     print("\n[REFINER] Node: Detect Ambiguity")
-    schema_summary = compress_schema(state["schema"])
+    schema_summary = render_schema(state["schema"], state.get("foreign_keys") or ())
     
     query_to_use = state.get("resolved_query") or state.get("user_query", "")
-    llm = get_llm()
+    llm = get_llm(agent="ambiguity")
     detect_chain = DETECTION_PROMPT | llm | parser
     
-    result = detect_chain.invoke({
+    result = await detect_chain.ainvoke({
         "query": query_to_use,
-        "schema": json.dumps(schema_summary, indent=2),
+        "schema": schema_summary,
         "format_instructions": parser.get_format_instructions()
     })
 
@@ -106,19 +84,19 @@ def detect_critical_ambiguity(state: State):
         "messages": [f"Detected: {result.decision.value}"]
     }
 
-def handle_human_mcqs(state: State):
+async def handle_human_mcqs(state: State):
     print("\n[REFINER] Node: Human Resolve")
     if not state.get("human_choice"): return state
 
-    schema_summary = compress_schema(state["schema"])
+    schema_summary = render_schema(state["schema"], state.get("foreign_keys") or ())
     query_to_use = state.get("resolved_query") or state.get("user_query", "")
-    llm = get_llm()
+    llm = get_llm(agent="clarification")
     mcq_chain = MCQ_PROMPT | llm | parser
     
-    result = mcq_chain.invoke({
+    result = await mcq_chain.ainvoke({
         "query": query_to_use,
         "human_choice": state["human_choice"],
-        "schema": json.dumps(schema_summary, indent=2),
+        "schema": schema_summary,
         "format_instructions": parser.get_format_instructions()
     })
 
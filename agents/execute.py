@@ -1,7 +1,9 @@
+import asyncio
 from tools.connect_db import connect_db
+from tools.db_tools import afetch_result, statement_timeout_ms
 from schema import State
 
-def execute_query(state: State):
+async def execute_query(state: State):
     print("\n[MAIN] Node: Executing SQL")
     try:
         db = connect_db()
@@ -11,13 +13,24 @@ def execute_query(state: State):
         if not query:
             return {"error": "No SQL query found to execute"}
 
-        data = db.run(query, include_columns=True)
+        result = await afetch_result(query, db)
+        if result["truncated"]:
+            print(f"[EXECUTION] Result capped at {result['row_count']} rows.")
         
         return {
             "execution": True, 
-            "data": data, 
+            "data": result["rows"],
+            "result_columns": result["columns"],
+            "truncated": result["truncated"],
             "error": "" 
         }
+    except asyncio.TimeoutError:
+        error_msg = f"Query cancelled after the {statement_timeout_ms()} ms statement timeout. Narrow the filters or aggregate."
+        print(f"Execution Error: {error_msg}")
+        return {
+            "execution": False,
+            "error": f"Database Execution Error: {error_msg}"
+        }
     except Exception as e:
         
         error_msg = str(e)
@@ -27,4 +40,3 @@ def execute_query(state: State):
             "execution": False,
             "error": f"Database Execution Error: {error_msg}"
         }
-        
\ No newline at end of file
@@ -1,12 +1,10 @@
-from tools.db_tools import get_full_schema, get_foreign_keys, fetch_invoice_sample
+from tools.schema_catalog import aget_catalog
 from schema import State
 
-def exp_agent(state:State):
-    schema = get_full_schema()
-    get_foreign_key = get_foreign_keys()
-    
-    
+async def exp_agent(state:State):
+    catalog = await aget_catalog()
+
     return {
-        "schema": schema,
-        "foreign_keys": get_foreign_key
-    }    
\ No newline at end of file
+        "schema": catalog["schema"],
+        "foreign_keys": catalog["fk_edges"]
+    }
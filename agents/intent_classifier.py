@@ -0,0 +1,211 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+ROUTES = ["SQL_QUERY", "MARKET_DATA", "NEWS", "GENERAL_INFO"]
+
+# (pattern, weight) evidence per route; matched against the lower-cased question
+RULES = {
+    "MARKET_DATA": [
+        (r"\b(current|live|today'?s?|right now|real[- ]time|now)\b.*\b(price|quote|trading|volume)\b", 3.0),
+        (r"\b(price|quote|trading)\b.*\b(today|right now|now|currently)\b", 3.0),
+        (r"\b(stock|share) price\b", 1.5),
+        (r"\btrading (at|volume)\b", 2.0),
+        (r"\bquote\b", 1.0),
+        (r"\$[a-z]{1,5}\b", 1.0),
+    ],
+    "NEWS": [
+        (r"\bnews\b", 3.0),
+        (r"\bheadlines?\b", 3.0),
+        (r"\b(announced?|announcements?|press releases?)\b", 2.0),
+        (r"\b(latest|recent) (updates?|developments?|events?)\b", 2.5),
+    ],
+    "GENERAL_INFO": [
+        (r"\b(who founded|founded by|founder|headquarter(s|ed)?|history of|tell me about|what does .+ do|background of)\b", 3.0),
+        (r"\b(ceo|chief executive|business model|products?|subsidiar(y|ies))\b", 1.5),
+    ],
+    "SQL_QUERY": [
+        (r"\b(19|20)\d{2}\b", 1.5),
+        (r"\b(compare|comparison|average|avg|total|sum|top \d+|highest|lowest|growth|trend|per year|by year|annual|between)\b", 1.0),
+        (r"\b(closing|opening) price\b|\bmoving average\b|\bdaily (change|return)\b", 2.0),
+    ],
+}
+
+# Columns too generic to say anything about the intent
+GENERIC_COLUMNS = {
+    "id", "company_id", "company_name", "symbol", "category", "year", "date", "version", "version_id",
+    "source", "notes", "data_type", "scrape_timestamp", "open", "high", "low", "close",
+}
+
+TOKEN = re.compile(r"[a-z0-9$']+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN.findall((text or "").lower())
+
+
+class NaiveBayes:
+    """Multinomial naive Bayes over word tokens with Laplace smoothing."""
+
+    def __init__(self):
+        self.class_counts = Counter()
+        self.token_counts = defaultdict(Counter)
+        self.totals = Counter()
+        self.vocabulary = set()
+
+    def fit(self, samples: list[tuple[str, str]]):
+        self.__init__()
+        for text, label in samples:
+            tokens = tokenize(text)
+            self.class_counts[label] += 1
+            self.token_counts[label].update(tokens)
+            self.totals[label] += len(tokens)
+            self.vocabulary.update(tokens)
+        return self
+
+    @property
+    def size(self) -> int:
+        return sum(self.class_counts.values())
+
+    def predict_proba(self, text: str) -> dict[str, float]:
+        tokens = [t for t in tokenize(text) if t in self.vocabulary]
+        vocab = len(self.vocabulary) or 1
+        scores = {}
+        for label in ROUTES:
+            if not self.class_counts[label]:
+                continue
+            score = math.log(self.class_counts[label] / self.size)
+            for token in tokens:
+                score += math.log((self.token_counts[label][token] + 1) / (self.totals[label] + vocab))
+            scores[label] = score
+        top = max(scores.values())
+        exp_scores = {label: math.exp(score - top) for label, score in scores.items()}
+        norm = sum(exp_scores.values())
+        return {label: exp_scores.get(label, 0.0) / norm for label in ROUTES}
+
+
+class IntentClassifier:
+    """
+    Local routing tier in front of the LLM router. Keyword rules and schema terms always vote;
+    a naive Bayes model trained on logged LLM routing decisions joins once it has enough samples.
+    """
+
+    def __init__(self, log_path: str | None, threshold: float = 0.8, min_samples: int = 50, retrain_every: int = 25):
+        self.log_path = log_path
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.retrain_every = retrain_every
+        self.model = NaiveBayes()
+        self._samples: list[tuple[str, str]] = []
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._terms: dict[str, list[str]] = {}
+        self.stats = {"local": 0, "llm_fallback": 0, "by_route": Counter()}
+        self._load_log()
+
+    def _load_log(self):
+        if not self.log_path or not os.path.exists(self.log_path):
+            return
+        try:
+            with open(self.log_path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record.get("route") in ROUTES:
+                        self._samples.append((record["query"], record["route"]))
+            self.model.fit(self._samples)
+            print(f"[ROUTER] Intent model trained on {len(self._samples)} logged decisions")
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[ROUTER] Ignoring unreadable routing log {self.log_path}: {e}")
+
+    def _schema_terms(self, columns: dict) -> list[str]:
+        key = json.dumps(columns, sort_keys=True, default=str)
+        if key not in self._terms:
+            names = {col for cols in columns.values() for col in cols if col not in GENERIC_COLUMNS}
+            # "market_cap_billion" is asked about as "market cap"
+            names |= {re.sub(r"_(billion|million|us)$", "", name) for name in names}
+            self._terms = {key: sorted(name.replace("_", " ") for name in names)}
+        return self._terms[key]
+
+    def rule_proba(self, query: str, columns: dict | None = None) -> dict[str, float]:
+        text = (query or "").lower()
+        scores = {route: 0.0 for route in ROUTES}
+        for route, rules in RULES.items():
+            for pattern, weight in rules:
+                if re.search(pattern, text):
+                    scores[route] += weight
+        # Every metric column named in the question is evidence for the database
+        hits = sum(1 for term in self._schema_terms(columns or {}) if re.search(rf"\b{re.escape(term)}\b", text))
+        if hits:
+            scores["SQL_QUERY"] += 3.0 + 1.5 * min(hits - 1, 1)
+
+        smoothing = 0.25
+        total = sum(scores.values()) + smoothing * len(ROUTES)
+        return {route: (score + smoothing) / total for route, score in scores.items()}
+
+    def classify(self, query: str, columns: dict | None = None) -> tuple[str, float]:
+        """Returns (route, confidence) from the local tier."""
+        proba = self.rule_proba(query, columns)
+        if self.model.size >= self.min_samples and len(self.model.class_counts) > 1:
+            learned = self.model.predict_proba(query)
+            if max(proba.values()) <= 1 / len(ROUTES) + 1e-9:
+                # No rule fired: the learned model is the only evidence
+                proba = learned
+            else:
+                proba = {route: (proba[route] + learned[route]) / 2 for route in ROUTES}
+        route = max(proba, key=proba.get)
+        return route, round(proba[route], 4)
+
+    def record_local(self, route: str):
+        with self._lock:
+            self.stats["local"] += 1
+            self.stats["by_route"][route] += 1
+
+    def record_llm(self, query: str, route: str):
+        """Counts an LLM fallback and keeps its decision as a training sample."""
+        with self._lock:
+            self.stats["llm_fallback"] += 1
+            self.stats["by_route"][route] += 1
+            if route not in ROUTES:
+                return
+            self._samples.append((query, route))
+            self._pending += 1
+            if self._pending >= self.retrain_every:
+                self._pending = 0
+                self.model = NaiveBayes().fit(self._samples)
+        self._append_log(query, route)
+
+    def _append_log(self, query: str, route: str):
+        if not self.log_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps({"query": query, "route": route}) + "\n")
+        except OSError as e:
+            print(f"[ROUTER] Could not append to routing log: {e}")
+
+    def snapshot_stats(self) -> dict:
+        with self._lock:
+            decisions = self.stats["local"] + self.stats["llm_fallback"]
+            return {
+                "threshold": self.threshold,
+                "local": self.stats["local"],
+                "llm_fallback": self.stats["llm_fallback"],
+                "fallback_rate": round(self.stats["llm_fallback"] / decisions, 4) if decisions else 0.0,
+                "by_route": dict(self.stats["by_route"]),
+                "training_samples": len(self._samples),
+                "model_active": self.model.size >= self.min_samples,
+            }
+
+
+intent_classifier = IntentClassifier(
+    log_path=os.getenv(
+        "ROUTER_LOG_PATH",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".router_log", "routing.jsonl")
+    ),
+    threshold=float(os.getenv("ROUTER_CONFIDENCE", 0.8)),
+    min_samples=int(os.getenv("ROUTER_MIN_SAMPLES", 50)),
+)
@@ -1,47 +1,61 @@
-import yfinance as yf
+import os
+import re
+
 from schema import State
+from tools.entity_matcher import entity_matcher
+from tools.market_data import market_data, summarize
+
+# Tickers the companies table does not list but users ask about
+EXTRA_TICKERS = {t.strip().upper() for t in os.getenv("MARKET_DATA_EXTRA_TICKERS", "TSLA,META").split(",") if t.strip()}
+MARKET_DATA_MAX_TICKERS = int(os.getenv("MARKET_DATA_MAX_TICKERS", 10))
+
+PERIODS = (
+    (re.compile(r"\b(year|12 months|annual)\b", re.IGNORECASE), "1y"),
+    (re.compile(r"\b(6 months|half[- ]year)\b", re.IGNORECASE), "6mo"),
+    (re.compile(r"\b(3 months|quarter)\b", re.IGNORECASE), "3mo"),
+    (re.compile(r"\bmonth\b", re.IGNORECASE), "1mo"),
+)
+TICKER_WORD = re.compile(r"\$?\b[A-Z]{1,5}\b")
+
+
+def find_tickers(query: str, context: dict) -> list[str]:
+    """Tickers named in the question (any listed company), else the companies carried in the context."""
+    _, entities = entity_matcher.resolve(query)
+    found = entities.get("company") or []
+    tickers = [found] if isinstance(found, str) else list(found)
+    tickers += [word.lstrip("$") for word in TICKER_WORD.findall(query) if word.lstrip("$") in EXTRA_TICKERS]
+    if not tickers:
+        carried = context.get("company") or []
+        tickers = [carried] if isinstance(carried, str) else list(carried)
+    return list(dict.fromkeys(tickers))[:MARKET_DATA_MAX_TICKERS]
+
 
-def market_data_agent(state: State):
+def find_period(query: str) -> str:
+    for pattern, period in PERIODS:
+        if pattern.search(query):
+            return period
+    return "5d"
+
+
+async def market_data_agent(state: State):
     print("\n[MARKET_DATA] Fetching live market metrics...")
-    
+
     context = state.get("structured_context", {})
     query = state.get("resolved_query", "")
-    
-    # Try to find a ticker. Assume memory agent placed it in resolved_query or structured context.
-    # Fallback heuristic: check if common tickers are in the query
-    possible_tickers = ["AAPL", "MSFT", "GOOG", "AMZN", "NVDA", "TSLA", "META"]
-    target_ticker = None
-    
-    for t in possible_tickers:
-        if t in query.upper() or list(context.values()).count(t) > 0:
-            target_ticker = t
-            break
-            
-    if not target_ticker:
+
+    await entity_matcher.aensure_loaded()
+    tickers = find_tickers(query, context)
+    if not tickers:
         return {"market_data": "Could not identify a valid stock ticker for this request."}
-        
-    try:
-        stock = yf.Ticker(target_ticker)
-        
-        # Fetch last 5 days history
-        hist = stock.history(period="5d")
-        if hist.empty:
-            data = f"No recent market data found for {target_ticker}."
-        else:
-            latest = hist.iloc[-1]
-            price = latest['Close']
-            volume = latest['Volume']
-            trend = "Up" if hist.iloc[-1]['Close'] > hist.iloc[0]['Close'] else "Down"
-            
-            data = {
-                "Ticker": target_ticker,
-                "Current Price": f"${price:.2f}",
-                "Volume": int(volume),
-                "5-Day Trend": trend
-            }
-            
-        return {"market_data": data}
-        
-    except Exception as e:
-        print(f"[MARKET_DATA] Error fetching info: {e}")
-        return {"market_data": f"Failed to retrieve market data for {target_ticker}."}
+
+    period = find_period(query)
+    histories = await market_data.histories(tickers, period)
+    summaries = {t: summarize(t, histories[t], period) for t in tickers if t in histories}
+    if not summaries:
+        return {"market_data": f"Failed to retrieve market data for {', '.join(tickers)}."}
+    if len(tickers) == 1:
+        return {"market_data": summaries[tickers[0]]}
+    missing = [t for t in tickers if t not in summaries]
+    if missing:
+        summaries["Unavailable"] = missing
+    return {"market_data": summaries}
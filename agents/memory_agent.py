@@ -1,19 +1,18 @@
 import os
+import re
 import json
-from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage, AIMessage
 from schema import State
-
-llm = ChatGroq(
-    model="openai/gpt-oss-120b", 
-    api_key=os.getenv("GROQ_API_KEY"),
-    temperature=0
-)
+from utilis.get_llm import get_llm
+from utilis.conversation_memory import age_entities, compact_entities, remember_turn, render_memory, turn_record
+from tools.entity_matcher import entity_matcher
 
 def session_initializer_node(state: State):
     return {
         "chat_history": [],
+        "memory_summary": "",
         "structured_context": {},
+        "entity_turns": {},
+        "turn_count": 0,
         "session_id": state.get("session_id", "default_session")
     }
 
@@ -22,46 +21,93 @@ def welcome_node(state: State):
         "final_response": "Hello! I am your AI SQL assistant. How can I help you query the database today?",
     }
 
-def context_resolver_node(state: State):
+# Words that only make sense with an earlier turn: pronouns, "that company", "the other one", ...
+ANAPHORA = re.compile(
+    r"\b(it|its|it's|itself|they|them|their|theirs|themselves|he|she|his|her|those|these|former|latter"
+    r"|same|aforementioned|previous|previously|earlier|again|instead|respectively)\b"
+    r"|\b(this|that)\s+(company|companies|firm|stock|stocks|ticker|one|ones|year|quarter|period|month|"
+    r"metric|number|figure|result|results|list|table|time|sector|category)\b"
+    r"|\b(this|that)\s*[?.!]*\s*$"
+    r"|\bthe\s+(other|others|rest|second\s+one|first\s+one|last\s+one)\b",
+    re.IGNORECASE,
+)
+# Follow-ups that leave out the subject or the metric: "and for 2023?", "what about MSFT?"
+ELLIPSIS = re.compile(
+    r"^\s*(and|also|but|or|then|now|same|what\s+about|how\s+about|compared?\s+(to|with)|versus|vs\.?|only|just)\b",
+    re.IGNORECASE,
+)
+QUESTION_WORDS = re.compile(r"\b(what|which|who|how|show|list|give|find|compare|top)\b", re.IGNORECASE)
+# Questions about companies in general rather than about one: "which company ...", "all stocks"
+GENERIC_SUBJECT = re.compile(
+    r"\b(which|what|every|each|all|any|how\s+many)\s+(compan(y|ies)|firms?|stocks?|tickers?|sectors?|industr(y|ies)|categor(y|ies))\b"
+    r"|\b(companies|firms|stocks|tickers|sectors|industries|categories)\b",
+    re.IGNORECASE,
+)
+
+
+def needs_history(question: str, entities: dict, context: dict | None = None) -> bool:
+    """Whether the question leans on an earlier turn; standalone questions are resolved without the LLM."""
+    if ANAPHORA.search(question) or ELLIPSIS.search(question):
+        return True
+    # "what is the net income", "Show me more": no company named while the conversation is about one
+    if (context or {}).get("company") and not entities.get("company") and not GENERIC_SUBJECT.search(question):
+        return True
+    # A bare fragment ("revenue?", "for 2023") has nothing to stand on by itself
+    words = question.split()
+    return len(words) <= 3 and not entities.get("company") and not QUESTION_WORDS.search(question)
+
+
+def carry_company(question: str, entities: dict, context: dict) -> tuple[str, dict]:
+    """Local fallback: names the company of earlier turns in a question that names none."""
+    company = context.get("company")
+    if entities.get("company") or not company:
+        return question, entities
+    names = company if isinstance(company, list) else [company]
+    mark = "?" if question.rstrip().endswith("?") else ""
+    return f"{question.rstrip(' ?.!')} for {', '.join(names)}{mark}", {**entities, "company": company}
+
+
+async def context_resolver_node(state: State):
     user_query = state.get("user_query", "")
     chat_history = state.get("chat_history", [])
     structured_context = state.get("structured_context", {})
 
-    history_str = ""
-    if chat_history:
-        for msg in chat_history[-10:]:  # last 5 interactions
-            role = "Human" if isinstance(msg, HumanMessage) else "AI"
-            history_str += f"{role}: {msg.content}\n"
-            
-    # Load explicit company mapping config
-    ticker_mapping = {
-        "Apple": "AAPL", "Microsoft": "MSFT", "Google": "GOOG", "Alphabet": "GOOG",
-        "PayPal": "PYPL", "AIG": "AIG", "PG&E": "PCG", "Sears": "SHLDQ", 
-        "McDonalds": "MCD", "McDonald's": "MCD", "Barclays": "BCS", 
-        "Nvidia": "NVDA", "NVIDIA": "NVDA", "Intel": "INTC", "Amazon": "AMZN"
-    }
+    await entity_matcher.aensure_loaded()
+    local_query, local_entities = entity_matcher.resolve(user_query)
+
+    # A first turn has nothing to refer back to; later turns only go to the LLM when they do
+    if not chat_history or not needs_history(user_query, local_entities, structured_context):
+        entity_matcher.count("local")
+        if local_query != user_query:
+            print(f"[MEMORY] Resolved locally: {local_query}")
+        return {
+            "resolved_query": local_query,
+            "structured_context": {**structured_context, **local_entities},
+            "turn_entities": local_entities
+        }
+
+    entity_matcher.count("llm")
+    history_str = render_memory(chat_history, state.get("memory_summary", ""))
+
     prompt = f"""
     You are an AI context resolution agent for a SQL database.
     Your task is to take a new user question and resolve any missing context (like company names, entities, timeframes) using the chat history and structured context.
     
     ### CONTEXT
-    Chat History:
+    Conversation so far (questions, entities and the SQL that answered them):
     {history_str}
     
     Structured Entities:
     {json.dumps(structured_context)}
     
-    Company Ticker Mappings:
-    {json.dumps(ticker_mapping)}
-    
-    New Question: {user_query}
+    New Question: {local_query}
     
     ### INSTRUCTIONS
     1. If the new question refers to an entity mentioned previously (e.g., "now show it for 2023" or "what about its revenue"), replace pronouns or implied context with the actual entities.
     2. Extract any new entities from the current question to update the structured context. Do not store raw SQL or outputs.
-    3. TICKER MAPPING: If the user explicitly mentions a company name (e.g., 'Apple', 'Google'), you MUST replace the name with its corresponding Ticker Symbol (e.g., 'AAPL', 'GOOG') using the mapping provided above in the `resolved_query`.
+    3. Companies are referred to by their ticker symbols (e.g. 'AAPL', 'GOOG'); keep tickers as they are in the `resolved_query`.
     4. Return ONLY a JSON object with two keys:
-       - "resolved_query": The fully standalone question with all context injected, AND heavily mapping natural language companies to tickers.
+       - "resolved_query": The fully standalone question with all context injected.
        - "new_entities": A dictionary of any key entities (company, metric, time period, region) mentioned in the latest question or carried over.
        
     ### OUTPUT FORMAT (JSON ONLY)
@@ -72,39 +118,46 @@ def context_resolver_node(state: State):
     """
     
     try:
-        response = llm.invoke(prompt)
+        llm = get_llm(agent="context_resolver", model="openai/gpt-oss-120b", temperature=0)
+        response = await llm.ainvoke(prompt)
         text = response.content
         if "```json" in text:
             text = text.split("```json")[1].split("```")[0]
         result = json.loads(text.strip())
         
-        resolved_query = result.get("resolved_query", user_query)
-        new_entities = result.get("new_entities", {})
-        
-        updated_context = {**structured_context, **new_entities}
+        # Names carried over from the history still become tickers
+        resolved_query, _ = entity_matcher.resolve(result.get("resolved_query") or local_query)
+        new_entities = {**local_entities, **compact_entities(result.get("new_entities", {}))}
         
     except Exception as e:
         print(f"[MEMORY] Context Resolution Failed: {e}")
-        resolved_query = user_query
-        updated_context = structured_context
+        resolved_query, new_entities = carry_company(local_query, local_entities, structured_context)
         
     return {
         "resolved_query": resolved_query,
-        "structured_context": updated_context
+        "structured_context": {**structured_context, **new_entities},
+        "turn_entities": new_entities
     }
 
 def memory_updater_node(state: State):
-    chat_history = state.get("chat_history", [])
-    user_query = state.get("user_query", "")
-    final_response = state.get("final_response") or state.get("intent_summary") or "No response"
-    
-    # Don't append empty user queries (like from welcome node triggers)
-    if user_query:
-        chat_history.append(HumanMessage(content=user_query))
-        chat_history.append(AIMessage(content=final_response))
-    
-    # Trim to last 5 interactions (1 interaction = 1 Human + 1 AI = 2 messages, so 10 messages max)
-    if len(chat_history) > 10:
-        chat_history = chat_history[-10:]
-        
-    return {"chat_history": chat_history}
+    """
+    Stores a compact record of the turn (question, entities, SQL, row count) instead of the
+    displayed answer, folds turns past MEMORY_RECENT_TURNS into the running summary and drops
+    entities the conversation has moved away from.
+    """
+    # Don't record empty user queries (like from welcome node triggers)
+    if not state.get("user_query"):
+        return {}
+
+    turn = state.get("turn_count", 0) + 1
+    history, summary = remember_turn(state.get("chat_history", []), state.get("memory_summary", ""), turn_record(state))
+    context, entity_turns = age_entities(
+        state.get("structured_context", {}), state.get("entity_turns", {}), state.get("turn_entities") or {}, turn
+    )
+    return {
+        "chat_history": history,
+        "memory_summary": summary,
+        "structured_context": context,
+        "entity_turns": entity_turns,
+        "turn_count": turn
+    }
@@ -1,37 +1,12 @@
+import difflib
+import os
 import re
-from collections import deque
-
-def find_relevant_tables(question, tables, fk_graph, max_depth=2):
-    
-
-    words = set(re.findall(r"[a-zA-Z]+", question.lower()))
-
-    
-    direct_hits = [
-        t for t in tables 
-        if any(t in w or w in t for w in words)
-    ]
-
-    
-    if not direct_hits:
-        return []
-
-    
-    expanded = set(direct_hits)
-    queue = deque(direct_hits)
-
-    while queue:
-        t = queue.popleft()
-        for neighbor in fk_graph.get(t, []):
-            if neighbor not in expanded:
-                expanded.add(neighbor)
-                queue.append(neighbor)
-                if len(expanded) >= 6:   
-                    break
-
-    return list(expanded)
+import json
 
+# LLM calls the planner subgraph may make per plan, the first included
+PLANNER_MAX_ATTEMPTS = int(os.getenv("PLANNER_MAX_ATTEMPTS", 2))
 
+PLAN_EXPRESSION_KEYS = ("select", "joins", "filters", "aggregations", "group_by")
 
 def validate_plan(plan, schema):
     tables = schema["tables"]
@@ -84,6 +59,59 @@ def validate_plan(plan, schema):
 
 
 
+def _rename_table(plan, old, new):
+    pattern = re.compile(rf"\b{re.escape(old)}\.")
+    for key in PLAN_EXPRESSION_KEYS:
+        if isinstance(plan.get(key), list):
+            plan[key] = [pattern.sub(f"{new}.", item) if isinstance(item, str) else item for item in plan[key]]
+    order_by = plan.get("order_by")
+    if isinstance(order_by, dict) and isinstance(order_by.get("column"), str):
+        order_by["column"] = pattern.sub(f"{new}.", order_by["column"])
+    plan["tables"] = [new if t == old else t for t in plan.get("tables", [])]
+
+
+def repair_plan(plan, schema, error):
+    """
+    Local fix for the error validate_plan raised, so a near-miss plan does not cost another
+    planner call. Returns a description of the fix, or None when only the LLM can fix it.
+    """
+    tables = schema["tables"]
+    if error == "Duplicate tables found in plan":
+        plan["tables"] = list(dict.fromkeys(plan["tables"]))
+        return "removed duplicate tables"
+
+    if error.startswith("Invalid table: "):
+        old = error[len("Invalid table: "):]
+        match = difflib.get_close_matches(old.lower(), tables, n=1, cutoff=0.6)
+        if not match:
+            return None
+        _rename_table(plan, old, match[0])
+        return f"table {old} -> {match[0]}"
+
+    if error.startswith(("Invalid FK join: ", "Bad join format: ")):
+        # Joins are derived from the foreign keys when the plan is compiled
+        join = error.split(": ", 1)[1]
+        plan["joins"] = [j for j in plan.get("joins", []) if j != join]
+        return f"dropped join {join}"
+
+    if error.startswith("Filter references unknown table: "):
+        referenced = re.findall(r"([a-zA-Z0-9_]+)\.", error.split(": ", 1)[1])
+        missing = [t for t in dict.fromkeys(referenced) if t not in plan.get("tables", [])]
+        if not missing or any(t not in tables for t in missing):
+            return None
+        plan["tables"] = plan.get("tables", []) + missing
+        return f"added tables {missing}"
+
+    if error == "Aggregation requires GROUP BY":
+        aggregated = re.compile(r"\b(count|sum|avg|min|max)\s*\(", re.IGNORECASE)
+        group_by = [item for item in plan.get("select") or [] if isinstance(item, str) and not aggregated.search(item)]
+        if not group_by:
+            return None
+        plan["group_by"] = group_by
+        return f"grouped by {group_by}"
+    return None
+
+
 def enforce_defaults(plan):
     
     if not plan.get("limit"):
@@ -122,6 +150,9 @@ def print_schema(schema):
 
 from langgraph.graph import StateGraph, END
 from utilis.get_llm import get_llm
+from tools.schema_catalog import aget_catalog, render_schema
+from tools.schema_index import get_schema_index
+from utilis.metrics import instrument_node
 # No top-level LLM initialization
 
 
@@ -129,48 +160,76 @@ class PlannerState(dict):
     question: str
     schema: dict
     relevant_tables: list
+    relevant_columns: dict
     plan: dict
     error: str = ""
     retry_count: int = 0
 
 
-def load_schema(state: PlannerState):
-    state["schema"] = schema_static
-    state["fk_graph"] = schema_static["fk_graph"]
+async def load_schema(state: PlannerState):
+    catalog = await aget_catalog()
+    state["schema"] = {key: catalog[key] for key in ("tables", "columns", "foreign_keys", "fk_graph")}
+    state["fk_graph"] = catalog["fk_graph"]
     return state
 
 
-def pick_tables(state: PlannerState):
+async def pick_tables(state: PlannerState):
     schema = state["schema"]
-    state["relevant_tables"] = find_relevant_tables(
-        state["question"],
-        schema["tables"],
-        schema["fk_graph"],
-        max_depth=2
-    )
+    # Same in-memory catalog load_schema just read; the index is built once per fingerprint
+    selection = get_schema_index(await aget_catalog()).select(state["question"])
+    if selection is None:
+        # Nothing in the question matches the schema, so the planner sees all of it
+        state["relevant_tables"] = list(schema["tables"])
+        state["relevant_columns"] = dict(schema["columns"])
+    else:
+        state["relevant_tables"] = selection["tables"]
+        state["relevant_columns"] = selection["columns"]
+        if selection["bridges"]:
+            print(f"[PLANNER] Bridge tables: {selection['bridges']}")
+    kept = sum(len(cols) for cols in state["relevant_columns"].values())
+    print(f"[PLANNER] Prompt schema: {len(state['relevant_tables'])} tables, {kept} columns")
     return state
 
 
-def call_planner(state: PlannerState):
-    llm = get_llm()
+async def call_planner(state: PlannerState):
+    llm = get_llm(agent="planner")
     tables = state["relevant_tables"]
-    columns = {t: state["schema"]["columns"][t] for t in tables}
-    fks = state["schema"]["foreign_keys"]
+    columns = state["relevant_columns"]
     
    
     error_context = ""
     if state.get("error"):
         error_context = f"\nPREVIOUS ATTEMPT REJECTED: {state['error']}\nFix the JSON plan based on this error."
+        # The pruned column list may be why the plan was rejected
+        if isinstance(state.get("plan"), dict):
+            tables = list(dict.fromkeys(tables + [t for t in state["plan"].get("tables", []) if t in state["schema"]["columns"]]))
+        columns = {t: state["schema"]["columns"][t] for t in tables}
+    catalog = await aget_catalog()
+    schema_text = render_schema(catalog["schema"], catalog["fk_edges"], catalog["primary_keys"], tables=tables, columns=columns)
+
+    if state.get("error") and isinstance(state.get("plan"), dict):
+        # A rejected but parseable plan only needs the fix, not the whole planning prompt again
+        formatted_prompt = f"""
+    Your JSON plan for "{state['question']}" was rejected: {state['error']}
+
+    Plan:
+    {json.dumps(state['plan'])}
+
+    Schema (table(column:type), PK = primary key, -> = foreign key):
+    {schema_text}
+
+    Return the corrected plan as JSON only, with the same keys. Use only tables and columns from the schema.
+"""
+        return _parse_plan(state, (await llm.ainvoke(formatted_prompt)).content)
 
     formatted_prompt = f"""
     ### TASK
     You are a Lead Database Architect. Your goal is to map complex natural language questions into a structured logical plan.
     ### CONTEXT
     User Question: {state['question']}
-    Schema: {state['schema']}
     Schema tables allowed: {tables}
-    Columns: {columns}
-    Foreign keys: {fks}
+    Schema (table(column:type), PK = primary key, -> = foreign key):
+    {schema_text}
     {error_context}
 
     ### OPERATIONAL GUIDELINES for COMPLEX TASKS:
@@ -188,10 +247,12 @@ def call_planner(state: PlannerState):
     ### CRITICAL RULE:
     - If you include 'aggregations', you MUST include 'group_by' unless the aggregation is a global count (e.g. COUNT(*)).
     - The 'group_by' list must include ALL non-aggregated columns selected or implied.
+    - 'select', 'filters', 'aggregations', 'group_by' and 'order_by' are SQL expressions over table.column (e.g. "financial_statements.year >= 2020", "AVG(financial_statements.revenue) AS avg_revenue"), never prose.
 
     ### OUTPUT FORMAT (JSON ONLY):
     {{
     "tables": ["list", "of", "tables"],
+    "select": ["table.column", "AGG(table.column) AS alias"],
     "joins": ["tableA.id = tableB.fk_id"],
     "filters": ["expression using table.column"],
     "aggregations": ["SQL-like aggregation string"],
@@ -205,9 +266,11 @@ def call_planner(state: PlannerState):
     }}
 """
 
-    response = llm.invoke(formatted_prompt)
-    text = response.content
+    response = await llm.ainvoke(formatted_prompt)
+    return _parse_plan(state, response.content)
 
+
+def _parse_plan(state: PlannerState, text: str):
     try:
        
         if "```json" in text:
@@ -227,27 +290,36 @@ def validate_and_fix(state: PlannerState):
          state["retry_count"] = state.get("retry_count", 0) + 1
          return state
 
-    try:
-        validate_plan(state["plan"], state["schema"])
-        state["plan"] = enforce_defaults(state["plan"])
-    except ValueError as e:
-        state["error"] = str(e)
-        state["retry_count"] = state.get("retry_count", 0) + 1
+    fixes = []
+    while True:
+        try:
+            validate_plan(state["plan"], state["schema"])
+            state["plan"] = enforce_defaults(state["plan"])
+            break
+        except ValueError as e:
+            fix = repair_plan(state["plan"], state["schema"], str(e)) if len(fixes) < 5 else None
+            if fix is None:
+                state["error"] = str(e)
+                state["retry_count"] = state.get("retry_count", 0) + 1
+                break
+            fixes.append(fix)
+    if fixes:
+        print(f"[PLANNER] Repaired plan locally: {'; '.join(fixes)}")
     
     return state
 
 def should_retry(state: PlannerState):
-    if state.get("error") and state.get("retry_count", 0) < 3:
+    if state.get("error") and state.get("retry_count", 0) < PLANNER_MAX_ATTEMPTS:
         return "call_planner"
     return END
 
 
 workflow = StateGraph(PlannerState)
 
-workflow.add_node("load_schema", load_schema)
-workflow.add_node("pick_tables", pick_tables)
-workflow.add_node("call_planner", call_planner)
-workflow.add_node("validate", validate_and_fix)
+workflow.add_node("load_schema", instrument_node("load_schema", load_schema, graph="planner"))
+workflow.add_node("pick_tables", instrument_node("pick_tables", pick_tables, graph="planner"))
+workflow.add_node("call_planner", instrument_node("call_planner", call_planner, graph="planner"))
+workflow.add_node("validate", instrument_node("validate", validate_and_fix, graph="planner"))
 
 workflow.set_entry_point("load_schema")
 workflow.add_edge("load_schema", "pick_tables")
@@ -258,4 +330,5 @@ workflow.add_conditional_edges("validate", should_retry, {
     END: END
 })
 
-planner_graph = workflow.compile()
+# Never interrupts, so it keeps no checkpoints of its own inside the parent thread
+planner_graph = workflow.compile(checkpointer=False)
@@ -1,22 +1,38 @@
 from pydantic import BaseModel, Field
 from schema import State
 from utilis.get_llm import get_llm
-from agents.schema_static import schema_static
+from tools.schema_catalog import aget_catalog, render_schema
+from agents.intent_classifier import intent_classifier
 
 class RouteDecision(BaseModel):
     route: str = Field(description="One of: 'SQL_QUERY', 'MARKET_DATA', 'NEWS', 'GENERAL_INFO'")
 
-def query_router_node(state: State):
-    print("\n[ROUTER] Classifying User Intent...")
-    query = state.get("resolved_query") or state.get("user_query", "")
-    
+async def _schema_context():
+    try:
+         catalog = await aget_catalog()
+         return catalog["columns"], render_schema(catalog["schema"], types=False)
+    except Exception as e:
+         print(f"[ROUTER] Schema catalog unavailable: {e}")
+         return {}, ""
+
+def _local_route(query: str, schema_columns: dict):
+    """Local tier: rules + learned model. Returns the route when confident, else None."""
+    route, confidence = intent_classifier.classify(query, schema_columns)
+    if confidence >= intent_classifier.threshold:
+        intent_classifier.record_local(route)
+        print(f"[ROUTER] Local route: {route} (confidence {confidence:.2f})")
+        return route
+    print(f"[ROUTER] Local confidence {confidence:.2f} below {intent_classifier.threshold}, asking the LLM...")
+    return None
+
+async def _llm_route(query: str, schema_text: str) -> str:
     prompt = f"""
     You are an intelligent router for a hybrid analytical assistant.
     Analyze the following user query and classify it strictly into ONE of these four categories:
     
     1. SQL_QUERY: If the user is asking about structured database records like company financials, revenues, profits, market caps, ratios, etc.
        THE DATABASE SCHEMA IS:
-       {schema_static['columns']}
+       {schema_text}
        
        USE SQL_QUERY if the question can be answered by querying these specific columns for specific years or companies.
        
@@ -31,10 +47,11 @@ def query_router_node(state: State):
     
     try:
          # Use structured output
-         llm = get_llm()
-         decision = llm.with_structured_output(RouteDecision).invoke(prompt)
+         llm = get_llm(agent="query_router")
+         decision = await llm.with_structured_output(RouteDecision).ainvoke(prompt)
          print(f"[ROUTER DEBUG] Raw Decision Output: {decision}")
          route = decision.route if hasattr(decision, 'route') else decision.get('route')
+         intent_classifier.record_llm(query, route)
     except Exception as e:
          import traceback
          traceback.print_exc()
@@ -42,4 +59,27 @@ def query_router_node(state: State):
          route = "SQL_QUERY" # fallback to default
 
     print(f"[ROUTER] Decided Route: {route}")
+    return route
+
+async def query_router_node(state: State):
+    print("\n[ROUTER] Classifying User Intent...")
+    query = state.get("resolved_query") or state.get("user_query", "")
+    schema_columns, schema_text = await _schema_context()
+
+    # Local tier first: rules + learned model, no LLM call when confident
+    route = _local_route(query, schema_columns)
+    if route is None:
+        route = await _llm_route(query, schema_text)
     return {"route": route}
+
+async def local_router_node(state: State):
+    """Local tier only; `route` is left empty when it is not confident, for llm_router to decide."""
+    print("\n[ROUTER] Classifying User Intent...")
+    query = state.get("resolved_query") or state.get("user_query", "")
+    schema_columns, _ = await _schema_context()
+    return {"route": _local_route(query, schema_columns)}
+
+async def llm_router_node(state: State):
+    query = state.get("resolved_query") or state.get("user_query", "")
+    _, schema_text = await _schema_context()
+    return {"route": await _llm_route(query, schema_text)}
@@ -1,13 +1,22 @@
 from rag.retriever import retrieve_documents
+from rag.warmup import rag_warmup
+from utilis.executor import run_blocking
 from schema import State
 
-def rag_agent(state: State):
+async def rag_agent(state: State):
     print("\n[RAG] Fetching external knowledge context...")
     # For RAG, raw user_query (e.g. 'Microsoft') provides better semantic matches than resolved tickers (e.g. 'MSFT')
     query = state.get("user_query") or state.get("resolved_query", "")
+
+    # With the startup warm-up on, requests never load the model or build the index themselves
+    if rag_warmup.active and not await rag_warmup.wait():
+        if rag_warmup.state == "failed":
+            rag_warmup.start()
+        print(f"[RAG] Knowledge base not ready ({rag_warmup.state}), answering without documents")
+        return {"rag_context": "The document knowledge base is still loading; no documents were retrieved for this question."}
     
     try:
-        context_str = retrieve_documents(query, k=3)
+        context_str = await run_blocking(retrieve_documents, query, k=3)
         if not context_str.strip():
              context_str = "No relevant context found in RAG database."
         return {"rag_context": context_str}
@@ -0,0 +1,177 @@
+import os
+import time
+
+from sqlglot import exp
+
+from schema import State
+from agents.sql_generator_agent import Output_query
+from tools.connect_db import connect_db
+from tools.schema_catalog import aget_catalog, render_schema
+from tools.sql_repair import classify_failure, failing_fragment, fix_literal_values, parse, rewrite, value_hints
+from utilis.get_llm import get_llm
+from utilis.metrics import REPAIRS
+from utilis.request_context import current_request_id, current_trace
+from utilis.token_usage import token_ledger
+
+# Per-request budget: the time and tokens limits count the whole request (from its start,
+# including the attempts before the first failure), not just the repair loop
+REPAIR_MAX_ATTEMPTS = int(os.getenv("REPAIR_MAX_ATTEMPTS", 4))
+REPAIR_TIME_BUDGET_MS = int(os.getenv("REPAIR_TIME_BUDGET_MS", 20000))
+REPAIR_TOKEN_BUDGET = int(os.getenv("REPAIR_TOKEN_BUDGET", 12000))
+REPAIR_PROBE_TIMEOUT_MS = int(os.getenv("REPAIR_PROBE_TIMEOUT_MS", 2000))
+
+# Cheapest first: a local rewrite (no LLM), a small prompt with the failing fragment,
+# the generator again with the error, and only then a new plan
+LADDERS = {
+    "unknown_column": ("local", "targeted", "regenerate", "replan"),
+    "unknown_table": ("local", "targeted", "regenerate", "replan"),
+    "ambiguous_column": ("local", "targeted", "regenerate"),
+    "missing_join": ("local", "targeted", "regenerate", "replan"),
+    "type_mismatch": ("local", "targeted", "regenerate"),
+    "syntax": ("targeted", "regenerate", "replan"),
+    "too_expensive": ("regenerate", "replan"),
+    "timeout": ("regenerate", "replan"),
+    "zero_rows": ("local", "targeted", "replan"),
+    "other": ("regenerate", "replan"),
+}
+
+LLM_STRATEGIES = ("targeted", "regenerate", "replan")
+
+
+def _elapsed_ms(repair: dict) -> float:
+    trace = current_trace()
+    started = trace["started"] if trace else repair["started"]
+    return (time.perf_counter() - started) * 1000
+
+
+def _tokens_spent() -> int:
+    usage = token_ledger.for_request(current_request_id())
+    return usage["prompt_tokens"] + usage["completion_tokens"]
+
+
+def _new_repair() -> dict:
+    return {"attempts": 0, "started": time.perf_counter(), "tried": {}, "history": [], "next": None, "reason": ""}
+
+
+async def _local(state: State, kind: str, sql: str, catalog: dict, repair: dict) -> str | None:
+    if kind == "zero_rows":
+        fixed = await fix_literal_values(sql, catalog, connect_db(), REPAIR_PROBE_TIMEOUT_MS)
+    else:
+        fixed = rewrite(sql, kind, catalog)
+    if fixed is None:
+        return None
+    sql, notes = fixed
+    print(f"[REPAIR] Local rewrite: {'; '.join(notes)}")
+    return sql
+
+
+async def _targeted(state: State, kind: str, sql: str, catalog: dict, repair: dict) -> str | None:
+    """One small prompt: the failing query, the fragment the error points at and only the tables it uses."""
+    tree = parse(sql)
+    tables = sorted({t.name for t in tree.find_all(exp.Table)} & set(catalog["schema"])) if tree else []
+    # Neighbouring tables, in case a join through a bridge is what's missing
+    if kind in ("missing_join", "unknown_column", "unknown_table"):
+        tables = sorted(set(tables) | {n for t in tables for n in catalog["fk_graph"].get(t, ())})
+    schema_text = render_schema(catalog["schema"], catalog["fk_edges"], catalog["primary_keys"], tables=tables or None)
+
+    if kind == "zero_rows":
+        hints = await value_hints(sql, catalog, connect_db(), timeout_ms=REPAIR_PROBE_TIMEOUT_MS)
+        repair["reason"] = "The previous query returned no rows. " + "; ".join(hints)
+        problem = "The query ran but returned no rows. Data actually present in the filtered columns:\n" + "\n".join(
+            f"- {hint}" for hint in hints) + "\nAdjust the filters to match the data if the question allows it."
+    else:
+        fragment = failing_fragment(sql, state.get("error", ""))
+        problem = f"Error: {state.get('error', '')}" + (f"\nFailing fragment: {fragment}" if fragment else "")
+
+    prompt = f"""
+    Fix this PostgreSQL query for the question "{state.get('resolved_query') or state.get('user_query', '')}".
+    Change only what the problem requires and keep everything else as it is.
+
+    Query:
+    {sql}
+
+    {problem}
+
+    Tables (table(column:type), PK = primary key, -> = foreign key):
+    {schema_text}
+
+    Respond ONLY with the Output_query tool.
+    """
+    llm = get_llm(agent="sql_repair")
+    response = await llm.with_structured_output(Output_query).ainvoke(prompt)
+    fixed = (response.query_generated or "").strip()
+    if not fixed or fixed.rstrip(";") == sql.strip().rstrip(";"):
+        return None
+    print("[REPAIR] Targeted fix generated")
+    return fixed
+
+
+async def repair_node(state: State):
+    """
+    Entry point of every retry loop (validation, cost guard, execution errors and empty results).
+    Classifies the failure and applies the cheapest remedy not tried yet for this kind of failure,
+    within a per-request budget of attempts, wall time and tokens. Sets repair["next"] to the
+    node that continues: safety (rewritten SQL), generate_sql, planner or answer (budget spent).
+    """
+    repair = dict(state.get("repair") or _new_repair())
+    repair["tried"] = {kind: list(tried) for kind, tried in repair["tried"].items()}
+    repair["history"] = list(repair["history"])
+
+    error = state.get("error", "")
+    kind = classify_failure(error, bool(state.get("execution")), bool(state.get("data")))
+    sql = state.get("safe_sql_query") if kind == "zero_rows" else state.get("sql_query")
+    sql = sql or state.get("sql_query") or ""
+    print(f"\n[REPAIR] Node: {kind} ({error[:120] if error else 'empty result'})")
+
+    elapsed = _elapsed_ms(repair)
+    if repair["attempts"] >= REPAIR_MAX_ATTEMPTS or elapsed >= REPAIR_TIME_BUDGET_MS:
+        print(f"[REPAIR] Budget spent ({repair['attempts']} attempts, {elapsed:.0f} ms). Answering with what we have.")
+        REPAIRS.inc(kind, "exhausted")
+        return {"repair": {**repair, "next": "answer"}}
+
+    over_tokens = _tokens_spent() >= REPAIR_TOKEN_BUDGET
+    catalog = await aget_catalog()
+    tried = repair["tried"].setdefault(kind, [])
+
+    for strategy in LADDERS[kind]:
+        if strategy in tried:
+            continue
+        if over_tokens and strategy in LLM_STRATEGIES:
+            print(f"[REPAIR] Token budget of {REPAIR_TOKEN_BUDGET} spent, no further LLM repairs")
+            break
+        tried.append(strategy)
+        start = time.perf_counter()
+
+        update = {}
+        if strategy == "regenerate":
+            # The generator sees the error in state and goes to the LLM instead of the compiler
+            repair["next"] = "generate_sql"
+        elif strategy == "replan":
+            # The new plan is compiled fresh; the failure travels to the planner in repair["reason"]
+            repair["reason"] = repair["reason"] or error or "The previous plan returned 0 rows."
+            repair["next"] = "planner"
+            update = {"error": ""}
+        else:
+            fixer = _local if strategy == "local" else _targeted
+            fixed = await fixer(state, kind, sql, catalog, repair)
+            if fixed is None:
+                if strategy == "targeted":
+                    # The LLM was asked, so it counts against the budget
+                    repair["attempts"] += 1
+                continue
+            repair["next"] = "safety"
+            update = {"sql_query": fixed, "sql_source": "repair", "error": ""}
+
+        repair["attempts"] += 1
+        repair["history"].append({"kind": kind, "strategy": strategy, "ms": round((time.perf_counter() - start) * 1000, 1)})
+        REPAIRS.inc(kind, strategy)
+        print(f"[REPAIR] Attempt {repair['attempts']}/{REPAIR_MAX_ATTEMPTS}: {strategy}")
+        return {**update, "repair": repair}
+
+    REPAIRS.inc(kind, "exhausted")
+    print(f"[REPAIR] Nothing left to try for {kind}. Answering with what we have.")
+    return {"repair": {**repair, "next": "answer"}}
+
+
+def route_after_repair(state: State):
+    return (state.get("repair") or {}).get("next") or "answer"
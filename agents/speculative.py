@@ -0,0 +1,63 @@
+import os
+import time
+
+from schema import State
+from agents.explore_agent import exp_agent
+from agents.dsds import detect_critical_ambiguity, route_ambiguity_decision
+
+# Run schema loading and ambiguity detection while the LLM router is still deciding
+SPECULATIVE_ROUTING = os.getenv("SPECULATIVE_ROUTING", "true").lower() in ("1", "true", "yes")
+
+# What prepare_sql leaves behind, reset when the router picks another route
+SPECULATIVE_RESET = {"schema": {}, "foreign_keys": None, "llm_output": None}
+
+
+async def prepare_sql_node(state: State):
+    """
+    SQL branch started in parallel with llm_router, only for questions the local classifier could
+    not route: loads the schema and runs ambiguity detection. Confidently routed questions never
+    start it. On failure the SQL route falls back to the sequential explore -> detect path.
+    """
+    timings = {}
+    try:
+        start = time.perf_counter()
+        update = await exp_agent(state)
+        timings["explore"] = round((time.perf_counter() - start) * 1000, 1)
+
+        start = time.perf_counter()
+        update.update(await detect_critical_ambiguity({**state, **update}))
+        timings["detect"] = round((time.perf_counter() - start) * 1000, 1)
+    except Exception as e:
+        print(f"[SPECULATE] SQL preparation failed, will retry sequentially if routed to SQL: {e}")
+        return {"speculated": False, "timings": timings}
+    return {**update, "speculated": True, "timings": timings}
+
+
+# Graph node each route continues at
+ROUTE_NODES = {"SQL_QUERY": "explore", "MARKET_DATA": "market_data", "NEWS": "rag", "GENERAL_INFO": "rag"}
+
+
+def route_after_local(state: State):
+    route = state.get("route")
+    if route is None:
+        # Not confident: the LLM router and the SQL preparation run side by side
+        return ["llm_router", "prepare_sql"]
+    return ROUTE_NODES.get(route, "explore")
+
+
+def dispatch_node(state: State):
+    # Join point for the LLM router and the speculative SQL branch
+    route = state.get("route", "SQL_QUERY")
+    if route != "SQL_QUERY" and state.get("speculated"):
+        print(f"[SPECULATE] Discarding SQL preparation for route {route}")
+        return {**SPECULATIVE_RESET, "speculated": False}
+    return {}
+
+
+def route_after_dispatch(state: State):
+    route = state.get("route", "SQL_QUERY")
+    if route != "SQL_QUERY":
+        return route
+    if not state.get("speculated"):
+        return "explore"
+    return route_ambiguity_decision(state)
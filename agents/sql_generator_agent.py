@@ -1,19 +1,38 @@
+import os
+
 from utilis.get_llm import get_llm
 from pydantic import BaseModel
 from schema import State
+from tools.plan_compiler import PlanCompileError, compile_plan
+from tools.schema_catalog import aget_catalog, render_schema
+
+# Well-formed plans are rendered to SQL directly; the LLM only handles what the compiler can't
+PLAN_COMPILER_ENABLED = os.getenv("PLAN_COMPILER_ENABLED", "true").lower() in ("1", "true", "yes")
 
 class Output_query(BaseModel):
     query_generated: str
     
-def sql_generator(state:State):
-    
-    llm = get_llm()
+async def sql_generator(state:State):
     
     plan = state["plan"]
-    schema = state["schema"]
+    errors = state.get('error', "")
+
+    # A failed attempt goes to the LLM with the error, the compiler would only repeat itself
+    if PLAN_COMPILER_ENABLED and not errors and isinstance(plan, dict):
+        try:
+            sql = compile_plan(plan, await aget_catalog())
+            print("[SQL GEN] Compiled plan deterministically")
+            return {"sql_query": sql, "sql_source": "compiler"}
+        except PlanCompileError as e:
+            print(f"[SQL GEN] Plan not compilable, using LLM: {e}")
+
+    llm = get_llm(agent="sql_generator")
+    
+    # Only the plan's tables (it lists bridge tables too); the whole schema if it names none we know
+    tables = [t for t in (plan.get("tables") or []) if t in state["schema"]] if isinstance(plan, dict) else []
+    schema = render_schema(state["schema"], state.get("foreign_keys") or (), tables=tables or None)
     intent_summary = state.get("intent_summary", "")
     user_ques = state.get("resolved_query") or state.get("user_query", "")
-    errors = state.get('error', "")
     
     prompt = f"""
         You are an expert SQL generator.
@@ -45,8 +64,9 @@ def sql_generator(state:State):
 
         Generate the SQL query now.
     """
-    response = llm.with_structured_output(Output_query).invoke(prompt)
+    response = await llm.with_structured_output(Output_query).ainvoke(prompt)
     
     return {
-        "sql_query": response.query_generated
+        "sql_query": response.query_generated,
+        "sql_source": "llm"
     }
\ No newline at end of file
@@ -0,0 +1,285 @@
+"""
+Offline end-to-end benchmark.
+
+Loads market_db_final.sql into a scratch Postgres database, replaces Groq with the recorded
+responses in bench/corpus.json and replays every case through the real /query handler, so
+planning, compilation, validation, execution and retries run exactly as in production.
+
+    python -m bench.run --admin-url postgresql://postgres@localhost/postgres
+    python -m bench.run --repeat 20 --output bench/results/baseline.json
+    python -m bench.run --compare bench/results/baseline.json --threshold 0.15
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DUMP = os.path.join(ROOT, "market_db_final.sql")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark with recorded LLM responses")
+    parser.add_argument("--admin-url", default=os.getenv("BENCH_ADMIN_URL"),
+                        help="Postgres URL with CREATE DATABASE rights; defaults to an embedded pgserver instance")
+    parser.add_argument("--db-name", default="market_db_bench")
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "bench", "corpus.json"))
+    parser.add_argument("--case", action="append", help="Only run these case ids (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5, help="Measured runs per case")
+    parser.add_argument("--warmup", type=int, default=1, help="Unmeasured runs per case")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Emulated latency of every LLM call")
+    parser.add_argument("--with-caches", action="store_true", help="Keep the answer and LLM caches enabled")
+    parser.add_argument("--tracemalloc", action="store_true", help="Track peak Python allocations per case (slower)")
+    parser.add_argument("--output", help="Write the results JSON here")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed p50 slowdown before failing")
+    return parser.parse_args()
+
+
+def admin_url(args) -> str:
+    if args.admin_url:
+        return args.admin_url
+    try:
+        import pgserver
+    except ImportError:
+        sys.exit("[BENCH] No --admin-url / BENCH_ADMIN_URL given and pgserver is not installed (pip install pgserver)")
+    data_dir = os.path.join(tempfile.gettempdir(), "sql_agent_bench_pg")
+    print(f"[BENCH] Starting embedded Postgres in {data_dir}")
+    return pgserver.get_server(data_dir).get_uri()
+
+
+def load_database(admin: str, name: str) -> str:
+    """Recreates `name` from market_db_final.sql and returns its URL."""
+    import psycopg2
+    from sqlalchemy.engine import make_url
+
+    url = make_url(admin)
+    conn = psycopg2.connect(url.set(drivername="postgresql").render_as_string(hide_password=False))
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{name}"')
+        cur.execute(f'CREATE DATABASE "{name}"')
+    conn.close()
+
+    target = url.set(drivername="postgresql", database=name).render_as_string(hide_password=False)
+    start = time.perf_counter()
+    with open(DUMP) as f:
+        dump = f.read()
+    conn = psycopg2.connect(target)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(dump)
+    conn.close()
+    print(f"[BENCH] Loaded {os.path.basename(DUMP)} into {name} in {time.perf_counter() - start:.1f}s")
+    return target
+
+
+def configure_env(database_url: str, with_caches: bool):
+    # Must run before main is imported: agents read their settings at import time
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    os.environ["ROUTER_LOG_PATH"] = ""
+    os.environ["SCHEMA_SNAPSHOT_DIR"] = tempfile.mkdtemp(prefix="bench_schema_")
+    os.environ["CHECKPOINT_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench_checkpoints_"), "graph.db")
+    os.environ["MARKET_DATA_PROVIDER"] = "database"
+    os.environ["RAG_WARMUP"] = "false"
+    os.environ.pop("LLM_CACHE_SQLITE", None)
+    os.environ.pop("LANG_SMITH", None)
+    if not with_caches:
+        os.environ["ANSWER_CACHE_ENABLED"] = "false"
+        os.environ["LLM_CACHE_ENABLED"] = "false"
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return round(ordered[index], 2)
+
+
+def summarize(values: list) -> dict:
+    return {
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "mean": round(statistics.fmean(values), 2) if values else 0.0,
+    }
+
+
+def check(expect: dict, response: dict) -> list[str]:
+    problems = []
+    interrupted = response.get("type") == "interruption"
+    if interrupted != bool(expect.get("interrupted")):
+        problems.append(f"interrupted={interrupted}")
+    rows = len((response.get("data") or {}).get("rows") or [])
+    if rows < expect.get("min_rows", 0):
+        problems.append(f"rows={rows} < {expect['min_rows']}")
+    fragment = expect.get("sql_contains")
+    if fragment and fragment.lower() not in (response.get("sql") or "").lower():
+        problems.append(f"sql lacks {fragment!r}")
+    return problems
+
+
+async def run_case(case: dict, recorder, main) -> dict:
+    """One replay of a case: a greeting turn to open the thread, then the measured turns."""
+    opened = await main.run_query(main.QueryRequest(query="hi", thread_id="1"))
+    thread_id = opened["thread_id"]
+    # Interruptions carry no token summary, so LLM usage is read off the thread afterwards
+    before = main.token_ledger.for_thread(thread_id)
+
+    run = {"ms": 0.0, "nodes": {}, "llm_calls": 0, "prompt_tokens": 0, "retries": 0, "problems": []}
+    for turn in case["turns"]:
+        recorder.start_turn(turn)
+        request = main.QueryRequest(query=turn["question"], thread_id=thread_id,
+                                    human_choice=turn.get("human_choice"))
+        start = time.perf_counter()
+        response = await main.run_query(request)
+        run["ms"] += (time.perf_counter() - start) * 1000
+
+        for node, entry in (response.get("timings") or {}).get("nodes", {}).items():
+            totals = run["nodes"].setdefault(node, {"ms": 0.0, "runs": 0})
+            totals["ms"] += entry["ms"]
+            totals["runs"] += entry["runs"]
+            if "." not in node:
+                # Main-graph reruns: planner, generate_sql, safety... (subgraph nodes rerun with them)
+                run["retries"] += entry["runs"] - 1
+        run["problems"] += check(turn.get("expect", {}), response)
+
+    after = main.token_ledger.for_thread(thread_id)
+    run["llm_calls"] = after["calls"] - before["calls"]
+    run["prompt_tokens"] = after["prompt_tokens"] - before["prompt_tokens"]
+    return run
+
+
+async def run_corpus(cases: list, args) -> dict:
+    from bench.stub_llm import Recorder, recorded_llm_factory
+    from utilis.get_llm import set_llm_override
+
+    recorder = Recorder()
+    set_llm_override(recorded_llm_factory(recorder, args.llm_latency_ms))
+    import main
+
+    results = {}
+    async with main.lifespan(main.app):
+        for case in cases:
+            for _ in range(args.warmup):
+                await run_case(case, recorder, main)
+
+            runs = []
+            if args.tracemalloc:
+                tracemalloc.start()
+            for _ in range(args.repeat):
+                runs.append(await run_case(case, recorder, main))
+            peak = None
+            if args.tracemalloc:
+                peak = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+                tracemalloc.stop()
+
+            nodes = {}
+            for node in {name for run in runs for name in run["nodes"]}:
+                node_ms = [run["nodes"][node]["ms"] for run in runs if node in run["nodes"]]
+                runs_per = [run["nodes"][node]["runs"] for run in runs if node in run["nodes"]]
+                nodes[node] = {**summarize(node_ms), "runs": round(statistics.fmean(runs_per), 2)}
+
+            problems = sorted({problem for run in runs for problem in run["problems"]})
+            results[case["id"]] = {
+                "category": case.get("category"),
+                "latency_ms": summarize([run["ms"] for run in runs]),
+                "llm_calls": round(statistics.fmean(run["llm_calls"] for run in runs), 2),
+                "prompt_tokens": round(statistics.fmean(run["prompt_tokens"] for run in runs), 1),
+                "retries": round(statistics.fmean(run["retries"] for run in runs), 2),
+                "peak_alloc_mb": peak,
+                "nodes": dict(sorted(nodes.items(), key=lambda item: -item[1]["p50"])),
+                "ok": not problems,
+                "problems": problems,
+            }
+            latency = results[case["id"]]["latency_ms"]
+            status = "ok" if not problems else "FAILED " + "; ".join(problems)
+            print(f"[BENCH] {case['id']:<26} p50 {latency['p50']:>8.1f}ms  p95 {latency['p95']:>8.1f}ms  "
+                  f"llm {results[case['id']]['llm_calls']:>4}  {status}")
+
+    set_llm_override(None)
+    return results
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> bool:
+    """Prints per-case deltas against a baseline; False when any case's p50 regressed past threshold."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)["cases"]
+    regressed = False
+    print(f"\n[BENCH] Compared with {baseline_path} (threshold {threshold:.0%})")
+    for case_id, result in results.items():
+        before = baseline.get(case_id)
+        if not before:
+            print(f"  {case_id:<26} new case")
+            continue
+        old, new = before["latency_ms"]["p50"], result["latency_ms"]["p50"]
+        delta = (new - old) / old if old else 0.0
+        flag = ""
+        if delta > threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"  {case_id:<26} p50 {old:>8.1f} -> {new:>8.1f}ms ({delta:+.1%})  "
+              f"llm {before['llm_calls']} -> {result['llm_calls']}{flag}")
+    return not regressed
+
+
+def main():
+    args = parse_args()
+    with open(args.corpus) as f:
+        cases = json.load(f)
+    if args.case:
+        cases = [case for case in cases if case["id"] in args.case]
+
+    database_url = load_database(admin_url(args), args.db_name)
+    configure_env(database_url, args.with_caches)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    results = asyncio.run(run_corpus(cases, args))
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "repeat": args.repeat,
+            "llm_latency_ms": args.llm_latency_ms,
+            "caches": args.with_caches,
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+        "cases": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] Results written to {args.output}")
+
+    failed = [case_id for case_id, result in results.items() if not result["ok"]]
+    if failed:
+        print(f"[BENCH] Expectation failures: {', '.join(failed)}")
+    if args.compare and not compare(results, args.compare, args.threshold):
+        sys.exit(1)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Vector store benchmark: query latency, recall and resident memory of the NumPy flat and IVF
+indexes against Chroma, on a synthetic corpus with a hashing embedding so only the stores are
+measured (no model download, no scraping).
+
+Each backend is loaded and queried in its own process; RSS is split into private (anonymous)
+and file-backed pages, the latter being what worker processes mapping the same index share.
+
+    python -m bench.vector_store --docs 20000 --queries 200
+    python -m bench.vector_store --docs 100000 --nprobe 16 --output bench/results/vectors.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from bench.run import summarize  # noqa: E402
+
+BACKENDS = ("numpy-flat", "numpy-ivf", "chroma")
+DIM = 384
+
+
+class HashingEmbeddings:
+    """Bag of words hashed into DIM signed buckets: deterministic and free, same interface as HuggingFaceEmbeddings."""
+
+    def _embed(self, text: str) -> list[float]:
+        vector = np.zeros(DIM, dtype=np.float32)
+        for word in text.lower().split():
+            digest = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+            vector[digest % DIM] += 1.0 if (digest >> 32) & 1 else -1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed(text)
+
+
+def corpus(docs: int, queries: int, seed: int = 7):
+    """Documents drawn from topic vocabularies, and queries built from words of random documents."""
+    from langchain_core.documents import Document
+
+    rng = random.Random(seed)
+    topics = [[f"t{topic}w{word}" for word in range(60)] for topic in range(max(8, docs // 500))]
+    common = [f"c{word}" for word in range(200)]
+    documents = []
+    for index in range(docs):
+        topic = rng.randrange(len(topics))
+        words = rng.choices(topics[topic], k=40) + rng.choices(common, k=40)
+        documents.append(Document(page_content=" ".join(words), metadata={"id": index, "topic": topic}))
+    questions = [" ".join(rng.sample(rng.choice(documents).page_content.split(), 8)) for _ in range(queries)]
+    return documents, questions
+
+
+def rss() -> dict:
+    """Resident memory of this process in MiB: total, private (anonymous) and file-backed."""
+    fields = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "RssAnon", "RssFile"):
+                    fields[key] = int(value.split()[0]) / 1024
+    except OSError:
+        import resource
+        fields["VmRSS"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"rss": fields.get("VmRSS"), "anon": fields.get("RssAnon"), "file": fields.get("RssFile")}
+
+
+def build(backend: str, directory: str, documents, nlist: int | None):
+    embeddings = HashingEmbeddings()
+    start = time.perf_counter()
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+        Chroma.from_documents(documents=documents, embedding=embeddings, persist_directory=directory)
+    else:
+        from rag.numpy_store import NumpyVectorStore
+        ivf = nlist or int(np.sqrt(len(documents)))
+        NumpyVectorStore.from_documents(documents, embeddings, directory, nlist=ivf if backend == "numpy-ivf" else 0)
+    return round(time.perf_counter() - start, 2)
+
+
+def child(args):
+    """Runs in a fresh process: opens the prebuilt index, queries it and reports latency and memory."""
+    _, questions = corpus(args.docs, args.queries)
+    embeddings = HashingEmbeddings()
+    vectors = [embeddings.embed_query(q) for q in questions]
+    before = rss()
+
+    start = time.perf_counter()
+    if args.backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+        store = Chroma(persist_directory=args.directory, embedding_function=embeddings)
+        search = lambda vector: [doc.metadata["id"] for doc in store.similarity_search_by_vector(vector, k=args.k)]
+    else:
+        from rag.numpy_store import NumpyVectorStore
+        store = NumpyVectorStore(args.directory, embeddings, nprobe=args.nprobe)
+        # Row ids map to documents through the sidecar, like a real lookup
+        search = lambda vector: [store._document(row).metadata["id"] for row, _ in store.search_vector(vector, args.k)]
+    load_ms = (time.perf_counter() - start) * 1000
+
+    latencies, results = [], []
+    for vector in vectors:
+        start = time.perf_counter()
+        results.append(search(vector))
+        latencies.append((time.perf_counter() - start) * 1000)
+    after = rss()
+    print(json.dumps({
+        "load_ms": round(load_ms, 1),
+        "query_ms": summarize(latencies),
+        "results": results,
+        "rss_mb": {key: round((after[key] or 0) - (before[key] or 0), 1) for key in after},
+    }))
+
+
+def exact_topk(documents, questions, k: int) -> list[list[int]]:
+    embeddings = HashingEmbeddings()
+    matrix = np.asarray(embeddings.embed_documents([d.page_content for d in documents]), dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    truth = []
+    for question in questions:
+        query = np.asarray(embeddings.embed_query(question), dtype=np.float32)
+        scores = matrix @ (query / max(np.linalg.norm(query), 1e-12))
+        truth.append([int(i) for i in np.argsort(-scores)[:k]])
+    return truth
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="NumPy flat / IVF vector index against Chroma")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--nlist", type=int, help="IVF lists (default sqrt(docs))")
+    parser.add_argument("--nprobe", type=int, default=int(os.getenv("RAG_IVF_NPROBE", 16)))
+    parser.add_argument("--backend", action="append", choices=BACKENDS, help="Only these backends (repeatable)")
+    parser.add_argument("--output", help="Write the results JSON here")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--directory", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.child:
+        return child(args)
+
+    documents, questions = corpus(args.docs, args.queries)
+    truth = exact_topk(documents, questions, args.k)
+    workdir = tempfile.mkdtemp(prefix="bench_vectors_")
+    report = {"meta": {"docs": args.docs, "queries": args.queries, "k": args.k, "nprobe": args.nprobe}, "backends": {}}
+    try:
+        for backend in args.backend or BACKENDS:
+            directory = os.path.join(workdir, backend)
+            try:
+                build_s = build(backend, directory, documents, args.nlist)
+            except ImportError as e:
+                print(f"[BENCH] {backend:<11} skipped: {e}")
+                continue
+            command = [sys.executable, "-m", "bench.vector_store", "--child", "--backend", backend,
+                       "--directory", directory, "--docs", str(args.docs), "--queries", str(args.queries),
+                       "--k", str(args.k), "--nprobe", str(args.nprobe)]
+            output = subprocess.run(command, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            hits = sum(len(set(found) & set(expected)) for found, expected in zip(result.pop("results"), truth))
+            result.update({"build_s": build_s, f"recall@{args.k}": round(hits / (len(truth) * args.k), 3)})
+            report["backends"][backend] = result
+            memory = result["rss_mb"]
+            print(f"[BENCH] {backend:<11} load {result['load_ms']:>8.1f}ms  p50 {result['query_ms']['p50']:>7.2f}ms  "
+                  f"p95 {result['query_ms']['p95']:>7.2f}ms  rss +{memory['rss']}MiB "
+                  f"(private {memory['anon']}, shared file {memory['file']})  recall@{args.k} {result[f'recall@{args.k}']}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ import { LandingPage } from './components/LandingPage/LandingPage';
 import { LeadershipPage } from './components/LandingPage/LeadershipPage';
 import { ConnectDbModal } from './components/LandingPage/ConnectDbModal';
 import { Database } from 'lucide-react';
-import { runQuery } from './api';
+import { runQuery, streamQuery } from './api';
 import { auth } from './firebase'; // Import firebase auth
 import './index.css';
 
@@ -77,15 +77,48 @@ function App() {
             choice = parseInt(text);
           }
     
-          runQuery(pendingQuery, choice, token, dbUrl).then(handleResponse);
+          runStreaming(pendingQuery, choice, token);
           setPendingQuery(null); // Clear pending state
         } else {
           // Normal query
-          runQuery(text, null, token, dbUrl).then(handleResponse);
+          runStreaming(text, null, token);
         }
     });
   };
 
+  // Streams the answer into a live message (route, plan, SQL, row preview and answer tokens
+  // as they arrive), then swaps it for the final payload.
+  const runStreaming = (query, choice, token) => {
+    setMessages(prev => [...prev, { role: 'system', content: '', reasoning: null, sql: null, data: null, streaming: true }]);
+    const updateLive = (patch) => setMessages(prev => prev.map(msg => (msg.streaming ? { ...msg, ...patch(msg) } : msg)));
+
+    const onEvent = (event, data) => {
+      if (event === 'route') {
+        updateLive(msg => ({ reasoning: [...(msg.reasoning || []), `Route: ${data.route}`] }));
+      } else if (event === 'plan') {
+        updateLive(msg => ({ reasoning: [...(msg.reasoning || []), data.reasoning] }));
+      } else if (event === 'sql') {
+        updateLive(() => ({ sql: data.sql }));
+      } else if (event === 'rows') {
+        updateLive(() => ({ data: data.data }));
+      } else if (event === 'token') {
+        setIsTyping(false);
+        updateLive(msg => ({ content: msg.content + data.text }));
+      }
+    };
+
+    const failure = (content) => ({ role: "system", content, reasoning: [], sql: null, data: null });
+    streamQuery(query, onEvent, choice, token, dbUrl)
+      .catch(error => {
+        console.error("API Error:", error);
+        return failure(`Error connecting to backend: ${error.message}. Is the server running?`);
+      })
+      .then(response => {
+        setMessages(prev => prev.filter(msg => !msg.streaming));
+        handleResponse(response || failure("The stream ended without an answer."));
+      });
+  };
+
   const handleResponse = (response) => {
     // Logic to handle interruption
     if (response.type === 'interruption') {
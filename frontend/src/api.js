@@ -49,3 +49,70 @@ export const runQuery = async (query, humanChoice = null, token = null, dbUrl =
     };
   }
 };
+
+// Streams /query/stream as Server-Sent Events. `onEvent(event, data)` receives
+// session, route, plan, sql, rows, token and node events as they happen;
+// the resolved value is the final payload (same shape as runQuery).
+export const streamQuery = async (query, onEvent, humanChoice = null, token = null, dbUrl = null) => {
+  const payload = { query };
+  if (currentThreadId) {
+      payload.thread_id = currentThreadId;
+  }
+  if (humanChoice !== null) {
+      payload.human_choice = humanChoice;
+  }
+  if (token) {
+      payload.token = token;
+  }
+  if (dbUrl) {
+      payload.db_url = dbUrl;
+  }
+
+  const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
+  const response = await fetch(`${API_BASE_URL}/query/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+    },
+    body: JSON.stringify(payload),
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      const parsed = data ? JSON.parse(data) : null;
+
+      if (event === 'session' && parsed?.thread_id) {
+          currentThreadId = parsed.thread_id;
+      }
+      if (event === 'done' || event === 'error') {
+          result = parsed;
+      }
+      onEvent?.(event, parsed);
+    }
+  }
+
+  return result;
+};
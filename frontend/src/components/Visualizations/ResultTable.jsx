@@ -28,6 +28,7 @@ export function ResultTable({ data }) {
             </div>
             <div className="result-summary">
                 Showing {data.rows.length} result{data.rows.length !== 1 && 's'}
+                {data.truncated && ' (result capped by the server)'}
             </div>
         </div>
     );
@@ -1,12 +1,31 @@
+import threading
+
 from langchain_huggingface import HuggingFaceEmbeddings
 
+# Loading the model takes seconds, so every caller shares one instance
+_EMBEDDINGS = None
+# The startup warm-up and a request may ask at the same time; the second waits for the first
+_LOCK = threading.Lock()
+
+def embeddings_loaded() -> bool:
+    return _EMBEDDINGS is not None
+
 def get_embeddings():
-    print("[RAG] Initializing HuggingFace Embeddings (all-MiniLM-L6-v2)...")
-    model_name = "sentence-transformers/all-MiniLM-L6-v2"
-    model_kwargs = {'device': 'cpu'} 
-    encode_kwargs = {'normalize_embeddings': False}
-    return HuggingFaceEmbeddings(
-        model_name=model_name,
-        model_kwargs=model_kwargs,
-        encode_kwargs=encode_kwargs
-    )
+    global _EMBEDDINGS
+
+    if _EMBEDDINGS is not None:
+        return _EMBEDDINGS
+
+    with _LOCK:
+        if _EMBEDDINGS is not None:
+            return _EMBEDDINGS
+        print("[RAG] Initializing HuggingFace Embeddings (all-MiniLM-L6-v2)...")
+        model_name = "sentence-transformers/all-MiniLM-L6-v2"
+        model_kwargs = {'device': 'cpu'} 
+        encode_kwargs = {'normalize_embeddings': False}
+        _EMBEDDINGS = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs=model_kwargs,
+            encode_kwargs=encode_kwargs
+        )
+    return _EMBEDDINGS
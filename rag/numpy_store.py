@@ -0,0 +1,210 @@
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Corpora from this size get an IVF coarse quantiser; below it a flat scan is faster
+RAG_IVF_MIN_DOCS = int(os.getenv("RAG_IVF_MIN_DOCS", 50000))
+RAG_IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", 16))
+
+EMBED_BATCH = 256
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50000
+
+# Pointer file naming the live version directory, and how many versions stay on disk
+CURRENT = "CURRENT"
+KEEP_VERSIONS = 2
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _kmeans(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of the corpus; returns normalised centroids."""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), KMEANS_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for cluster in range(nlist):
+            members = sample[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids = _normalize(centroids)
+    return centroids
+
+
+def _version_dir(directory: str) -> str | None:
+    """The version directory CURRENT points at; read once per open, so all files come from one build."""
+    try:
+        with open(os.path.join(directory, CURRENT)) as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(directory, name) if name else None
+
+
+@contextmanager
+def build_lock(directory: str):
+    """Exclusive lock, across worker processes, around checking for and building the index in `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _prune_versions(directory: str, current: str):
+    versions = sorted(name for name in os.listdir(directory) if name.startswith("v") and name != current)
+    # Readers that opened the previous version keep their files; older ones are removed
+    for name in versions[:max(len(versions) - (KEEP_VERSIONS - 1), 0)]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+class NumpyVectorStore:
+    """
+    Normalised embeddings in a memory-mapped .npy file, the documents in a JSON-lines sidecar
+    read through mmap, and top-k by one matrix product. Every worker process maps the same files,
+    so the pages are shared instead of copied. Large corpora are stored grouped by IVF list and
+    only the RAG_IVF_NPROBE lists closest to the query are scanned.
+
+    Each build is written to its own version directory (v<timestamp>_...) inside `directory` and
+    published by atomically replacing the CURRENT pointer file, so readers never see a partial or
+    mixed index. A version holds vectors.npy, documents.jsonl, offsets.npy, index.json and, with
+    IVF, centroids.npy and lists.npy (start of each list in vectors.npy).
+    """
+
+    def __init__(self, directory: str, embedding_function, nprobe: int = RAG_IVF_NPROBE):
+        self.directory = directory
+        self.path = path = _version_dir(directory)
+        if path is None:
+            raise FileNotFoundError(f"No NumPy vector index in {directory}")
+        self.embedding_function = embedding_function
+        self.nprobe = nprobe
+        with open(os.path.join(path, "index.json")) as f:
+            self.info = json.load(f)
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.centroids = self.lists = None
+        if self.info.get("nlist"):
+            self.centroids = np.load(os.path.join(path, "centroids.npy"), mmap_mode="r")
+            self.lists = np.load(os.path.join(path, "lists.npy"), mmap_mode="r")
+        self._documents_file = open(os.path.join(path, "documents.jsonl"), "rb")
+        self._documents = (
+            mmap.mmap(self._documents_file.fileno(), 0, access=mmap.ACCESS_READ) if self.info["count"] else b""
+        )
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        path = _version_dir(directory)
+        return path is not None and os.path.exists(os.path.join(path, "index.json"))
+
+    @classmethod
+    def from_documents(cls, documents: list[Document], embedding, directory: str, nlist: int | None = None):
+        texts = [doc.page_content for doc in documents]
+        vectors = [embedding.embed_documents(texts[i:i + EMBED_BATCH]) for i in range(0, len(texts), EMBED_BATCH)]
+        vectors = np.concatenate([np.asarray(v, dtype=np.float32) for v in vectors]) if vectors else None
+        return cls.from_embeddings(documents, vectors, embedding, directory, nlist)
+
+    @classmethod
+    def from_embeddings(cls, documents: list[Document], vectors, embedding, directory: str, nlist: int | None = None):
+        """
+        Writes a new version of the index and switches CURRENT to it, then opens it. Concurrent
+        builders should hold build_lock(directory); readers need no lock.
+        """
+        count = len(documents)
+        vectors = _normalize(vectors) if count else np.zeros((0, 0), dtype=np.float32)
+        if nlist is None and count >= RAG_IVF_MIN_DOCS:
+            nlist = int(np.sqrt(count))
+        nlist = min(nlist, count) if nlist else None
+
+        order, info = np.arange(count), {"count": count, "dim": int(vectors.shape[1]) if count else 0, "nlist": None}
+        os.makedirs(directory, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".building_", dir=directory)
+        if nlist:
+            centroids = _kmeans(vectors, nlist)
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            order = np.argsort(assignments, kind="stable")
+            lists = np.searchsorted(assignments[order], np.arange(nlist + 1))
+            np.save(os.path.join(staging, "centroids.npy"), centroids)
+            np.save(os.path.join(staging, "lists.npy"), lists.astype(np.int64))
+            info["nlist"] = nlist
+
+        np.save(os.path.join(staging, "vectors.npy"), vectors[order])
+        offsets = [0]
+        with open(os.path.join(staging, "documents.jsonl"), "wb") as f:
+            for index in order:
+                doc = documents[index]
+                line = json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, default=str)
+                f.write(line.encode("utf-8") + b"\n")
+                offsets.append(f.tell())
+        np.save(os.path.join(staging, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        with open(os.path.join(staging, "index.json"), "w") as f:
+            json.dump(info, f)
+
+        version = f"v{time.time_ns()}_{os.getpid()}"
+        os.rename(staging, os.path.join(directory, version))
+        pointer = os.path.join(directory, f".{CURRENT}.{os.getpid()}")
+        with open(pointer, "w") as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer, os.path.join(directory, CURRENT))
+        _prune_versions(directory, version)
+        print(f"[RAG] Wrote NumPy vector index: {count} documents" + (f", {nlist} IVF lists" if nlist else ""))
+        return cls(directory, embedding)
+
+    def _document(self, row: int) -> Document:
+        line = self._documents[int(self.offsets[row]):int(self.offsets[row + 1])]
+        data = json.loads(line)
+        return Document(page_content=data["page_content"], metadata=data.get("metadata") or {})
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray | None:
+        """Row ranges of the IVF lists to scan, or None for the whole matrix."""
+        if self.centroids is None:
+            return None
+        probe = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        return np.concatenate([np.arange(self.lists[c], self.lists[c + 1]) for c in probe])
+
+    def search_vector(self, query, k: int = 4) -> list[tuple[int, float]]:
+        if not self.info["count"]:
+            return []
+        query = _normalize(query)
+        rows = self._candidates(query)
+        scores = (self.vectors if rows is None else self.vectors[rows]) @ query
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(top_row if rows is None else rows[top_row]), float(scores[top_row])) for top_row in top]
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> list[tuple[Document, float]]:
+        vector = self.embedding_function.embed_query(query)
+        return [(self._document(row), score) for row, score in self.search_vector(vector, k)]
+
+    def similarity_search(self, query: str, k: int = 4) -> list[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def close(self):
+        if isinstance(self._documents, mmap.mmap):
+            self._documents.close()
+        self._documents_file.close()
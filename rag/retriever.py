@@ -4,9 +4,8 @@ def retrieve_documents(query: str, k: int = 3):
     print(f"[RAG] Retrieving top {k} documents for query: {query}")
     vector_store = get_vector_store()
     
-    # Chroma retriever
-    retriever = vector_store.as_retriever(search_kwargs={"k": k})
-    docs = retriever.invoke(query)
+    # Supported by both the Chroma and the NumPy backend
+    docs = vector_store.similarity_search(query, k=k)
     
     # Format into context string
     context = "\n\n".join([doc.page_content for doc in docs])
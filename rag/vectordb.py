@@ -1,33 +1,84 @@
 import os
-from langchain_community.vectorstores import Chroma
+import threading
 from rag.embeddings import get_embeddings
 from rag.loaders import load_and_split_documents
 
+# "chroma" or "numpy" (memory-mapped flat / IVF index, see rag/numpy_store.py)
+RAG_BACKEND = os.getenv("RAG_BACKEND", "chroma").lower()
+CHROMA_DIR = os.path.join(os.path.dirname(__file__), "chroma_db")
+NUMPY_DIR = os.getenv("RAG_NUMPY_DIR", os.path.join(os.path.dirname(__file__), "numpy_index"))
+
 # Cache the vector store to avoid rebuilding it on every query
 _VECTOR_STORE = None
+_LOCK = threading.Lock()
 
 def get_vector_store():
     global _VECTOR_STORE
     
     if _VECTOR_STORE is not None:
         return _VECTOR_STORE
-        
+
+    with _LOCK:
+        if _VECTOR_STORE is not None:
+            return _VECTOR_STORE
+        _VECTOR_STORE = _open_numpy_store() if RAG_BACKEND == "numpy" else _open_vector_store()
+    return _VECTOR_STORE
+
+def _open_vector_store(persist_dir: str = CHROMA_DIR):
+    from langchain_community.vectorstores import Chroma
+
     embeddings = get_embeddings()
-    persist_dir = os.path.join(os.path.dirname(__file__), "chroma_db")
     
     # If DB already exists, load it
     if os.path.exists(persist_dir) and os.listdir(persist_dir):
         print("[RAG] Loading existing Chroma vector store...")
-        _VECTOR_STORE = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
-    else:
-        # Otherwise, build it
-        print("[RAG] Building new Chroma vector store...")
+        return Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+
+    # Otherwise, build it
+    print("[RAG] Building new Chroma vector store...")
+    splits = load_and_split_documents()
+    if not splits:
+         print("[RAG] Warning: No documents loaded. Creating empty Chroma DB.")
+         # Create empty so it doesn't fail, but warn
+         return Chroma(persist_directory=persist_dir, embedding_function=embeddings)
+    return Chroma.from_documents(documents=splits, embedding=embeddings, persist_directory=persist_dir)
+
+def _export_chroma(persist_dir: str = CHROMA_DIR):
+    """Documents and embeddings of an existing Chroma store, so switching backends needs no re-scraping."""
+    from langchain_core.documents import Document
+
+    if not (os.path.exists(persist_dir) and os.listdir(persist_dir)):
+        return None
+    try:
+        store = _open_vector_store(persist_dir)
+        data = store.get(include=["embeddings", "documents", "metadatas"])
+    except Exception as e:
+        print(f"[RAG] Could not export the Chroma store: {e}")
+        return None
+    documents = [Document(page_content=text, metadata=meta or {}) for text, meta in zip(data["documents"], data["metadatas"])]
+    return documents, data["embeddings"]
+
+def _open_numpy_store(directory: str = NUMPY_DIR):
+    from rag.numpy_store import NumpyVectorStore, build_lock
+
+    embeddings = get_embeddings()
+    if NumpyVectorStore.exists(directory):
+        print("[RAG] Loading NumPy vector index...")
+        return NumpyVectorStore(directory, embeddings)
+
+    # Only one worker builds; the others wait here and then open its index
+    with build_lock(directory):
+        if NumpyVectorStore.exists(directory):
+            print("[RAG] Loading NumPy vector index built by another worker...")
+            return NumpyVectorStore(directory, embeddings)
+
+        exported = _export_chroma()
+        if exported is not None and exported[0]:
+            print(f"[RAG] Converting the Chroma store ({len(exported[0])} documents) to a NumPy index...")
+            return NumpyVectorStore.from_embeddings(exported[0], exported[1], embeddings, directory)
+
+        print("[RAG] Building new NumPy vector index...")
         splits = load_and_split_documents()
         if not splits:
-             print("[RAG] Warning: No documents loaded. Creating empty Chroma DB.")
-             # Create empty so it doesn't fail, but warn
-             _VECTOR_STORE = Chroma(persist_directory=persist_dir, embedding_function=embeddings)
-        else:
-             _VECTOR_STORE = Chroma.from_documents(documents=splits, embedding=embeddings, persist_directory=persist_dir)
-             
-    return _VECTOR_STORE
+             print("[RAG] Warning: No documents loaded. Creating empty NumPy index.")
+        return NumpyVectorStore.from_documents(splits, embeddings, directory)
@@ -0,0 +1,71 @@
+import asyncio
+import os
+import time
+
+from utilis.executor import run_blocking
+
+RAG_WARMUP = os.getenv("RAG_WARMUP", "true").lower() in ("1", "true", "yes")
+# How long a NEWS / GENERAL_INFO request waits for an unfinished warm-up before answering without documents
+RAG_WARMUP_WAIT_MS = int(os.getenv("RAG_WARMUP_WAIT_MS", 5000))
+
+
+class RagWarmup:
+    """
+    Loads the embedding model and opens (or builds) the vector store in a background task started
+    with the app, so no request pays for it. Requests arriving before it finishes wait up to
+    RAG_WARMUP_WAIT_MS and then answer without documents instead of starting the load themselves.
+    """
+
+    def __init__(self):
+        self.state = "idle"      # idle -> warming -> ready | failed
+        self.stage = None
+        self.error = None
+        self.timings: dict[str, float] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> asyncio.Task | None:
+        if self._task is not None and not self._task.done():
+            return self._task
+        self.state, self.error = "warming", None
+        self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def _run(self):
+        from rag.embeddings import get_embeddings
+        from rag.vectordb import get_vector_store
+
+        started = time.perf_counter()
+        try:
+            for stage, load in (("embeddings", get_embeddings), ("vector_store", get_vector_store)):
+                self.stage = stage
+                stage_started = time.perf_counter()
+                await run_blocking(load)
+                self.timings[stage] = round((time.perf_counter() - stage_started) * 1000, 1)
+            self.state, self.stage = "ready", None
+            print(f"[RAG] Warm-up finished in {(time.perf_counter() - started) * 1000:.0f} ms")
+        except Exception as e:
+            self.state, self.error = "failed", str(e)
+            print(f"[RAG] Warm-up failed during {self.stage}: {e}")
+
+    @property
+    def active(self) -> bool:
+        return self.state != "idle"
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    async def wait(self, timeout_ms: int = RAG_WARMUP_WAIT_MS) -> bool:
+        """Waits for a running warm-up (without cancelling it on timeout); True once everything is loaded."""
+        if self.state == "warming" and self._task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), timeout_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+        return self.ready
+
+    def status(self) -> dict:
+        return {"state": self.state, "stage": self.stage, "error": self.error, "timings_ms": dict(self.timings)}
+
+
+rag_warmup = RagWarmup()
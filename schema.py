@@ -19,14 +19,25 @@ class RefinerOutput(BaseModel):
     temporal_snippet: str = ""
 
 
+def merge_timings(left: dict | None, right: dict | None) -> dict:
+    """Reducer for per-node timings: parallel branches merge, None starts a new question."""
+    if right is None:
+        return {}
+    return {**(left or {}), **right}
+
+
 class State(TypedDict, total=False):
     # User side
     user_query: str
 
     # Memory Extension
     session_id: str
-    chat_history: List[Any]
+    chat_history: List[dict]     # compact turn records: question, entities, SQL and row count (or answer gist)
+    memory_summary: str          # one line per turn older than the kept records
     structured_context: dict
+    entity_turns: Dict[str, int] # entity -> last turn it was mentioned, for ageing
+    turn_entities: dict          # entities of the current question
+    turn_count: int
     resolved_query: str
 
     # Schema side
@@ -60,11 +71,24 @@ class State(TypedDict, total=False):
     human_choice: Union[int, str]
     
     data: List[Any]
+    result_columns: List[dict]   # [{"name", "type"}] for the rows in data
+    truncated: bool              # data was capped by QUERY_MAX_ROWS / QUERY_MAX_BYTES
     final_response: str
     
+    sql_source: str              # "compiler" (deterministic from the plan), "llm" or "repair"
     retry_count: int
+    validation_retries: int      # generated SQL rejected by the local validator this question
+    repair: dict                 # repair attempts of this question: budget used, strategies tried, next node
+
+    # Answer cache
+    cache_hit: bool
+    cache_version: str           # schema fingerprint + data version the answer was computed against
 
     # Hybrid Extension side
     route: str
     market_data: Union[str, dict]
     rag_context: str
+
+    # Scheduling
+    speculated: bool             # schema + ambiguity detection ran alongside the router
+    timings: Annotated[Dict[str, float], merge_timings]   # node / branch -> milliseconds
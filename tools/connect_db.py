@@ -1,6 +1,11 @@
 from langchain_community.utilities import SQLDatabase
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from dotenv import load_dotenv
 import os
+import ssl
+import threading
 import urllib.parse
 from contextvars import ContextVar
 
@@ -9,6 +14,197 @@ load_dotenv()
 # Global context variable to hold the database connection for the current request
 db_context: ContextVar[SQLDatabase] = ContextVar("db_context", default=None)
 
+# One pooled engine (and one SQLDatabase wrapper bound to it) per distinct URL, shared by the whole process
+_ENGINES: dict[str, Engine] = {}
+_DATABASES: dict[str, SQLDatabase] = {}
+_ASYNC_ENGINES: dict[str, AsyncEngine] = {}
+_LOCK = threading.Lock()
+
+# Async drivers used when the sync URL names (or defaults to) a blocking DBAPI. Other backends
+# (SQLite, MySQL) have no async driver installed and run on the sync engine through run_blocking.
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+}
+
+# libpq URL parameters asyncpg.connect() does not accept; sslmode and friends become connect_args
+LIBPQ_SSL_PARAMS = ("sslmode", "sslrootcert", "sslcert", "sslkey")
+LIBPQ_DROPPED_PARAMS = ("channel_binding", "gssencmode", "options", "sslcrl", "sslcompression", "keepalives")
+
+
+def _pool_settings() -> dict:
+    """Pool configuration, overridable through environment variables."""
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 10)),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+    }
+
+
+def resolve_db_url(db_url: str | None = None) -> str:
+    """Returns the given URL, the DATABASE_URL env var, or the local market_db fallback."""
+    if db_url:
+        return db_url
+
+    db_url = os.getenv("DATABASE_URL")
+    if not db_url:
+        # Fallback to local development settings
+        user = "postgres"
+        password = urllib.parse.quote_plus("admin")
+        host = "localhost"
+        port = "5432"
+        dbname = "market_db"
+        db_url = f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{dbname}"
+    return db_url
+
+
+def get_engine(db_url: str | None = None) -> Engine:
+    """Returns the process-wide pooled engine for a URL, creating it on first use."""
+    db_url = resolve_db_url(db_url)
+    engine = _ENGINES.get(db_url)
+    if engine is not None:
+        return engine
+
+    with _LOCK:
+        engine = _ENGINES.get(db_url)
+        if engine is None:
+            settings = _pool_settings()
+            engine = create_engine(db_url, **settings)
+            _ENGINES[db_url] = engine
+            print(f"[DB] Created pooled engine for {engine.url.render_as_string(hide_password=True)} "
+                  f"(pool_size={settings['pool_size']}, max_overflow={settings['max_overflow']})")
+    return engine
+
+
+def get_sql_database(db_url: str | None = None) -> SQLDatabase:
+    """
+    Returns a SQLDatabase bound to the pooled engine for a URL.
+    The wrapper is built once per URL with lazy reflection, so requests never re-reflect the schema.
+    """
+    db_url = resolve_db_url(db_url)
+    db = _DATABASES.get(db_url)
+    if db is not None:
+        return db
+
+    engine = get_engine(db_url)
+    with _LOCK:
+        db = _DATABASES.get(db_url)
+        if db is None:
+            db = SQLDatabase(engine, lazy_table_reflection=True)
+            _DATABASES[db_url] = db
+    return db
+
+
+def _ssl_context(params: dict):
+    """asyncpg `ssl` argument for libpq's sslmode / sslrootcert / sslcert / sslkey."""
+    mode = params.get("sslmode", "prefer")
+    if not any(params.get(key) for key in ("sslrootcert", "sslcert", "sslkey")):
+        # asyncpg understands the libpq mode names itself
+        return mode
+    context = ssl.create_default_context(cafile=params.get("sslrootcert"))
+    context.check_hostname = mode == "verify-full"
+    if mode not in ("verify-ca", "verify-full"):
+        context.verify_mode = ssl.CERT_NONE
+    if params.get("sslcert"):
+        context.load_cert_chain(params["sslcert"], params.get("sslkey"))
+    return context
+
+
+def asyncpg_url(url):
+    """
+    Returns (url, connect_args) for asyncpg: hosted Postgres URLs carry libpq-only parameters
+    (sslmode=require, connect_timeout, channel_binding, ...) that asyncpg.connect() rejects.
+    """
+    url = make_url(url)
+    query = dict(url.query)
+    connect_args = {}
+    ssl_params = {key: query.pop(key) for key in LIBPQ_SSL_PARAMS if key in query}
+    if ssl_params:
+        connect_args["ssl"] = _ssl_context(ssl_params)
+    if "connect_timeout" in query:
+        connect_args["timeout"] = float(query.pop("connect_timeout"))
+    if "application_name" in query:
+        connect_args["server_settings"] = {"application_name": query.pop("application_name")}
+    dropped = [key for key in LIBPQ_DROPPED_PARAMS if query.pop(key, None) is not None]
+    if dropped:
+        print(f"[DB] Ignoring libpq-only URL parameters for asyncpg: {', '.join(dropped)}")
+    return url.set(query=query), connect_args
+
+
+def supports_async(db_url: str | None = None) -> bool:
+    """Whether the URL's backend has an asyncio driver; the others stay on the sync engine."""
+    return make_url(resolve_db_url(db_url)).get_backend_name() in ASYNC_DRIVERS
+
+
+def db_supports_async(db: SQLDatabase) -> bool:
+    return db._engine.dialect.name in ASYNC_DRIVERS
+
+
+def get_async_engine(db_url: str | None = None) -> AsyncEngine:
+    """
+    Returns the process-wide pooled async engine for a URL.
+    The sync driver in the URL (e.g. psycopg2) is swapped for its asyncio counterpart;
+    only backends in ASYNC_DRIVERS have one (see supports_async).
+    """
+    db_url = resolve_db_url(db_url)
+    engine = _ASYNC_ENGINES.get(db_url)
+    if engine is not None:
+        return engine
+
+    with _LOCK:
+        engine = _ASYNC_ENGINES.get(db_url)
+        if engine is None:
+            url = make_url(db_url)
+            backend = url.get_backend_name()
+            if backend not in ASYNC_DRIVERS:
+                raise ValueError(f"No asyncio driver configured for {backend}; use the sync engine")
+            url, connect_args = asyncpg_url(url.set(drivername=ASYNC_DRIVERS[backend]))
+            engine = create_async_engine(url, connect_args=connect_args, **_pool_settings())
+            _ASYNC_ENGINES[db_url] = engine
+    return engine
+
+
+def get_async_engine_for(db: SQLDatabase) -> AsyncEngine:
+    """Async engine pointing at the same database as a SQLDatabase wrapper."""
+    return get_async_engine(db._engine.url.render_as_string(hide_password=False))
+
+
+def pool_stats() -> dict:
+    """Pool statistics for every engine owned by the process."""
+    stats = {}
+    engines = [(engine, "") for engine in _ENGINES.values()]
+    engines += [(engine.sync_engine, " (async)") for engine in _ASYNC_ENGINES.values()]
+    for engine, suffix in engines:
+        pool = engine.pool
+        key = engine.url.render_as_string(hide_password=True) + suffix
+        stats[key] = {
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            "status": pool.status(),
+        }
+    return stats
+
+
+def dispose_engines():
+    """Closes every pooled connection. Called on application shutdown."""
+    with _LOCK:
+        for engine in _ENGINES.values():
+            engine.dispose()
+        _ENGINES.clear()
+        _DATABASES.clear()
+
+
+async def dispose_async_engines():
+    """Closes every pooled async connection. Called on application shutdown."""
+    engines = list(_ASYNC_ENGINES.values())
+    _ASYNC_ENGINES.clear()
+    for engine in engines:
+        await engine.dispose()
+
+
 def get_db() -> SQLDatabase:
     """
     Retrieves the database connection for the current context.
@@ -24,22 +220,8 @@ def set_db(db: SQLDatabase):
     db_context.set(db)
 
 def create_default_connection() -> SQLDatabase:
-    """Creates the connection using DATABASE_URL env var or fallback to local market_db."""
-    db_url = os.getenv("DATABASE_URL")
-    
-    if not db_url:
-        # Fallback to local development settings
-        user = "postgres"
-        password = urllib.parse.quote_plus("admin") 
-        host = "localhost"
-        port = "5432"
-        dbname = "market_db"
-        db_url = f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{dbname}"
-        print(f"[DB] Using local fallback connection: {host}:{port}/{dbname}")
-    else:
-        print("[DB] Using DATABASE_URL from environment.")
-        
-    return SQLDatabase.from_uri(db_url)
+    """Returns the pooled connection for DATABASE_URL env var or fallback to local market_db."""
+    return get_sql_database()
 
 def connect_db():
-    return get_db()
\ No newline at end of file
+    return get_db()
@@ -1,49 +1,355 @@
+import asyncio
+import json
+import os
 from langchain_community.utilities import SQLDatabase
 from langchain.tools import tool
-from .connect_db import get_db
+from sqlalchemy import bindparam, text
+from .connect_db import get_db, get_async_engine_for, db_supports_async
+from utilis.executor import run_blocking
+from utilis.metrics import db_timer
 
 # db = connect_db() # Removed global instance
 
 def get_tables():
     return get_db().get_usable_table_names()
 
-def get_columns(table_name:str):
-    query = f"""
-    SELECT column_name, data_type
-    FROM information_schema.columns
-    WHERE table_name = '{table_name}';
+COLUMNS_QUERY = """
+SELECT
+    c.table_name,
+    c.column_name,
+    c.data_type,
+    c.is_nullable = 'YES' AS nullable,
+    pk.column_name IS NOT NULL AS primary_key
+FROM information_schema.columns AS c
+LEFT JOIN (
+    SELECT kcu.table_name, kcu.column_name
+    FROM information_schema.table_constraints AS tc
+    JOIN information_schema.key_column_usage AS kcu
+      ON kcu.constraint_name = tc.constraint_name
+     AND kcu.constraint_schema = tc.constraint_schema
+    WHERE tc.constraint_type = 'PRIMARY KEY'
+      AND tc.table_schema = current_schema()
+) AS pk
+  ON pk.table_name = c.table_name AND pk.column_name = c.column_name
+WHERE c.table_schema = current_schema()
+  AND c.table_name IN :tables
+ORDER BY c.table_name, c.ordinal_position
+"""
+
+FOREIGN_KEYS_QUERY = """
+SELECT
+    src.relname AS table_name,
+    src_col.attname AS column_name,
+    dst.relname AS foreign_table,
+    dst_col.attname AS foreign_column
+FROM pg_catalog.pg_constraint AS con
+CROSS JOIN LATERAL unnest(con.conkey, con.confkey) AS k(src_attnum, dst_attnum)
+JOIN pg_catalog.pg_class AS src ON src.oid = con.conrelid
+JOIN pg_catalog.pg_class AS dst ON dst.oid = con.confrelid
+JOIN pg_catalog.pg_attribute AS src_col ON src_col.attrelid = con.conrelid AND src_col.attnum = k.src_attnum
+JOIN pg_catalog.pg_attribute AS dst_col ON dst_col.attrelid = con.confrelid AND dst_col.attnum = k.dst_attnum
+WHERE con.contype = 'f'
+  AND con.connamespace = current_schema()::regnamespace
+ORDER BY src.relname, con.conname
+"""
+
+def introspect_schema(db=None) -> dict:
     """
-    return get_db().run(query)
+        Fetches columns, types, nullability, primary keys and foreign keys
+        for every usable table in two round trips.
 
-def get_full_schema():
+        Returns {"schema": {table: [(column, type)]}, "nullable": {table: {column: bool}},
+                 "primary_keys": {table: [column]}, "foreign_keys": [(table, column, foreign_table, foreign_column)]}
     """
-        Tool to extract Schema of the Data Base
+    db = db or get_db()
+    tables = db.get_usable_table_names()
+    if not tables:
+        return _build_introspection([], [], [])
+
+    with db._engine.connect() as conn:
+        column_rows = conn.execute(_columns_query(), {"tables": list(tables)}).all()
+        fk_rows = conn.execute(text(FOREIGN_KEYS_QUERY)).all()
+    return _build_introspection(tables, column_rows, fk_rows)
+
+async def aintrospect_schema(db=None) -> dict:
     """
-    tables = get_db().get_usable_table_names()
-    schema = {}
-    for table in tables:
-        schema[table] = get_columns(table)
-    return schema
+        Async variant of introspect_schema using the asyncio driver.
+    """
+    db = db or get_db()
+    if not db_supports_async(db):
+        return await run_blocking(introspect_schema, db)
+    tables = db.get_usable_table_names()
+    if not tables:
+        return _build_introspection([], [], [])
+
+    async with get_async_engine_for(db).connect() as conn:
+        column_rows = (await conn.execute(_columns_query(), {"tables": list(tables)})).all()
+        fk_rows = (await conn.execute(text(FOREIGN_KEYS_QUERY))).all()
+    return _build_introspection(tables, column_rows, fk_rows)
+
+def _columns_query():
+    return text(COLUMNS_QUERY).bindparams(bindparam("tables", expanding=True))
 
-def get_foreign_keys():
+def _build_introspection(tables, column_rows, fk_rows) -> dict:
+    schema = {table: [] for table in tables}
+    nullable = {table: {} for table in tables}
+    primary_keys = {table: [] for table in tables}
+    for table, column, data_type, is_nullable, is_primary in column_rows:
+        schema[table].append((column, data_type))
+        nullable[table][column] = is_nullable
+        if is_primary:
+            primary_keys[table].append(column)
+
+    usable = set(tables)
+    foreign_keys = [
+        tuple(row) for row in fk_rows
+        if row[0] in usable and row[2] in usable
+    ]
+    return {
+        "schema": schema,
+        "nullable": nullable,
+        "primary_keys": primary_keys,
+        "foreign_keys": foreign_keys,
+    }
+
+def get_columns(table_name:str, db=None):
     """
-        Tool to get all Foreign keys
+        Tool to get the (column, type) pairs of one table
     """
-    query = """
-    SELECT
-        tc.table_name AS table,
-        kcu.column_name AS column,
-        ccu.table_name AS foreign_table,
-        ccu.column_name AS foreign_column
-    FROM 
-        information_schema.table_constraints AS tc
-        JOIN information_schema.key_column_usage AS kcu
-          ON tc.constraint_name = kcu.constraint_name
-        JOIN information_schema.constraint_column_usage AS ccu
-          ON ccu.constraint_name = tc.constraint_name
-    WHERE constraint_type = 'FOREIGN KEY';
-    """
-    return get_db().run(query)
+    return get_full_schema(db).get(table_name, [])
+
+def get_full_schema(db=None):
+    """
+        Tool to extract Schema of the Data Base as {table: [(column, type)]}
+    """
+    return introspect_schema(db)["schema"]
+
+def get_foreign_keys(db=None):
+    """
+        Tool to get all Foreign keys as (table, column, foreign_table, foreign_column) tuples
+    """
+    return introspect_schema(db)["foreign_keys"]
+
+SCHEMA_FINGERPRINT_QUERY = """
+SELECT md5(coalesce(string_agg(
+    c.relname || '.' || a.attname || ':' || format_type(a.atttypid, a.atttypmod),
+    ',' ORDER BY c.relname, a.attnum
+), '') || coalesce((
+    SELECT string_agg(con.conname, ',' ORDER BY con.conname)
+    FROM pg_catalog.pg_constraint con
+    JOIN pg_catalog.pg_namespace cn ON cn.oid = con.connamespace
+    WHERE con.contype IN ('p', 'f') AND cn.nspname = current_schema()
+), ''))
+FROM pg_catalog.pg_attribute a
+JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = current_schema()
+  AND c.relkind IN ('r', 'p', 'v', 'm')
+  AND a.attnum > 0
+  AND NOT a.attisdropped
+"""
+
+def get_schema_fingerprint(db=None) -> str:
+    """
+        Cheap hash over the pg_catalog column and key definitions.
+        Changes whenever a table, column, type or key is added, dropped or altered.
+    """
+    db = db or get_db()
+    with db_timer("fingerprint"), db._engine.connect() as conn:
+        return conn.execute(text(SCHEMA_FINGERPRINT_QUERY)).scalar()
+
+async def aget_schema_fingerprint(db=None) -> str:
+    db = db or get_db()
+    if not db_supports_async(db):
+        return await run_blocking(get_schema_fingerprint, db)
+    with db_timer("fingerprint"):
+        async with get_async_engine_for(db).connect() as conn:
+            return (await conn.execute(text(SCHEMA_FINGERPRINT_QUERY))).scalar()
+
+DATA_VERSION_QUERY = """
+SELECT coalesce(max(version), 0)::text || ':' || coalesce(max(scrape_timestamp)::text, '')
+FROM metadata_versions
+"""
+
+def get_data_version(db=None) -> str | None:
+    db = db or get_db()
+    if "metadata_versions" not in db.get_usable_table_names():
+        return None
+    with db_timer("data_version"), db._engine.connect() as conn:
+        return conn.execute(text(DATA_VERSION_QUERY)).scalar()
+
+async def aget_data_version(db=None) -> str | None:
+    """
+        Latest metadata_versions entry, bumped by the scraper whenever the market data is reloaded.
+        None when the database has no metadata_versions table.
+    """
+    db = db or get_db()
+    if not db_supports_async(db):
+        return await run_blocking(get_data_version, db)
+    if "metadata_versions" not in db.get_usable_table_names():
+        return None
+    with db_timer("data_version"):
+        async with get_async_engine_for(db).connect() as conn:
+            return (await conn.execute(text(DATA_VERSION_QUERY))).scalar()
+
+def statement_timeout_ms(timeout_ms=None) -> int:
+    return timeout_ms or int(os.getenv("QUERY_TIMEOUT_MS", 15000))
+
+STATEMENT_TIMEOUT_QUERY = "SELECT set_config('statement_timeout', :timeout, true)"
+
+def _set_statement_timeout(conn, timeout_ms):
+    """Transaction-local statement_timeout so Postgres itself cancels runaway queries."""
+    if conn.dialect.name == "postgresql":
+        return conn.execute(text(STATEMENT_TIMEOUT_QUERY), {"timeout": str(timeout_ms)})
+    return None
+
+async def _aset_statement_timeout(conn, timeout_ms):
+    pending = _set_statement_timeout(conn, timeout_ms)
+    if pending is not None:
+        await pending
+
+def _result_limits(max_rows, max_bytes, batch_size):
+    return (
+        max_rows or int(os.getenv("QUERY_MAX_ROWS", 1000)),
+        max_bytes or int(os.getenv("QUERY_MAX_BYTES", 2_000_000)),
+        batch_size or int(os.getenv("QUERY_FETCH_BATCH", 200)),
+    )
+
+def _column_metadata(keys, rows):
+    """Column names with the Python type of the first non-null value in each column."""
+    columns = []
+    for key in keys:
+        sample = next((row[key] for row in rows if row[key] is not None), None)
+        columns.append({"name": key, "type": type(sample).__name__ if sample is not None else None})
+    return columns
+
+def fetch_result(query: str, db=None, max_rows: int = None, max_bytes: int = None, batch_size: int = None,
+                 timeout_ms: int = None) -> dict:
+    """
+        Runs a read query on a server-side cursor and fetches it in batches,
+        stopping as soon as the row or byte cap is reached. The statement is
+        cancelled by Postgres after QUERY_TIMEOUT_MS.
+
+        Returns {"columns": [{"name", "type"}], "rows": [dict], "row_count": int, "truncated": bool}
+    """
+    db = db or get_db()
+    max_rows, max_bytes, batch_size = _result_limits(max_rows, max_bytes, batch_size)
+
+    buffer = _ResultBuffer(max_rows, max_bytes)
+    with db_timer("fetch"), db._engine.connect() as conn:
+        _set_statement_timeout(conn, statement_timeout_ms(timeout_ms))
+        conn = conn.execution_options(stream_results=True, max_row_buffer=batch_size)
+        result = conn.execute(text(query))
+        if result.returns_rows:
+            buffer.keys = list(result.keys())
+            while not buffer.truncated:
+                batch = result.fetchmany(batch_size)
+                if not batch:
+                    break
+                buffer.extend(batch)
+        result.close()
+    return buffer.as_dict()
+
+async def afetch_result(query: str, db=None, max_rows: int = None, max_bytes: int = None, batch_size: int = None,
+                        timeout_ms: int = None) -> dict:
+    """
+        Async variant of fetch_result, streaming through the asyncio driver's server-side cursor.
+        Besides the server-side statement_timeout, the client gives up (cancelling the query)
+        shortly after the same deadline, so a stuck connection cannot hold the request.
+    """
+    db = db or get_db()
+    if not db_supports_async(db):
+        return await run_blocking(fetch_result, query, db, max_rows, max_bytes, batch_size, timeout_ms)
+    timeout_ms = statement_timeout_ms(timeout_ms)
+    with db_timer("fetch"):
+        return await asyncio.wait_for(
+            _afetch_result(query, db, *_result_limits(max_rows, max_bytes, batch_size), timeout_ms),
+            timeout=timeout_ms / 1000 + 1
+        )
+
+async def _afetch_result(query, db, max_rows, max_bytes, batch_size, timeout_ms) -> dict:
+    buffer = _ResultBuffer(max_rows, max_bytes)
+    async with get_async_engine_for(db).connect() as conn:
+        await _aset_statement_timeout(conn, timeout_ms)
+        result = await conn.stream(text(query), execution_options={"max_row_buffer": batch_size})
+        buffer.keys = list(result.keys())
+        while not buffer.truncated:
+            batch = await result.fetchmany(batch_size)
+            if not batch:
+                break
+            buffer.extend(batch)
+        await result.close()
+    return buffer.as_dict()
+
+def explain_query(query: str, db=None, timeout_ms: int = None) -> dict:
+    db = db or get_db()
+    with db_timer("explain"), db._engine.connect() as conn:
+        _set_statement_timeout(conn, statement_timeout_ms(timeout_ms))
+        raw = conn.execute(text("EXPLAIN (FORMAT JSON) " + query.strip().rstrip(";"))).scalar()
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+    return _summarize_plan(plan)
+
+async def aexplain_query(query: str, db=None, timeout_ms: int = None) -> dict:
+    """
+        Planner estimate for a query without running it: EXPLAIN (FORMAT JSON).
+        Returns {"total_cost", "plan_rows", "max_rows", "heaviest_node", "node_types"}.
+        Backends without an asyncio driver run it on the sync engine.
+    """
+    db = db or get_db()
+    if not db_supports_async(db):
+        return await run_blocking(explain_query, query, db, timeout_ms)
+    with db_timer("explain"):
+        async with get_async_engine_for(db).connect() as conn:
+            await _aset_statement_timeout(conn, statement_timeout_ms(timeout_ms))
+            raw = (await conn.execute(text("EXPLAIN (FORMAT JSON) " + query.strip().rstrip(";")))).scalar()
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+    return _summarize_plan(plan)
+
+def _summarize_plan(plan: dict) -> dict:
+    nodes, stack = [], [plan]
+    while stack:
+        node = stack.pop()
+        nodes.append(node)
+        stack.extend(node.get("Plans", []))
+
+    heaviest = max(nodes, key=lambda node: node.get("Plan Rows", 0))
+    label = heaviest["Node Type"]
+    if heaviest.get("Relation Name"):
+        label += f" on {heaviest['Relation Name']}"
+    return {
+        "total_cost": plan.get("Total Cost", 0.0),
+        "plan_rows": plan.get("Plan Rows", 0),
+        "max_rows": heaviest.get("Plan Rows", 0),
+        "heaviest_node": label,
+        "node_types": sorted({node["Node Type"] for node in nodes}),
+    }
+
+class _ResultBuffer:
+    """Accumulates fetched rows until the row or byte cap is reached."""
+
+    def __init__(self, max_rows, max_bytes):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.keys = []
+        self.rows = []
+        self.size = 0
+        self.truncated = False
+
+    def extend(self, batch):
+        for row in batch:
+            if len(self.rows) >= self.max_rows or self.size >= self.max_bytes:
+                self.truncated = True
+                return
+            self.size += len(repr(tuple(row)))
+            self.rows.append(dict(zip(self.keys, row)))
+
+    def as_dict(self) -> dict:
+        return {
+            "columns": _column_metadata(self.keys, self.rows),
+            "rows": self.rows,
+            "row_count": len(self.rows),
+            "truncated": self.truncated,
+        }
 
 def fetch_invoice_sample():
     query = """
@@ -0,0 +1,187 @@
+import os
+import re
+import time
+from collections import deque
+
+from sqlalchemy import text
+
+from tools.connect_db import get_db
+from tools.schema_catalog import get_catalog
+from utilis.executor import run_blocking
+
+# Everyday names of the listed companies; the companies table only stores tickers.
+# Aliases of symbols the database does not list are ignored once it has been read.
+DEFAULT_ALIASES = {
+    "Apple": "AAPL", "Microsoft": "MSFT", "Google": "GOOG", "Alphabet": "GOOG",
+    "PayPal": "PYPL", "AIG": "AIG", "American International Group": "AIG",
+    "PG&E": "PCG", "Pacific Gas and Electric": "PCG", "Sears": "SHLDQ",
+    "McDonalds": "MCD", "McDonald's": "MCD", "McDonald": "MCD", "Barclays": "BCS",
+    "Nvidia": "NVDA", "Intel": "INTC", "Amazon": "AMZN",
+}
+
+# Legal suffixes dropped from company names so "Apple Inc." also matches "Apple"
+LEGAL_SUFFIX = re.compile(r"[\s,]+(inc|incorporated|corp|corporation|co|company|ltd|limited|plc|holdings|group|sa|ag|nv)\.?$", re.IGNORECASE)
+TICKER = re.compile(r"^[A-Z][A-Z0-9.\-]{0,5}$")
+YEAR = re.compile(r"\b(19|20)\d{2}\b")
+
+ENTITY_REFRESH_INTERVAL = float(os.getenv("ENTITY_REFRESH_INTERVAL", 300))
+COMPANY_QUERY = "SELECT company_name, symbol FROM companies WHERE symbol IS NOT NULL"
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher: one pass over the text finds every pattern, however many there are.
+    Matching is case-insensitive; patterns added with exact_case=True (tickers) must also match
+    the case of the text, so "all" or "on" in a question never turns into a ticker.
+    """
+
+    def __init__(self):
+        self._goto: list[dict] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list] = [[]]
+
+    def add(self, pattern: str, value, exact_case: bool = False):
+        node = 0
+        for char in pattern.lower():
+            if char not in self._goto[node]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[node][char] = len(self._goto) - 1
+            node = self._goto[node][char]
+        self._out[node].append((len(pattern), pattern, value, exact_case))
+
+    def build(self):
+        """Failure links, breadth first; must run after the last add()."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        return self
+
+    def find(self, text: str) -> list[tuple[int, int, object]]:
+        """Leftmost-longest, non-overlapping whole-word matches as (start, end, value)."""
+        found = []
+        node = 0
+        for index, char in enumerate(text.lower()):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, pattern, value, exact_case in self._out[node]:
+                start, end = index - length + 1, index + 1
+                if exact_case and text[start:end] != pattern:
+                    continue
+                if _word_boundary(text, start, end):
+                    found.append((start, end, value))
+        found.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+        matches, cursor = [], 0
+        for start, end, value in found:
+            if start >= cursor:
+                matches.append((start, end, value))
+                cursor = end
+        return matches
+
+
+def _word_boundary(text: str, start: int, end: int) -> bool:
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not (before.isalnum() or before == "_") and not (after.isalnum() or after == "_")
+
+
+class EntityMatcher:
+    """
+    Company names, aliases and tickers from the companies table, matched in one pass over the
+    question. Reloaded every ENTITY_REFRESH_INTERVAL seconds so newly listed companies show up.
+    """
+
+    def __init__(self, refresh_interval: float = ENTITY_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._automaton: AhoCorasick | None = None
+        self._aliases = 0
+        self._symbols: set[str] = set()
+        self._loaded_at = 0.0
+        self._stats = {"local": 0, "llm": 0}
+
+    def _load_companies(self) -> list[tuple[str, str]]:
+        db = get_db()
+        if "companies" not in get_catalog(db)["columns"]:
+            return []
+        with db._engine.connect() as conn:
+            return [(name, symbol) for name, symbol in conn.execute(text(COMPANY_QUERY))]
+
+    def load(self):
+        try:
+            companies = self._load_companies()
+        except Exception as e:
+            print(f"[ENTITIES] Company list unavailable, using built-in aliases: {e}")
+            companies = []
+        symbols = {symbol.strip().upper() for _, symbol in companies if symbol and symbol.strip()}
+
+        automaton, aliases = AhoCorasick(), 0
+        for alias, symbol in DEFAULT_ALIASES.items():
+            if not symbols or symbol in symbols:
+                automaton.add(alias, symbol, exact_case=alias.isupper() and alias == symbol)
+                aliases += 1
+        for name, symbol in companies:
+            symbol = (symbol or "").strip().upper()
+            if not symbol:
+                continue
+            automaton.add(symbol, symbol, exact_case=True)
+            aliases += 1
+            name = (name or "").strip()
+            for variant in {name, LEGAL_SUFFIX.sub("", name)}:
+                if variant and variant.upper() != symbol:
+                    automaton.add(variant, symbol, exact_case=bool(TICKER.match(variant)))
+                    aliases += 1
+
+        self._automaton = automaton.build()
+        self._aliases, self._symbols = aliases, symbols or set(DEFAULT_ALIASES.values())
+        self._loaded_at = time.monotonic()
+        print(f"[ENTITIES] {aliases} company aliases for {len(self._symbols)} tickers")
+
+    def _stale(self) -> bool:
+        return self._automaton is None or time.monotonic() - self._loaded_at >= self.refresh_interval
+
+    async def aensure_loaded(self):
+        if self._stale():
+            await run_blocking(self.load)
+
+    def resolve(self, question: str) -> tuple[str, dict]:
+        """Question with company names replaced by tickers, plus the companies and years it mentions."""
+        if self._stale():
+            self.load()
+        resolved, companies, cursor = [], [], 0
+        for start, end, symbol in self._automaton.find(question):
+            resolved.append(question[cursor:start] + symbol)
+            cursor = end
+            if symbol not in companies:
+                companies.append(symbol)
+        resolved.append(question[cursor:])
+
+        entities = {}
+        if companies:
+            entities["company"] = companies[0] if len(companies) == 1 else companies
+        years = list(dict.fromkeys(match.group(0) for match in YEAR.finditer(question)))
+        if years:
+            entities["year"] = years[0] if len(years) == 1 else years
+        return "".join(resolved), entities
+
+    def count(self, path: str):
+        self._stats[path] += 1
+
+    def snapshot_stats(self) -> dict:
+        return {
+            "aliases": self._aliases,
+            "tickers": len(self._symbols),
+            "resolved_locally": self._stats["local"],
+            "resolved_by_llm": self._stats["llm"],
+        }
+
+
+entity_matcher = EntityMatcher()
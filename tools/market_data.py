@@ -0,0 +1,228 @@
+import asyncio
+import datetime
+import os
+import time
+from collections import OrderedDict
+
+from sqlalchemy import bindparam, text
+
+from tools.connect_db import get_db
+from utilis.executor import run_blocking
+
+MARKET_DATA_TTL = float(os.getenv("MARKET_DATA_TTL", 60))
+MARKET_DATA_CACHE_SIZE = int(os.getenv("MARKET_DATA_CACHE_SIZE", 256))
+# Age in days of the newest market_prices row still good enough to answer from
+MARKET_DB_MAX_AGE_DAYS = float(os.getenv("MARKET_DB_MAX_AGE_DAYS", 4))
+
+# yfinance periods and the calendar days they cover in market_prices
+PERIOD_DAYS = {"5d": 7, "1mo": 31, "3mo": 92, "6mo": 183, "1y": 366}
+PERIOD_LABELS = {"5d": "5-Day", "1mo": "1-Month", "3mo": "3-Month", "6mo": "6-Month", "1y": "1-Year"}
+
+PRICES_QUERY = text(
+    "SELECT c.symbol, p.date, p.open, p.high, p.low, p.close, p.volume "
+    "FROM market_prices p JOIN companies c ON c.company_id = p.company_id "
+    "WHERE c.symbol IN :symbols AND p.date >= :since ORDER BY c.symbol, p.date"
+).bindparams(bindparam("symbols", expanding=True))
+
+
+class YFinanceProvider:
+    """Live prices from Yahoo Finance; all tickers of a request in one download."""
+
+    name = "yfinance"
+
+    def history(self, tickers: list[str], period: str) -> dict[str, list[dict]]:
+        import yfinance as yf
+        import pandas as pd
+
+        frame = yf.download(tickers, period=period, group_by="ticker", auto_adjust=False, progress=False, threads=True)
+        histories = {}
+        for ticker in tickers:
+            if isinstance(frame.columns, pd.MultiIndex):
+                if ticker not in frame.columns.get_level_values(0):
+                    continue
+                data = frame[ticker]
+            else:
+                data = frame
+            data = data.dropna(how="all")
+            histories[ticker] = [
+                {
+                    "date": index.date().isoformat(),
+                    "open": float(row["Open"]), "high": float(row["High"]), "low": float(row["Low"]),
+                    "close": float(row["Close"]), "volume": int(row["Volume"]),
+                }
+                for index, row in data.iterrows()
+            ]
+        return histories
+
+
+class StaticProvider:
+    """
+    Offline stand-in for YFinanceProvider: serves the given {ticker: [{"date", "open", "high",
+    "low", "close", "volume"}]} histories and counts the calls it receives.
+    """
+
+    name = "static"
+
+    def __init__(self, histories: dict[str, list[dict]]):
+        self.histories = histories
+        self.calls = []
+
+    def history(self, tickers: list[str], period: str) -> dict[str, list[dict]]:
+        self.calls.append((list(tickers), period))
+        days = PERIOD_DAYS.get(period, 7)
+        return {t: self.histories[t][-days:] for t in tickers if self.histories.get(t)}
+
+
+def _default_provider():
+    choice = os.getenv("MARKET_DATA_PROVIDER", "yfinance").lower()
+    # "database" answers from market_prices only
+    return YFinanceProvider() if choice == "yfinance" else None
+
+
+def _load_prices(tickers: list[str], period: str, max_age_days: float) -> dict[str, list[dict]]:
+    """market_prices rows of the period for tickers whose newest row is recent enough."""
+    today = datetime.date.today()
+    since = today - datetime.timedelta(days=PERIOD_DAYS.get(period, 7))
+    with get_db()._engine.connect() as conn:
+        rows = conn.execute(PRICES_QUERY, {"symbols": tickers, "since": since}).mappings().all()
+    histories = {}
+    for row in rows:
+        histories.setdefault(row["symbol"], []).append({
+            "date": row["date"].isoformat(),
+            "open": float(row["open"]), "high": float(row["high"]), "low": float(row["low"]),
+            "close": float(row["close"]), "volume": int(row["volume"] or 0),
+        })
+    oldest = (today - datetime.timedelta(days=max_age_days)).isoformat()
+    return {t: rows for t, rows in histories.items() if rows[-1]["date"] >= oldest}
+
+
+class MarketDataService:
+    """
+    Price histories per (ticker, period), cached for MARKET_DATA_TTL seconds. Tickers missing from
+    the cache are fetched from the provider in one batch, concurrent requests for the same ticker
+    share one fetch, and tickers the provider cannot serve fall back to market_prices when it
+    is fresh enough.
+    """
+
+    def __init__(self, provider=None, ttl: float = MARKET_DATA_TTL, max_size: int = MARKET_DATA_CACHE_SIZE,
+                 max_age_days: float = MARKET_DB_MAX_AGE_DAYS):
+        self.provider = provider if provider is not None else _default_provider()
+        self.ttl = ttl
+        self.max_size = max_size
+        self.max_age_days = max_age_days
+        self._cache: OrderedDict[tuple[str, str], tuple[float, dict]] = OrderedDict()
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+        self._stats = {"hits": 0, "misses": 0, "shared": 0, "provider_calls": 0, "provider_errors": 0, "db_fallbacks": 0}
+
+    def set_provider(self, provider):
+        self.provider = provider
+        self.clear()
+
+    def clear(self):
+        self._cache.clear()
+
+    def _cached(self, key: tuple[str, str]) -> dict | None:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[1]
+
+    def _store(self, key: tuple[str, str], history: dict):
+        self._cache[key] = (time.monotonic() + self.ttl, history)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    async def _fetch(self, tickers: list[str], period: str) -> dict[str, dict]:
+        found = {}
+        if self.provider is not None:
+            self._stats["provider_calls"] += 1
+            try:
+                rows = await run_blocking(self.provider.history, tickers, period)
+                found = {t: {"rows": rows[t], "source": self.provider.name} for t in tickers if rows.get(t)}
+            except Exception as e:
+                self._stats["provider_errors"] += 1
+                print(f"[MARKET_DATA] {self.provider.name} lookup failed: {e}")
+
+        missing = [t for t in tickers if t not in found]
+        if missing:
+            try:
+                rows = await run_blocking(_load_prices, missing, period, self.max_age_days)
+            except Exception as e:
+                print(f"[MARKET_DATA] market_prices fallback failed: {e}")
+                rows = {}
+            if rows:
+                self._stats["db_fallbacks"] += len(rows)
+                print(f"[MARKET_DATA] Answered {sorted(rows)} from market_prices")
+            found.update({t: {"rows": r, "source": "market_prices"} for t, r in rows.items()})
+        return found
+
+    async def histories(self, tickers: list[str], period: str = "5d") -> dict[str, dict]:
+        """{ticker: {"rows": [...], "source": ...}} for every ticker some source could serve."""
+        result, waiting, missing = {}, {}, []
+        for ticker in dict.fromkeys(tickers):
+            key = (ticker, period)
+            if (cached := self._cached(key)) is not None:
+                self._stats["hits"] += 1
+                result[ticker] = cached
+            elif key in self._inflight:
+                self._stats["shared"] += 1
+                waiting[ticker] = self._inflight[key]
+            else:
+                self._stats["misses"] += 1
+                missing.append(ticker)
+
+        if missing:
+            loop = asyncio.get_running_loop()
+            futures = {t: loop.create_future() for t in missing}
+            self._inflight.update({(t, period): future for t, future in futures.items()})
+            found = {}
+            try:
+                found = await self._fetch(missing, period)
+            finally:
+                # Requests sharing this fetch get nothing if it was cancelled
+                for ticker, future in futures.items():
+                    self._inflight.pop((ticker, period), None)
+                    if not future.done():
+                        future.set_result(found.get(ticker))
+            for ticker, history in found.items():
+                self._store((ticker, period), history)
+            result.update(found)
+
+        for ticker, future in waiting.items():
+            if (history := await asyncio.shield(future)) is not None:
+                result[ticker] = history
+        return result
+
+    def snapshot_stats(self) -> dict:
+        return {
+            "provider": self.provider.name if self.provider is not None else None,
+            "entries": len(self._cache),
+            "ttl_seconds": self.ttl,
+            **self._stats,
+        }
+
+
+def summarize(ticker: str, history: dict, period: str = "5d") -> dict:
+    rows = history["rows"]
+    first, latest = rows[0], rows[-1]
+    return {
+        "Ticker": ticker,
+        "Current Price": f"${latest['close']:.2f}",
+        "Volume": int(latest["volume"]),
+        f"{PERIOD_LABELS.get(period, period)} Trend": "Up" if latest["close"] > first["close"] else "Down",
+        "As Of": latest["date"],
+        "Source": history["source"],
+    }
+
+
+market_data = MarketDataService()
+
+
+def set_market_provider(provider=None):
+    """Replaces the live provider (e.g. with a StaticProvider offline); None restores the configured one."""
+    market_data.set_provider(provider if provider is not None else _default_provider())
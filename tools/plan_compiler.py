@@ -0,0 +1,253 @@
+from collections import deque
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+
+
+class PlanCompileError(ValueError):
+    """The plan uses something the compiler does not express; the LLM generator takes over."""
+
+
+# Constructs left to the LLM generator
+UNSUPPORTED = (exp.Subquery, exp.Select, exp.Window, exp.Union, exp.Intersect, exp.Except, exp.Star)
+
+
+def _parse(fragment: str, what: str) -> exp.Expression:
+    if not isinstance(fragment, str) or not fragment.strip():
+        raise PlanCompileError(f"Empty or non-text {what}: {fragment!r}")
+    try:
+        node = sqlglot.parse_one(fragment, read="postgres")
+    except ParseError as e:
+        raise PlanCompileError(f"Cannot parse {what} '{fragment}': {e}")
+    for unsupported in node.find_all(*UNSUPPORTED):
+        if isinstance(unsupported, exp.Star) and isinstance(unsupported.parent, exp.Count):
+            # COUNT(*) counts rows; only bare * projections are left to the generator
+            continue
+        raise PlanCompileError(f"{what} '{fragment}' uses {unsupported.key.upper()}")
+    return node
+
+
+def _has_aggregate(node: exp.Expression) -> bool:
+    return node.find(exp.AggFunc) is not None
+
+
+class _Resolver:
+    """Maps the plan's table.column references onto the catalog's canonical names."""
+
+    def __init__(self, catalog: dict, tables: list[str]):
+        self.canonical = {t.lower(): t for t in catalog["tables"]}
+        self.columns = {t: {c.lower(): c for c in cols} for t, cols in catalog["columns"].items()}
+        self.tables = tables
+        self.aliases: set[str] = set()
+
+    def table(self, name: str) -> str:
+        table = self.canonical.get(name.lower())
+        if table is None:
+            raise PlanCompileError(f"Unknown table '{name}'")
+        return table
+
+    def resolve(self, node: exp.Expression) -> exp.Expression:
+        for column in list(node.find_all(exp.Column)):
+            name = column.name.lower()
+            if column.table:
+                table = self.table(column.table)
+                if table not in self.tables:
+                    raise PlanCompileError(f"'{column.sql()}' uses a table that is not in the plan")
+            elif name in self.aliases:
+                node = self._replace(node, column, exp.column(name, quoted=True))
+                continue
+            else:
+                owners = [t for t in self.tables if name in self.columns[t]]
+                if len(owners) != 1:
+                    raise PlanCompileError(f"Column '{column.name}' is {'ambiguous' if owners else 'unknown'}")
+                table = owners[0]
+            if name not in self.columns[table]:
+                raise PlanCompileError(f"Unknown column '{table}.{column.name}'")
+            node = self._replace(node, column, exp.column(self.columns[table][name], table=table, quoted=True))
+        return node
+
+    @staticmethod
+    def _replace(node: exp.Expression, column: exp.Column, replacement: exp.Expression) -> exp.Expression:
+        # replace() cannot swap the root, so a bare column fragment is returned as the replacement
+        if column is node:
+            return replacement
+        column.replace(replacement)
+        return node
+
+
+def _join_order(tables: list[str], catalog: dict, plan_joins: dict) -> tuple[list[str], list[tuple[str, exp.Expression]]]:
+    """
+    Orders the joins along the FK graph, starting from the first plan table. Tables not
+    directly linked pull in the bridge tables on their shortest FK path.
+    Returns (all tables, [(table, ON condition)]).
+    """
+    edges: dict[frozenset, list[tuple[str, str, str, str]]] = {}
+    for fk in catalog["foreign_keys"]:
+        key = frozenset((fk["from_table"], fk["to_table"]))
+        edges.setdefault(key, []).append((fk["from_table"], fk["from_column"], fk["to_table"], fk["to_column"]))
+
+    def on_condition(a: str, b: str) -> exp.Expression:
+        key = frozenset((a, b))
+        if key in plan_joins:
+            return plan_joins[key]
+        links = edges.get(key, [])
+        if len(links) != 1:
+            raise PlanCompileError(f"{'Several' if links else 'No'} foreign keys between {a} and {b}")
+        ft, fc, tt, tc = links[0]
+        return exp.EQ(
+            this=exp.column(fc, table=ft, quoted=True),
+            expression=exp.column(tc, table=tt, quoted=True),
+        )
+
+    def shortest_path(joined: set[str], target: str) -> list[str]:
+        queue = deque([[target]])
+        seen = {target}
+        while queue:
+            path = queue.popleft()
+            for neighbour in catalog["fk_graph"].get(path[-1], ()):
+                if neighbour in seen:
+                    continue
+                if neighbour in joined:
+                    return path[::-1]
+                seen.add(neighbour)
+                queue.append(path + [neighbour])
+        raise PlanCompileError(f"Table {target} is not connected to {sorted(joined)} by foreign keys")
+
+    ordered = [tables[0]]
+    joins = []
+    pending = deque(tables[1:])
+    while pending:
+        table = pending.popleft()
+        if table in ordered:
+            continue
+        # Bridge tables come first so every ON clause references an already joined table
+        for step in shortest_path(set(ordered), table):
+            partner = next(t for t in catalog["fk_graph"].get(step, ()) if t in ordered)
+            joins.append((step, on_condition(partner, step)))
+            ordered.append(step)
+    return ordered, joins
+
+
+def _plan_joins(plan: dict, resolver: _Resolver) -> dict[frozenset, exp.Expression]:
+    joins = {}
+    for join in plan.get("joins") or []:
+        node = resolver.resolve(_parse(join, "join"))
+        columns = list(node.find_all(exp.Column))
+        if not isinstance(node, exp.EQ) or len(columns) != 2:
+            raise PlanCompileError(f"Join '{join}' is not a simple equality")
+        joins[frozenset(c.table for c in columns)] = node
+    return joins
+
+
+def _order_by(order_by, resolver: _Resolver) -> list[exp.Ordered]:
+    if not order_by:
+        return []
+    items = order_by if isinstance(order_by, list) else [order_by]
+    ordered = []
+    for item in items:
+        if isinstance(item, dict):
+            if not item.get("column"):
+                continue
+            node = resolver.resolve(_parse(str(item["column"]), "order_by"))
+            desc = str(item.get("direction", "asc")).lower().startswith("desc")
+            ordered.append(exp.Ordered(this=node, desc=desc, nulls_first=False))
+        elif isinstance(item, str):
+            expression, _, direction = item.strip().rpartition(" ")
+            if direction.lower() not in ("asc", "desc"):
+                expression, direction = item, "asc"
+            node = resolver.resolve(_parse(expression, "order_by"))
+            ordered.append(exp.Ordered(this=node, desc=direction.lower() == "desc", nulls_first=False))
+        else:
+            raise PlanCompileError(f"Unsupported order_by: {item!r}")
+    return ordered
+
+
+def compile_plan(plan: dict, catalog: dict) -> str:
+    """
+    Renders a validated planner JSON plan into PostgreSQL. Identifiers are quoted, joins
+    follow the FK graph, GROUP BY is completed with every non-aggregated output and
+    aggregate filters move to HAVING.
+
+    Raises PlanCompileError when the plan needs something only the LLM generator can write.
+    """
+    if plan.get("needs_clarification") or plan.get("needs_exploration"):
+        raise PlanCompileError("Plan is not final")
+
+    raw_tables = plan.get("tables") or []
+    if not raw_tables:
+        raise PlanCompileError("Plan has no tables")
+    resolver = _Resolver(catalog, [])
+    tables = list(dict.fromkeys(resolver.table(t) for t in raw_tables))
+
+    # Bridge tables are part of the join, so resolve joins against the full ordered list
+    resolver.tables = list(catalog["tables"])
+    plan_joins = _plan_joins(plan, resolver)
+    ordered, joins = _join_order(tables, catalog, plan_joins)
+    resolver.tables = ordered
+
+    select_items = plan.get("select") or []
+    if not select_items:
+        select_items = list(plan.get("group_by") or []) + list(plan.get("aggregations") or [])
+    if not select_items:
+        raise PlanCompileError("Plan does not say which columns to return")
+
+    aggregations = {}
+    for item in plan.get("aggregations") or []:
+        node = resolver.resolve(_parse(item, "aggregation"))
+        value = node.this if isinstance(node, exp.Alias) else node
+        if not _has_aggregate(value):
+            raise PlanCompileError(f"Aggregation '{item}' has no aggregate function")
+        aggregations[node.alias.lower() if isinstance(node, exp.Alias) else item] = node
+
+    projections = []
+    for item in select_items:
+        parsed = _parse(item, "select")
+        if isinstance(parsed, exp.Column) and not parsed.table and parsed.name.lower() in aggregations:
+            # select names an aggregation by its alias
+            node = aggregations[parsed.name.lower()].copy()
+        else:
+            node = resolver.resolve(parsed)
+        projections.append(node)
+    # Aggregations not named in select are still computed (they usually drive the ordering)
+    outputs = {p.this if isinstance(p, exp.Alias) else p for p in projections}
+    for node in aggregations.values():
+        value = node.this if isinstance(node, exp.Alias) else node
+        if value not in outputs:
+            projections.append(node)
+            outputs.add(value)
+    resolver.aliases.update(p.alias.lower() for p in projections if isinstance(p, exp.Alias))
+
+    where, having = [], []
+    for condition in plan.get("filters") or []:
+        node = resolver.resolve(_parse(condition, "filter"))
+        (having if _has_aggregate(node) else where).append(node)
+
+    group_by = [resolver.resolve(_parse(g, "group_by")) for g in plan.get("group_by") or []]
+    if any(_has_aggregate(p) for p in projections) or having:
+        # GROUP BY completion: every non-aggregated output column must be grouped
+        for projection in projections:
+            value = projection.this if isinstance(projection, exp.Alias) else projection
+            if not _has_aggregate(value) and value not in group_by and value.find(exp.Column):
+                group_by.append(value.copy())
+
+    query = exp.select(*projections).from_(exp.to_table(ordered[0], quoted=True))
+    for table, condition in joins:
+        query = query.join(exp.to_table(table, quoted=True), on=condition)
+    if where:
+        query = query.where(*where)
+    if group_by:
+        query = query.group_by(*group_by)
+    if having:
+        query = query.having(*having)
+    order = _order_by(plan.get("order_by"), resolver)
+    if order:
+        query = query.order_by(*order)
+
+    limit = plan.get("limit")
+    if limit is not None:
+        try:
+            query = query.limit(int(limit))
+        except (TypeError, ValueError):
+            raise PlanCompileError(f"Invalid limit {limit!r}")
+    return query.sql(dialect="postgres", identify=True)
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from .connect_db import get_db
+from .db_tools import introspect_schema, aintrospect_schema, get_schema_fingerprint, aget_schema_fingerprint
+
+# In-memory catalog per database, loaded once and only rebuilt when the fingerprint changes
+_CATALOGS: dict[str, dict] = {}
+_CHECKED_AT: dict[str, float] = {}
+_LOCK = threading.Lock()
+
+SNAPSHOT_DIR = os.getenv(
+    "SCHEMA_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".schema_cache")
+)
+
+
+def _check_interval() -> float:
+    """Seconds between fingerprint checks against the database."""
+    return float(os.getenv("SCHEMA_CHECK_INTERVAL", 60))
+
+
+def _db_key(db) -> str:
+    return db._engine.url.render_as_string(hide_password=False)
+
+
+def _snapshot_path(key: str) -> str:
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return os.path.join(SNAPSHOT_DIR, f"schema_{digest}.json")
+
+
+def _build_catalog(introspection: dict, fingerprint: str) -> dict:
+    """Derives every view the agents need (state schema, planner columns, FK graph) from one introspection."""
+    schema = {table: [tuple(col) for col in cols] for table, cols in introspection["schema"].items()}
+    fk_rows = [tuple(row) for row in introspection["foreign_keys"]]
+    tables = list(schema)
+
+    foreign_keys = [
+        {"from_table": t, "from_column": c, "to_table": ft, "to_column": fc}
+        for t, c, ft, fc in fk_rows
+    ]
+    fk_graph = {t: set() for t in tables}
+    for fk in foreign_keys:
+        fk_graph.setdefault(fk["from_table"], set()).add(fk["to_table"])
+        fk_graph.setdefault(fk["to_table"], set()).add(fk["from_table"])
+
+    return {
+        "fingerprint": fingerprint,
+        "tables": tables,
+        "columns": {t: [col for col, _ in cols] for t, cols in schema.items()},
+        "schema": schema,
+        "primary_keys": introspection.get("primary_keys", {}),
+        "nullable": introspection.get("nullable", {}),
+        "foreign_keys": foreign_keys,
+        "fk_edges": fk_rows,
+        "fk_graph": fk_graph,
+    }
+
+
+def _is_fresh(key: str) -> bool:
+    return time.monotonic() - _CHECKED_AT.get(key, 0) < _check_interval()
+
+
+def _store(key: str, catalog: dict) -> dict:
+    _CATALOGS[key] = catalog
+    _CHECKED_AT[key] = time.monotonic()
+    return catalog
+
+
+def _serve_stale(key: str, catalog: dict | None, error: Exception) -> dict:
+    if catalog is None:
+        raise error
+    # Keep serving the cached catalog while the database is unreachable
+    print(f"[CATALOG] Fingerprint check failed, serving cached schema: {error}")
+    return _store(key, catalog)
+
+
+def _load_snapshot(key: str) -> dict | None:
+    path = _snapshot_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            raw = json.load(f)
+        print(f"[CATALOG] Loaded schema snapshot {path}")
+        return _build_catalog(raw, raw["fingerprint"])
+    except Exception as e:
+        print(f"[CATALOG] Ignoring unreadable snapshot {path}: {e}")
+        return None
+
+
+def _save_snapshot(key: str, catalog: dict):
+    path = _snapshot_path(key)
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "fingerprint": catalog["fingerprint"],
+                "schema": catalog["schema"],
+                "nullable": catalog["nullable"],
+                "primary_keys": catalog["primary_keys"],
+                "foreign_keys": catalog["fk_edges"],
+            }, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"[CATALOG] Could not write snapshot {path}: {e}")
+
+
+def get_catalog(db=None) -> dict:
+    """
+    Returns the schema catalog for the current database.
+    Served from memory (or the on-disk snapshot on cold start); the database is only
+    asked for its fingerprint every SCHEMA_CHECK_INTERVAL seconds and re-introspected when it changed.
+    """
+    db = db or get_db()
+    key = _db_key(db)
+
+    catalog = _CATALOGS.get(key)
+    if catalog is not None and _is_fresh(key):
+        return catalog
+
+    with _LOCK:
+        catalog = _CATALOGS.get(key) or _load_snapshot(key)
+        if catalog is not None and _is_fresh(key):
+            return catalog
+
+        try:
+            fingerprint = get_schema_fingerprint(db)
+        except Exception as e:
+            return _serve_stale(key, catalog, e)
+
+        if catalog is None or catalog["fingerprint"] != fingerprint:
+            print("[CATALOG] Introspecting database schema...")
+            catalog = _build_catalog(introspect_schema(db), fingerprint)
+            _save_snapshot(key, catalog)
+        return _store(key, catalog)
+
+
+async def aget_catalog(db=None) -> dict:
+    """
+    Async variant of get_catalog: the fingerprint check and any re-introspection
+    go through the asyncio driver so the event loop is never blocked.
+    """
+    db = db or get_db()
+    key = _db_key(db)
+
+    catalog = _CATALOGS.get(key)
+    if catalog is not None and _is_fresh(key):
+        return catalog
+
+    catalog = catalog or _load_snapshot(key)
+    try:
+        fingerprint = await aget_schema_fingerprint(db)
+    except Exception as e:
+        return _serve_stale(key, catalog, e)
+
+    if catalog is None or catalog["fingerprint"] != fingerprint:
+        print("[CATALOG] Introspecting database schema...")
+        catalog = _build_catalog(await aintrospect_schema(db), fingerprint)
+        _save_snapshot(key, catalog)
+    return _store(key, catalog)
+
+
+# Short spellings of the Postgres types the prompts see
+TYPE_ALIASES = {
+    "integer": "int",
+    "smallint": "int",
+    "numeric": "num",
+    "double precision": "float",
+    "real": "float",
+    "character varying": "varchar",
+    "timestamp without time zone": "timestamp",
+    "timestamp with time zone": "timestamptz",
+    "boolean": "bool",
+}
+
+
+def render_schema(schema: dict, foreign_keys=(), primary_keys: dict | None = None,
+                  tables=None, columns: dict | None = None, types: bool = True) -> str:
+    """
+    Compact prompt rendering shared by every agent, one line per table:
+        financial_statements(id:int PK, company_id:int->companies.company_id, year:int, revenue:num)
+
+    `schema` is {table: [(column, type)]} and `foreign_keys` the catalog's (table, column,
+    foreign_table, foreign_column) rows. `tables` / `columns` restrict what is rendered.
+    """
+    references = {}
+    for fk in foreign_keys:
+        t, c, ft, fc = (fk["from_table"], fk["from_column"], fk["to_table"], fk["to_column"]) if isinstance(fk, dict) else fk
+        references[(t, c)] = f"{ft}.{fc}"
+    primary_keys = primary_keys or {}
+
+    lines = []
+    for table in tables or schema:
+        if table not in schema:
+            continue
+        keep = set(columns[table]) if columns and table in columns else None
+        parts = []
+        for column, *rest in schema[table]:
+            if keep is not None and column not in keep:
+                continue
+            part = column
+            if types and rest:
+                part += ":" + TYPE_ALIASES.get(str(rest[0]).lower(), str(rest[0]).lower())
+            if column in primary_keys.get(table, ()):
+                part += " PK"
+            if (table, column) in references:
+                part += "->" + references[(table, column)]
+            parts.append(part)
+        lines.append(f"{table}({', '.join(parts)})")
+    return "\n".join(lines)
+
+
+def invalidate_catalog(db=None):
+    """Forces the next get_catalog call to re-check the database."""
+    db = db or get_db()
+    _CHECKED_AT.pop(_db_key(db), None)
+
+
+def warm_catalog(db=None) -> dict:
+    """Loads the catalog eagerly, used at application startup."""
+    catalog = get_catalog(db)
+    print(f"[CATALOG] Schema ready: {len(catalog['tables'])} tables (fingerprint {catalog['fingerprint'][:8]})")
+    return catalog
@@ -0,0 +1,214 @@
+import re
+from collections import defaultdict, deque
+
+# Business vocabulary -> columns ("column" or "table.column"); entries missing from the schema are ignored
+SYNONYMS = {
+    "profit": ["net_income", "gross_profit"],
+    "earnings": ["net_income", "earning_per_share"],
+    "income": ["net_income"],
+    "bottom line": ["net_income"],
+    "margin": ["net_profit_margin"],
+    "eps": ["earning_per_share"],
+    "sales": ["revenue"],
+    "turnover": ["revenue"],
+    "top line": ["revenue"],
+    "valuation": ["market_cap_billion"],
+    "market cap": ["market_cap_billion"],
+    "market capitalization": ["market_cap_billion"],
+    "price": ["market_prices.close"],
+    "stock price": ["market_prices.close"],
+    "share price": ["market_prices.close"],
+    "closing": ["market_prices.close"],
+    "opening": ["market_prices.open"],
+    "traded": ["market_prices.volume"],
+    "moving average": ["ma_7", "ma_30"],
+    "daily change": ["daily_pct_change"],
+    "daily return": ["daily_pct_change"],
+    "return": ["daily_pct_change", "roe", "roa", "roi"],
+    "spike": ["volume_spike"],
+    "cash flow": ["cashflow_operating", "cashflow_investing", "cashflow_financing"],
+    "debt": ["debt_equity_ratio"],
+    "leverage": ["debt_equity_ratio"],
+    "liquidity": ["current_ratio"],
+    "headcount": ["number_of_employees"],
+    "staff": ["number_of_employees"],
+    "inflation": ["inflation_rate_us"],
+    "sector": ["category"],
+    "industry": ["category"],
+    "ticker": ["symbol"],
+    "firm": ["company_name"],
+    "annual": ["year"],
+    "yearly": ["year"],
+    "daily": ["date"],
+}
+
+# Column name parts that say nothing on their own
+WEAK_PARTS = {"id", "us", "of", "on", "per", "to", "ma", "billion", "million"}
+
+# Capitalised words that are not company names
+COMMON_WORDS = {
+    "what", "which", "who", "how", "show", "list", "give", "get", "find", "compare", "top", "the",
+    "and", "for", "in", "of", "is", "are", "was", "were", "a", "an", "i", "me", "all", "average",
+    "total", "eps", "roe", "roa", "roi", "ebitda", "usd", "ceo",
+}
+
+WORD = re.compile(r"[A-Za-z][A-Za-z0-9&'.]*|\d+")
+
+# Scores: whole column name / synonym, table name, single part of a column name
+PHRASE, TABLE, PART = 3.0, 2.0, 1.0
+
+
+def _stem(word: str) -> str:
+    word = word.lower().strip("'.")
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _phrase(text: str) -> tuple[str, ...]:
+    return tuple(_stem(w) for w in re.split(r"[_\s]+", text) if w)
+
+
+class SchemaIndex:
+    """
+    Inverted index over table names, column names and business synonyms, built once per
+    schema fingerprint. select() returns the smallest table/column set a question needs,
+    plus the bridge tables that connect it along the FK graph.
+    """
+
+    def __init__(self, catalog: dict):
+        self.tables = list(catalog["tables"])
+        self.columns = {t: list(cols) for t, cols in catalog["columns"].items()}
+        self.fk_graph = catalog["fk_graph"]
+        self.keys = defaultdict(set)
+        for table, cols in catalog.get("primary_keys", {}).items():
+            self.keys[table].update(cols)
+        referencing = set()
+        for fk in catalog["foreign_keys"]:
+            self.keys[fk["from_table"]].add(fk["from_column"])
+            self.keys[fk["to_table"]].add(fk["to_column"])
+            referencing.add((fk["from_table"], fk["from_column"]))
+
+        types = {t: dict(cols) for t, cols in catalog.get("schema", {}).items()}
+        self.temporal = {
+            (t, c) for t, cols in self.columns.items() for c in cols
+            if c in ("year", "date") or "date" in str(types.get(t, {}).get(c, "")).lower()
+        }
+        self.entity = {(t, c) for t, cols in self.columns.items() for c in cols if c == "symbol" or c.endswith("_name")}
+
+        # phrase (tuple of stems) -> {(table, column or None): score}
+        self.index: dict[tuple, dict] = defaultdict(dict)
+        for table in self.tables:
+            self._add(_phrase(table), (table, None), TABLE)
+            for part in _phrase(table):
+                self._add((part,), (table, None), PART)
+            for column in self.columns[table]:
+                if (table, column) in referencing:
+                    # "company" in financial_statements.company_id means the companies table
+                    continue
+                self._add(_phrase(column), (table, column), PHRASE)
+                for part in _phrase(column):
+                    if part not in WEAK_PARTS:
+                        self._add((part,), (table, column), PART)
+        for phrase, targets in SYNONYMS.items():
+            for target in targets:
+                table, _, column = target.rpartition(".")
+                for t in ([table] if table else self.tables):
+                    if column in self.columns.get(t, ()):
+                        self._add(_phrase(phrase), (t, column), PHRASE)
+        self.max_len = max((len(p) for p in self.index), default=1)
+
+    def _add(self, phrase: tuple, target: tuple, score: float):
+        if phrase:
+            self.index[phrase][target] = max(score, self.index[phrase].get(target, 0.0))
+
+    def _hits(self, question: str) -> dict[tuple, float]:
+        words = WORD.findall(question or "")
+        stems = [_stem(w) for w in words]
+        hits: dict[tuple, float] = defaultdict(float)
+        i = 0
+        while i < len(stems):
+            # Longest phrase first, its words are not matched again on their own
+            for size in range(min(self.max_len, len(stems) - i), 0, -1):
+                targets = self.index.get(tuple(stems[i:i + size]))
+                if targets:
+                    for target, score in targets.items():
+                        hits[target] = max(hits[target], score)
+                    i += size
+                    break
+            else:
+                word = words[i]
+                proper_noun = (i and word[:1].isupper()) or (word.isupper() and len(word) >= 2)
+                if proper_noun and word.lower() not in COMMON_WORDS:
+                    # Unknown proper noun or ticker: a company to filter on
+                    for target in self.entity:
+                        hits[target] = max(hits[target], PART)
+                i += 1
+        return hits
+
+    def metric_columns(self, question: str) -> set[str]:
+        """"table.column" of every column the question names outright or through a synonym."""
+        return {f"{t}.{c}" for (t, c), score in self._hits(question).items() if c and score >= PHRASE}
+
+    def _connect(self, tables: list[str]) -> list[str]:
+        """Adds the bridge tables on the shortest FK path between the selected tables."""
+        connected = [tables[0]]
+        for target in tables[1:]:
+            if target in connected:
+                continue
+            queue, seen = deque([[target]]), {target}
+            while queue:
+                path = queue.popleft()
+                if path[-1] in connected:
+                    connected.extend(t for t in path if t not in connected)
+                    break
+                for neighbour in sorted(self.fk_graph.get(path[-1], ())):
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        queue.append(path + [neighbour])
+            else:
+                connected.append(target)
+        return connected
+
+    def select(self, question: str) -> dict | None:
+        """
+        Returns {"tables": [...], "columns": {table: [...]}, "bridges": [...]} or None when
+        nothing in the question matches the schema (the caller then sends everything).
+        """
+        hits = self._hits(question)
+        if not hits:
+            return None
+
+        scores = defaultdict(float)
+        for (table, _), score in hits.items():
+            scores[table] += score
+        ranked = sorted(scores, key=lambda t: (-scores[t], self.tables.index(t)))
+        tables = self._connect(ranked)
+        bridges = [t for t in tables if t not in scores]
+
+        columns = {}
+        for table in tables:
+            named = {c for t, c in hits if t == table and c}
+            if hits.get((table, None), 0) >= TABLE or (table in scores and not named):
+                # Asked about the table itself, so any of its columns may be the answer
+                columns[table] = list(self.columns[table])
+                continue
+            if table in scores:
+                # One or two columns, and without them "latest", "monthly" or "over time" cannot be planned
+                named |= {c for t, c in self.temporal if t == table}
+            keep = named | self.keys[table]
+            columns[table] = [c for c in self.columns[table] if c in keep]
+        return {"tables": tables, "columns": columns, "bridges": bridges}
+
+
+_INDEXES: dict[str, SchemaIndex] = {}
+
+
+def get_schema_index(catalog: dict) -> SchemaIndex:
+    """One index per schema fingerprint; rebuilt only when the catalog changes."""
+    index = _INDEXES.get(catalog["fingerprint"])
+    if index is None:
+        index = _INDEXES[catalog["fingerprint"]] = SchemaIndex(catalog)
+    return index
@@ -0,0 +1,431 @@
+import difflib
+import re
+from collections import deque
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+from sqlglot.optimizer.scope import traverse_scope
+
+from tools.db_tools import afetch_result
+
+# (kind, patterns) checked in order against validator, cost guard and Postgres messages
+FAILURE_PATTERNS = (
+    ("too_expensive", (r"rejected as too expensive",)),
+    ("timeout", (r"statement timeout", r"cancelled after", r"canceling statement")),
+    ("ambiguous_column", (r"is ambiguous",)),
+    ("missing_join", (r"not a table or alias", r"missing FROM-clause entry")),
+    ("unknown_table", (r"Table '[^']+' does not exist", r"relation \"[^\"]+\" does not exist")),
+    ("unknown_column", (r"Column '[^']+' does not exist", r"column \"?[\w.]+\"? does not exist")),
+    ("type_mismatch", (
+        r"operator does not exist", r"invalid input syntax for type", r"cannot be matched",
+        r"argument of \w+ must be type", r"function [\w.]+\(.*\) does not exist", r"cannot cast",
+        r"date/time field value out of range",
+    )),
+    ("syntax", (r"syntax error", r"Exactly one SQL statement")),
+)
+
+NUMERIC_TYPES = ("int", "numeric", "decimal", "real", "double", "float", "serial", "money")
+TEXT_TYPES = ("char", "text", "citext")
+TEMPORAL_TYPES = ("date", "timestamp")
+
+COMPARISONS = (exp.EQ, exp.NEQ, exp.GT, exp.GTE, exp.LT, exp.LTE)
+
+# Distinct values shown per text column when a query came back empty
+HINT_VALUES = 8
+
+
+def classify_failure(error: str | None, executed: bool = False, has_rows: bool = True) -> str:
+    """
+    Names what went wrong with the last attempt: unknown_column, unknown_table, ambiguous_column,
+    missing_join, type_mismatch, syntax, too_expensive, timeout, zero_rows or other.
+    """
+    if not error:
+        return "zero_rows" if executed and not has_rows else "other"
+    for kind, patterns in FAILURE_PATTERNS:
+        if any(re.search(pattern, error, re.IGNORECASE) for pattern in patterns):
+            return kind
+    return "other"
+
+
+def parse(sql: str) -> exp.Expression | None:
+    try:
+        tree = sqlglot.parse_one(sql, read="postgres")
+    except ParseError:
+        return None
+    return tree if isinstance(tree, exp.Query) else None
+
+
+def _type_family(column_type: str | None) -> str | None:
+    column_type = (column_type or "").lower()
+    for family, names in (("temporal", TEMPORAL_TYPES), ("numeric", NUMERIC_TYPES), ("text", TEXT_TYPES)):
+        if any(name in column_type for name in names):
+            return family
+    return None
+
+
+class _Catalog:
+    """Case-insensitive lookups over the schema catalog."""
+
+    def __init__(self, catalog: dict):
+        self.catalog = catalog
+        self.tables = {t.lower(): t for t in catalog["tables"]}
+        self.types = {
+            t: {column.lower(): (column, column_type) for column, column_type, *_ in cols}
+            for t, cols in catalog["schema"].items()
+        }
+
+    def table(self, name: str) -> str | None:
+        return self.tables.get((name or "").lower())
+
+    def column(self, table: str, name: str) -> tuple[str, str] | None:
+        return self.types.get(table, {}).get((name or "").lower())
+
+    def scope_tables(self, scope) -> dict[str, str]:
+        # alias (or table name) -> catalog table, for the base tables of one SELECT
+        return {
+            alias: self.table(source.name) for alias, source in scope.sources.items()
+            if isinstance(source, exp.Table) and self.table(source.name)
+        }
+
+    def column_table(self, scope, column: exp.Column) -> str | None:
+        tables = self.scope_tables(scope)
+        if column.table:
+            return tables.get(column.table)
+        owners = [t for t in tables.values() if self.column(t, column.name)]
+        return owners[0] if len(owners) == 1 else None
+
+
+def _identifier(name: str, like: exp.Expression) -> exp.Identifier:
+    return exp.to_identifier(name, quoted=bool(getattr(like, "quoted", False)))
+
+
+def _closest(name: str, options) -> str | None:
+    match = difflib.get_close_matches(name.lower(), list(options), n=1, cutoff=0.6)
+    return match[0] if match else None
+
+
+def fix_unknown_tables(tree: exp.Expression, catalog: _Catalog) -> list[str]:
+    """Renames misspelled tables, keeping the old name as alias so qualified columns still resolve."""
+    notes = []
+    for table in list(tree.find_all(exp.Table)):
+        if not table.name or catalog.table(table.name) or table.args.get("db"):
+            continue
+        if any(cte.alias_or_name == table.name for cte in tree.find_all(exp.CTE)):
+            continue
+        match = _closest(table.name, catalog.tables)
+        if not match:
+            continue
+        old = table.name
+        if not table.alias:
+            table.set("alias", exp.TableAlias(this=_identifier(old, table.this)))
+        table.set("this", _identifier(catalog.tables[match], table.this))
+        notes.append(f"table {old} -> {catalog.tables[match]}")
+    return notes
+
+
+def fix_unknown_columns(tree: exp.Expression, catalog: _Catalog) -> list[str]:
+    """Replaces columns that do not exist with the closest column of the same table, or requalifies
+    them when exactly one other table in the FROM clause has that name."""
+    notes = []
+    for scope in traverse_scope(tree):
+        tables = catalog.scope_tables(scope)
+        select_aliases = {
+            p.alias.lower() for p in scope.expression.expressions if isinstance(p, exp.Alias)
+        } if isinstance(scope.expression, exp.Select) else set()
+        for column in scope.columns:
+            if column.table:
+                table = tables.get(column.table)
+                if table is None or catalog.column(table, column.name):
+                    continue
+                owners = [alias for alias, t in tables.items() if catalog.column(t, column.name)]
+                if len(owners) == 1:
+                    column.set("table", _identifier(owners[0], column.args["table"]))
+                    notes.append(f"{table}.{column.name} -> {owners[0]}.{column.name}")
+                    continue
+                match = _closest(column.name, catalog.types[table])
+                if match:
+                    notes.append(f"{table}.{column.name} -> {table}.{catalog.types[table][match][0]}")
+                    column.set("this", _identifier(catalog.types[table][match][0], column.this))
+            elif tables and len(tables) == len(scope.sources) and column.name.lower() not in select_aliases:
+                if any(catalog.column(t, column.name) for t in tables.values()):
+                    continue
+                candidates = {}
+                for alias, table in tables.items():
+                    match = _closest(column.name, catalog.types[table])
+                    if match:
+                        candidates[alias] = catalog.types[table][match][0]
+                if len(set(candidates.values())) == 1:
+                    name = next(iter(candidates.values()))
+                    notes.append(f"{column.name} -> {name}")
+                    column.set("this", _identifier(name, column.this))
+    return notes
+
+
+def fix_ambiguous_columns(tree: exp.Expression, catalog: _Catalog) -> list[str]:
+    """Qualifies an unqualified column present in several tables when the query joins them on it,
+    so every choice returns the same values."""
+    notes = []
+    for scope in traverse_scope(tree):
+        tables = catalog.scope_tables(scope)
+        if not isinstance(scope.expression, exp.Select):
+            continue
+        join_keys = set()
+        for join in scope.expression.args.get("joins") or []:
+            if join.args.get("on") is None:
+                continue
+            for eq in join.args["on"].find_all(exp.EQ):
+                left, right = eq.this, eq.expression
+                if isinstance(left, exp.Column) and isinstance(right, exp.Column) and left.name.lower() == right.name.lower():
+                    join_keys.add(left.name.lower())
+        for column in scope.columns:
+            if column.table or column.name.lower() not in join_keys:
+                continue
+            owners = [alias for alias, t in tables.items() if catalog.column(t, column.name)]
+            if len(owners) > 1:
+                column.set("table", _identifier(owners[0], column.this))
+                notes.append(f"{column.name} -> {owners[0]}.{column.name}")
+    return notes
+
+
+def _fk_path(catalog: dict, joined: set[str], target: str) -> list[str] | None:
+    # Shortest FK path from an already joined table to target, without the joined table
+    queue = deque([[target]])
+    seen = {target}
+    while queue:
+        path = queue.popleft()
+        for neighbour in catalog["fk_graph"].get(path[-1], ()):
+            if neighbour in seen:
+                continue
+            if neighbour in joined:
+                return path[::-1]
+            seen.add(neighbour)
+            queue.append(path + [neighbour])
+    return None
+
+
+def _fk_condition(catalog: dict, a: str, a_ref: str, b: str, b_ref: str) -> exp.Expression | None:
+    links = [
+        fk for fk in catalog["foreign_keys"]
+        if {fk["from_table"], fk["to_table"]} == {a, b}
+    ]
+    if len(links) != 1:
+        return None
+    fk = links[0]
+    refs = {a: a_ref, b: b_ref}
+    return exp.EQ(
+        this=exp.column(fk["from_column"], table=refs[fk["from_table"]], quoted=True),
+        expression=exp.column(fk["to_column"], table=refs[fk["to_table"]], quoted=True),
+    )
+
+
+def fix_missing_joins(tree: exp.Expression, catalog: _Catalog) -> list[str]:
+    """Joins tables that are referenced as table.column but missing from the FROM clause,
+    through their foreign keys (bridge tables included)."""
+    notes = []
+    for scope in traverse_scope(tree):
+        select = scope.expression
+        if not isinstance(select, exp.Select) or not (select.args.get("from_") or select.args.get("from")):
+            continue
+        tables = catalog.scope_tables(scope)
+        missing = []
+        for column in scope.columns:
+            table = catalog.table(column.table) if column.table else None
+            if table and column.table not in scope.sources and table not in missing:
+                if scope.is_subquery and scope.parent and column.table in scope.parent.sources:
+                    continue
+                missing.append(table)
+        for table in missing:
+            joined = {t: alias for alias, t in tables.items()}
+            path = _fk_path(catalog.catalog, set(joined), table)
+            if not path:
+                continue
+            for step in path:
+                partner = next(t for t in catalog.catalog["fk_graph"].get(step, ()) if t in joined)
+                condition = _fk_condition(catalog.catalog, partner, joined[partner], step, step)
+                if condition is None:
+                    break
+                select.join(exp.to_table(step, quoted=True), on=condition, copy=False)
+                joined[step] = step
+                tables[step] = step
+                notes.append(f"join {step}")
+    return notes
+
+
+def _literal_comparisons(tree: exp.Expression, catalog: _Catalog):
+    """Yields (scope, column, literal, predicate) for every column compared with a literal."""
+    for scope in traverse_scope(tree):
+        for predicate in scope.expression.find_all(*COMPARISONS, exp.In, exp.Between, exp.Like):
+            if predicate.find_ancestor(exp.Select) is not scope.expression:
+                continue
+            column = predicate.this
+            if isinstance(predicate, COMPARISONS) and isinstance(column, exp.Literal):
+                column = predicate.expression
+            if not isinstance(column, exp.Column):
+                continue
+            if isinstance(predicate, exp.In):
+                literals = predicate.expressions
+            elif isinstance(predicate, exp.Between):
+                literals = [predicate.args.get("low"), predicate.args.get("high")]
+            else:
+                literals = [predicate.expression if predicate.this is column else predicate.this]
+            for literal in literals:
+                if isinstance(literal, exp.Literal):
+                    yield scope, column, literal, predicate
+
+
+def _is_number(value: str) -> bool:
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+def fix_literal_types(tree: exp.Expression, catalog: _Catalog) -> list[str]:
+    """Casts literals to the type of the column they are compared with: numbers against text
+    columns are quoted, numeric strings against numbers unquoted, bare years against dates
+    compared through EXTRACT(YEAR ...)."""
+    notes = []
+    for scope, column, literal, predicate in list(_literal_comparisons(tree, catalog)):
+        table = catalog.column_table(scope, column)
+        found = catalog.column(table, column.name) if table else None
+        family = _type_family(found[1]) if found else None
+        value = str(literal.this)
+        if family == "text" and not literal.is_string:
+            literal.replace(exp.Literal.string(value))
+            notes.append(f"{column.sql()} compared as text")
+        elif family == "numeric" and literal.is_string and _is_number(value):
+            literal.replace(exp.Literal.number(value))
+            notes.append(f"{column.sql()} compared as number")
+        elif family == "temporal" and not literal.is_string and re.fullmatch(r"\d{4}", value):
+            column.replace(exp.Extract(this=exp.var("YEAR"), expression=column.copy()))
+            notes.append(f"{column.sql()} compared by year")
+    return notes
+
+
+# Local fixers tried per failure kind, all pure rewrites of the parsed query
+LOCAL_FIXERS = {
+    "unknown_table": (fix_unknown_tables,),
+    "unknown_column": (fix_unknown_columns, fix_missing_joins),
+    "ambiguous_column": (fix_ambiguous_columns,),
+    "missing_join": (fix_missing_joins,),
+    "type_mismatch": (fix_literal_types,),
+}
+
+
+def rewrite(sql: str, kind: str, catalog: dict) -> tuple[str, list[str]] | None:
+    """Applies the local fixers for `kind`. Returns (new SQL, notes), or None when nothing applies."""
+    fixers = LOCAL_FIXERS.get(kind)
+    tree = parse(sql) if fixers else None
+    if tree is None:
+        return None
+    lookup = _Catalog(catalog)
+    notes = []
+    for fixer in fixers:
+        notes.extend(fixer(tree, lookup))
+    if not notes:
+        return None
+    return tree.sql(dialect="postgres"), notes
+
+
+async def _probe(query: exp.Expression, db, timeout_ms: int) -> list[dict]:
+    result = await afetch_result(query.sql(dialect="postgres"), db, max_rows=HINT_VALUES, timeout_ms=timeout_ms)
+    return result["rows"]
+
+
+async def fix_literal_values(sql: str, catalog: dict, db, timeout_ms: int = 2000) -> tuple[str, list[str]] | None:
+    """
+    Zero-row repair without the LLM: text filters whose literal only matches the data when case,
+    surrounding spaces or a suffix are ignored ('apple' vs 'Apple Inc.') get the stored value,
+    LIKE becomes ILIKE. Each literal costs one small probe query.
+    """
+    tree = parse(sql)
+    if tree is None:
+        return None
+    lookup = _Catalog(catalog)
+    notes = []
+    for scope, column, literal, predicate in list(_literal_comparisons(tree, lookup)):
+        table = lookup.column_table(scope, column)
+        found = lookup.column(table, column.name) if table else None
+        if not found or _type_family(found[1]) != "text" or not literal.is_string:
+            continue
+        if isinstance(predicate, exp.Like):
+            predicate.replace(exp.ILike(this=predicate.this, expression=predicate.expression))
+            notes.append(f"{column.sql()} LIKE -> ILIKE")
+            continue
+        if not isinstance(predicate, (exp.EQ, exp.In)):
+            continue
+        value = str(literal.this)
+        target = exp.column(found[0], quoted=True)
+        probes = (
+            exp.EQ(this=exp.Lower(this=exp.Trim(this=target.copy())), expression=exp.Literal.string(value.strip().lower())),
+            exp.ILike(this=target.copy(), expression=exp.Literal.string(f"%{value.strip()}%")),
+        )
+        for condition in probes:
+            query = exp.select(target.copy()).distinct().from_(exp.to_table(table, quoted=True)).where(condition).limit(2)
+            rows = await _probe(query, db, timeout_ms)
+            if len(rows) == 1:
+                stored = next(iter(rows[0].values()))
+                if stored is not None and str(stored) != value:
+                    literal.replace(exp.Literal.string(str(stored)))
+                    notes.append(f"{column.sql()} = '{value}' -> '{stored}'")
+                break
+            if rows:
+                break
+    if not notes:
+        return None
+    return tree.sql(dialect="postgres"), notes
+
+
+async def value_hints(sql: str, catalog: dict, db, max_columns: int = 4, timeout_ms: int = 2000) -> list[str]:
+    """What the filtered columns actually contain (ranges, or a few distinct values), for prompts
+    that have to explain an empty result."""
+    tree = parse(sql)
+    if tree is None:
+        return []
+    lookup = _Catalog(catalog)
+    hints, seen = [], set()
+    for scope, column, literal, predicate in list(_literal_comparisons(tree, lookup)):
+        table = lookup.column_table(scope, column)
+        found = lookup.column(table, column.name) if table else None
+        if not found or (table, found[0]) in seen:
+            continue
+        seen.add((table, found[0]))
+        target = exp.column(found[0], quoted=True)
+        source = exp.to_table(table, quoted=True)
+        if _type_family(found[1]) in ("numeric", "temporal"):
+            query = exp.select(exp.Min(this=target.copy()).as_("low"), exp.Max(this=target).as_("high")).from_(source)
+            rows = await _probe(query, db, timeout_ms)
+            if rows:
+                hints.append(f"{table}.{found[0]} ranges from {rows[0]['low']} to {rows[0]['high']}")
+        else:
+            query = exp.select(target.copy()).distinct().from_(source).order_by(target).limit(HINT_VALUES)
+            rows = await _probe(query, db, timeout_ms)
+            values = ", ".join(repr(next(iter(row.values()))) for row in rows)
+            hints.append(f"{table}.{found[0]} values include {values}")
+        if len(seen) >= max_columns:
+            break
+    return hints
+
+
+def failing_fragment(sql: str, error: str) -> str | None:
+    """The smallest clause of the query (a predicate, select item or join) naming what the error
+    quotes, so a repair prompt can point at it."""
+    tree = parse(sql)
+    if tree is None:
+        return None
+    names = {
+        name.split(".")[-1].lower()
+        for pair in re.findall(r"'([^']+)'|\"([^\"]+)\"", error or "") for name in pair if name
+    }
+    if not names:
+        return None
+    stops = (exp.Where, exp.Having, exp.Join, exp.Group, exp.Order, exp.Select)
+    for node in tree.walk():
+        if isinstance(node, (exp.Column, exp.Table)) and node.name.lower() in names:
+            fragment = node
+            while fragment.parent is not None and not isinstance(fragment.parent, stops):
+                fragment = fragment.parent
+            return fragment.sql(dialect="postgres")
+    return None
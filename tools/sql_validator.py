@@ -0,0 +1,144 @@
+import difflib
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import OptimizeError, ParseError
+from sqlglot.optimizer.qualify import qualify
+from sqlglot.optimizer.scope import traverse_scope
+
+# Statement and clause nodes that write, lock or change session state
+WRITE_NODES = (
+    exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Drop, exp.Create, exp.Alter,
+    exp.TruncateTable, exp.Copy, exp.Grant, exp.Set, exp.Transaction, exp.Commit,
+    exp.Command, exp.Into, exp.Lock, exp.Analyze,
+)
+
+# Functions with side effects outside the query result
+BLOCKED_FUNCTIONS = {
+    "pg_sleep", "pg_terminate_backend", "pg_cancel_backend", "pg_reload_conf", "set_config",
+    "pg_read_file", "pg_read_binary_file", "pg_ls_dir", "lo_import", "lo_export",
+    "dblink", "dblink_exec", "nextval", "setval",
+}
+
+
+def _suggest(name: str, options) -> str:
+    match = difflib.get_close_matches(name, list(options), n=1, cutoff=0.6)
+    return f" Did you mean '{match[0]}'?" if match else ""
+
+
+def _columns_by_table(schema: dict) -> dict[str, set[str]]:
+    return {table.lower(): {col.lower() for col, *_ in cols} for table, cols in schema.items()}
+
+
+def _read_only_errors(tree: exp.Expression) -> list[str]:
+    if not isinstance(tree, exp.Query):
+        return [f"Only read-only SELECT queries are allowed, got {tree.key.upper()}."]
+
+    errors = []
+    for node in tree.walk():
+        if isinstance(node, WRITE_NODES):
+            errors.append(f"{node.key.upper()} is not allowed in a read-only query.")
+        elif isinstance(node, exp.Func):
+            name = node.name if isinstance(node, exp.Anonymous) else node.sql_name()
+            if name.lower() in BLOCKED_FUNCTIONS:
+                errors.append(f"Function {name}() is not allowed.")
+    return errors
+
+
+def _unqualified_errors(name: str, tables: dict[str, str], columns: dict[str, set[str]], correlated: bool) -> list[str]:
+    owners = [alias for alias, table in tables.items() if name.lower() in columns[table]]
+    if len(owners) > 1:
+        return [f"Column '{name}' is ambiguous, it exists in {', '.join(owners)}. Write it as alias.{name}."]
+    if not owners and not correlated:
+        known = set().union(*(columns[table] for table in tables.values())) if tables else set()
+        return [f"Column '{name}' does not exist in {', '.join(tables.values()) or 'the FROM clause'}.{_suggest(name.lower(), known)}"]
+    return []
+
+
+def _resolve_qualifier(scope, qualifier: str):
+    # Correlated subqueries may reference aliases of the enclosing queries
+    while scope is not None:
+        if qualifier in scope.sources:
+            return scope.sources[qualifier]
+        scope = scope.parent if scope.is_subquery else None
+    return None
+
+
+def _reference_errors(tree: exp.Expression, columns: dict[str, set[str]]) -> list[str]:
+    """Checks every table, alias and qualified column reference, scope by scope."""
+    errors = []
+    for scope in traverse_scope(tree):
+        for alias, source in scope.sources.items():
+            if isinstance(source, exp.Table) and source.name and source.name.lower() not in columns:
+                errors.append(f"Table '{source.name}' does not exist.{_suggest(source.name.lower(), columns)}")
+
+        tables = {
+            alias: source.name.lower() for alias, source in scope.sources.items()
+            if isinstance(source, exp.Table) and source.name.lower() in columns
+        }
+        select_aliases = {
+            projection.alias.lower() for projection in scope.expression.expressions
+            if isinstance(projection, exp.Alias)
+        } if isinstance(scope.expression, exp.Select) else set()
+
+        for column in scope.columns:
+            qualifier = column.table
+            if not qualifier:
+                # Only decidable here when every source is a known base table; a subquery may
+                # also reference the outer query, which qualify() checks below
+                if (len(tables) == len(scope.sources) and column.name.lower() not in select_aliases
+                        and column.find_ancestor(exp.Select) is scope.expression):
+                    errors.extend(_unqualified_errors(column.name, tables, columns, correlated=scope.is_subquery))
+                continue
+            source = _resolve_qualifier(scope, qualifier)
+            if source is None:
+                errors.append(
+                    f"'{qualifier}.{column.name}' refers to '{qualifier}', which is not a table or alias "
+                    f"in this FROM clause (available: {', '.join(scope.sources) or 'none'})."
+                )
+            elif isinstance(source, exp.Table):
+                table = source.name.lower()
+                if table in columns and column.name.lower() not in columns[table]:
+                    errors.append(
+                        f"Column '{column.name}' does not exist in table '{table}'."
+                        f"{_suggest(column.name.lower(), columns[table])}"
+                    )
+    return list(dict.fromkeys(errors))
+
+
+def validate_sql(sql: str, schema: dict) -> tuple[exp.Expression | None, list[str]]:
+    """
+    Parses generated SQL and checks it against the cached schema without touching the database.
+    Enforces a single read-only statement, then resolves every table, alias and column reference.
+
+    Returns (parsed tree, []) when valid, otherwise (tree or None, [error messages for the generator]).
+    """
+    try:
+        statements = [s for s in sqlglot.parse(sql, read="postgres") if s is not None]
+    except ParseError as e:
+        return None, [f"SQL syntax error: {e.errors[0]['description'] if e.errors else e}"]
+
+    if len(statements) != 1:
+        return None, [f"Exactly one SQL statement is allowed, got {len(statements)}."]
+    tree = statements[0]
+
+    errors = _read_only_errors(tree)
+    if errors or not schema:
+        return tree, errors
+
+    columns = _columns_by_table(schema)
+    errors = _reference_errors(tree, columns)
+    if errors:
+        return tree, errors
+
+    # Unqualified columns: let the optimizer resolve each one to exactly one source
+    try:
+        qualify(
+            tree.copy(),
+            schema={table: {col: "UNKNOWN" for col in cols} for table, cols in columns.items()},
+            dialect="postgres",
+            validate_qualify_columns=True,
+        )
+    except OptimizeError as e:
+        return tree, [f"{e}. Qualify columns as table.column using the schema."]
+    return tree, []
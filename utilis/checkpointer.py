@@ -0,0 +1,431 @@
+import os
+import random
+import threading
+import time
+import zlib
+from collections import defaultdict
+
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from sqlalchemy import (
+    Column, Float, Integer, LargeBinary, MetaData, String, Table, Text, create_engine, delete, event, func, select,
+)
+
+from utilis.executor import run_blocking
+
+DEFAULT_URL = "sqlite:///" + os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".checkpoints", "graph.db"
+)
+
+metadata = MetaData()
+
+checkpoints_table = Table(
+    "graph_checkpoints", metadata,
+    Column("thread_id", String(64), primary_key=True),
+    Column("checkpoint_ns", String(255), primary_key=True),
+    Column("checkpoint_id", String(64), primary_key=True),
+    Column("parent_checkpoint_id", String(64)),
+    Column("type", String(32)),
+    Column("checkpoint", LargeBinary),
+    Column("metadata", LargeBinary),
+)
+
+# Channel values, stored once per channel version and shared by the checkpoints that reference it
+blobs_table = Table(
+    "graph_checkpoint_blobs", metadata,
+    Column("thread_id", String(64), primary_key=True),
+    Column("checkpoint_ns", String(255), primary_key=True),
+    Column("channel", String(255), primary_key=True),
+    Column("version", String(64), primary_key=True),
+    Column("type", String(32)),
+    Column("blob", LargeBinary),
+)
+
+writes_table = Table(
+    "graph_checkpoint_writes", metadata,
+    Column("thread_id", String(64), primary_key=True),
+    Column("checkpoint_ns", String(255), primary_key=True),
+    Column("checkpoint_id", String(64), primary_key=True),
+    Column("task_id", String(64), primary_key=True),
+    Column("idx", Integer, primary_key=True),
+    Column("channel", String(255)),
+    Column("type", String(32)),
+    Column("blob", LargeBinary),
+    Column("task_path", Text),
+)
+
+# Last activity per thread, for TTL eviction
+threads_table = Table(
+    "graph_threads", metadata,
+    Column("thread_id", String(64), primary_key=True),
+    Column("updated_at", Float, index=True),
+)
+
+THREAD_TABLES = (writes_table, blobs_table, checkpoints_table, threads_table)
+
+
+class CompressedSerializer(JsonPlusSerializer):
+    """msgpack like the default serializer, zlib-compressed above `min_size` bytes (result rows,
+    schema dicts and chat history compress several times over)."""
+
+    SUFFIX = "+zlib"
+
+    def __init__(self, min_size: int = 512, level: int = 6):
+        super().__init__()
+        self.min_size = min_size
+        self.level = level
+
+    def dumps_typed(self, obj) -> tuple[str, bytes]:
+        type_, data = super().dumps_typed(obj)
+        if len(data) >= self.min_size:
+            return type_ + self.SUFFIX, zlib.compress(data, self.level)
+        return type_, data
+
+    def loads_typed(self, data: tuple[str, bytes]):
+        type_, payload = data
+        if type_.endswith(self.SUFFIX):
+            return super().loads_typed((type_[:-len(self.SUFFIX)], zlib.decompress(payload)))
+        return super().loads_typed(data)
+
+
+class SQLCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    LangGraph checkpointer on SQLite or Postgres through SQLAlchemy, so conversations survive
+    restarts and every uvicorn worker sees the same threads. Every `prune_every` writes a thread is
+    cut back to its newest `keep` checkpoints (so it holds at most keep + prune_every - 1), with
+    the channel values only older ones used and the subgraph checkpoints they left behind, and
+    evict_idle() drops threads untouched for longer than the TTL.
+    """
+
+    def __init__(self, url: str, keep: int = 3, ttl_seconds: float = 86400, prune_every: int = 10, serde=None):
+        super().__init__(serde=serde or CompressedSerializer())
+        self.url = url
+        self.keep = keep
+        self.ttl_seconds = ttl_seconds
+        self.prune_every = prune_every
+        if url.startswith("sqlite:///"):
+            os.makedirs(os.path.dirname(os.path.abspath(url[len("sqlite:///"):])), exist_ok=True)
+            self.engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 30})
+            event.listen(self.engine, "connect", _sqlite_pragmas)
+        else:
+            self.engine = create_engine(url, pool_pre_ping=True)
+        self._ready = False
+        self._lock = threading.Lock()
+        self._puts: dict[tuple[str, str], int] = defaultdict(int)
+        self._stats = {"pruned_checkpoints": 0, "evicted_threads": 0}
+
+    def setup(self):
+        if self._ready:
+            return
+        with self._lock:
+            if not self._ready:
+                metadata.create_all(self.engine)
+                self._ready = True
+
+    def _config(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str | None) -> dict | None:
+        if not checkpoint_id:
+            return None
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+    def _tuple(self, conn, row) -> CheckpointTuple:
+        checkpoint = self.serde.loads_typed((row.type, row.checkpoint))
+        key = (row.thread_id, row.checkpoint_ns)
+        versions = checkpoint.get("channel_versions") or {}
+        channel_values = {}
+        if versions:
+            blobs = conn.execute(select(blobs_table).where(
+                blobs_table.c.thread_id == key[0],
+                blobs_table.c.checkpoint_ns == key[1],
+                blobs_table.c.channel.in_(list(versions)),
+            )).all()
+            for blob in blobs:
+                if versions.get(blob.channel) == blob.version and blob.type != "empty":
+                    channel_values[blob.channel] = self.serde.loads_typed((blob.type, blob.blob))
+        writes = conn.execute(select(writes_table).where(
+            writes_table.c.thread_id == key[0],
+            writes_table.c.checkpoint_ns == key[1],
+            writes_table.c.checkpoint_id == row.checkpoint_id,
+        ).order_by(writes_table.c.task_id, writes_table.c.idx)).all()
+        return CheckpointTuple(
+            config=self._config(row.thread_id, row.checkpoint_ns, row.checkpoint_id),
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed(("msgpack", row.metadata)) if row.metadata else {},
+            parent_config=self._config(row.thread_id, row.checkpoint_ns, row.parent_checkpoint_id),
+            pending_writes=[(w.task_id, w.channel, self.serde.loads_typed((w.type, w.blob))) for w in writes],
+        )
+
+    def get_tuple(self, config) -> CheckpointTuple | None:
+        self.setup()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = select(checkpoints_table).where(
+            checkpoints_table.c.thread_id == thread_id,
+            checkpoints_table.c.checkpoint_ns == checkpoint_ns,
+        )
+        if checkpoint_id := get_checkpoint_id(config):
+            query = query.where(checkpoints_table.c.checkpoint_id == checkpoint_id)
+        else:
+            query = query.order_by(checkpoints_table.c.checkpoint_id.desc()).limit(1)
+        with self.engine.connect() as conn:
+            row = conn.execute(query).first()
+            return self._tuple(conn, row) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        self.setup()
+        query = select(checkpoints_table).order_by(checkpoints_table.c.checkpoint_id.desc())
+        if config:
+            query = query.where(checkpoints_table.c.thread_id == config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                query = query.where(checkpoints_table.c.checkpoint_ns == config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                query = query.where(checkpoints_table.c.checkpoint_id == checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            query = query.where(checkpoints_table.c.checkpoint_id < before_id)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).all()
+            found = []
+            for row in rows:
+                item = self._tuple(conn, row)
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                found.append(item)
+                if limit is not None and len(found) >= limit:
+                    break
+        yield from found
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        self.setup()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        copy = checkpoint.copy()
+        values = copy.pop("channel_values")
+        type_, payload = self.serde.dumps_typed(copy)
+        # Metadata is small and stays plain msgpack, so its type needs no column of its own
+        meta = JsonPlusSerializer.dumps_typed(self.serde, get_checkpoint_metadata(config, metadata))[1]
+
+        with self.engine.begin() as conn:
+            for channel, version in new_versions.items():
+                blob_type, blob = self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")
+                conn.execute(delete(blobs_table).where(
+                    blobs_table.c.thread_id == thread_id, blobs_table.c.checkpoint_ns == checkpoint_ns,
+                    blobs_table.c.channel == channel, blobs_table.c.version == str(version),
+                ))
+                conn.execute(blobs_table.insert().values(
+                    thread_id=thread_id, checkpoint_ns=checkpoint_ns, channel=channel,
+                    version=str(version), type=blob_type, blob=blob,
+                ))
+            conn.execute(delete(checkpoints_table).where(
+                checkpoints_table.c.thread_id == thread_id, checkpoints_table.c.checkpoint_ns == checkpoint_ns,
+                checkpoints_table.c.checkpoint_id == checkpoint["id"],
+            ))
+            conn.execute(checkpoints_table.insert().values(
+                thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id=checkpoint["id"],
+                parent_checkpoint_id=config["configurable"].get("checkpoint_id"),
+                type=type_, checkpoint=payload, metadata=meta,
+            ))
+            self._touch(conn, thread_id)
+
+        key = (thread_id, checkpoint_ns)
+        self._puts[key] += 1
+        if self._puts[key] % self.prune_every == 0:
+            self.prune(thread_id, checkpoint_ns)
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        self.setup()
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        scope = (
+            writes_table.c.thread_id == thread_id,
+            writes_table.c.checkpoint_ns == checkpoint_ns,
+            writes_table.c.checkpoint_id == checkpoint_id,
+            writes_table.c.task_id == task_id,
+        )
+        with self.engine.begin() as conn:
+            existing = set(conn.execute(select(writes_table.c.idx).where(*scope)).scalars())
+            for position, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, position)
+                if idx in existing:
+                    # Regular writes are kept from the first attempt, special ones (errors, interrupts) replaced
+                    if idx >= 0:
+                        continue
+                    conn.execute(delete(writes_table).where(*scope, writes_table.c.idx == idx))
+                blob_type, blob = self.serde.dumps_typed(value)
+                conn.execute(writes_table.insert().values(
+                    thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id=checkpoint_id,
+                    task_id=task_id, idx=idx, channel=channel, type=blob_type, blob=blob, task_path=task_path,
+                ))
+
+    def delete_thread(self, thread_id: str):
+        self.setup()
+        with self.engine.begin() as conn:
+            for table in THREAD_TABLES:
+                conn.execute(delete(table).where(table.c.thread_id == thread_id))
+        self._forget(thread_id)
+
+    def _touch(self, conn, thread_id: str):
+        conn.execute(delete(threads_table).where(threads_table.c.thread_id == thread_id))
+        conn.execute(threads_table.insert().values(thread_id=thread_id, updated_at=time.time()))
+
+    def _forget(self, thread_id: str):
+        for key in [key for key in self._puts if key[0] == thread_id]:
+            self._puts.pop(key, None)
+
+    def prune(self, thread_id: str, checkpoint_ns: str = ""):
+        """
+        Keeps the newest `keep` checkpoints of the thread and the channel values they reference.
+        Pruning the root namespace also drops subgraph namespaces older than the oldest kept checkpoint.
+        """
+        scope = (checkpoints_table.c.thread_id == thread_id, checkpoints_table.c.checkpoint_ns == checkpoint_ns)
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                select(checkpoints_table.c.checkpoint_id, checkpoints_table.c.type, checkpoints_table.c.checkpoint)
+                .where(*scope).order_by(checkpoints_table.c.checkpoint_id.desc())
+            ).all()
+            if len(rows) <= self.keep:
+                return
+            kept, dropped = rows[:self.keep], [row.checkpoint_id for row in rows[self.keep:]]
+            conn.execute(delete(checkpoints_table).where(*scope, checkpoints_table.c.checkpoint_id.in_(dropped)))
+            conn.execute(delete(writes_table).where(
+                writes_table.c.thread_id == thread_id, writes_table.c.checkpoint_ns == checkpoint_ns,
+                writes_table.c.checkpoint_id.in_(dropped),
+            ))
+
+            referenced = set()
+            for row in kept:
+                versions = self.serde.loads_typed((row.type, row.checkpoint)).get("channel_versions") or {}
+                referenced.update((channel, str(version)) for channel, version in versions.items())
+            blobs = conn.execute(select(blobs_table.c.channel, blobs_table.c.version).where(
+                blobs_table.c.thread_id == thread_id, blobs_table.c.checkpoint_ns == checkpoint_ns,
+            )).all()
+            for channel, version in blobs:
+                if (channel, version) not in referenced:
+                    conn.execute(delete(blobs_table).where(
+                        blobs_table.c.thread_id == thread_id, blobs_table.c.checkpoint_ns == checkpoint_ns,
+                        blobs_table.c.channel == channel, blobs_table.c.version == version,
+                    ))
+            pruned = len(dropped)
+            if checkpoint_ns == "":
+                pruned += self._prune_subgraphs(conn, thread_id, kept[-1].checkpoint_id)
+        self._stats["pruned_checkpoints"] += pruned
+
+    def _prune_subgraphs(self, conn, thread_id: str, oldest_kept: str) -> int:
+        """
+        Subgraph namespaces (e.g. a fresh "planner:<task_id>" per run) rarely reach prune_every
+        writes of their own: their checkpoints older than the oldest kept root checkpoint (ids are
+        time-ordered) are dropped, and namespaces left without checkpoints lose their writes and blobs.
+        """
+        child = (checkpoints_table.c.thread_id == thread_id, checkpoints_table.c.checkpoint_ns != "")
+        dropped = conn.execute(delete(checkpoints_table).where(
+            *child, checkpoints_table.c.checkpoint_id < oldest_kept,
+        )).rowcount
+        if dropped:
+            conn.execute(delete(writes_table).where(
+                writes_table.c.thread_id == thread_id, writes_table.c.checkpoint_ns != "",
+                writes_table.c.checkpoint_id < oldest_kept,
+            ))
+        live = select(checkpoints_table.c.checkpoint_ns).where(*child).distinct()
+        for table in (writes_table, blobs_table):
+            conn.execute(delete(table).where(
+                table.c.thread_id == thread_id, table.c.checkpoint_ns != "", table.c.checkpoint_ns.not_in(live),
+            ))
+        for key in [key for key in self._puts if key[0] == thread_id and key[1]]:
+            self._puts.pop(key, None)
+        return dropped
+
+    def evict_idle(self, ttl_seconds: float | None = None) -> int:
+        """Deletes every thread with no checkpoint written in the last `ttl_seconds`."""
+        self.setup()
+        cutoff = time.time() - (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        with self.engine.begin() as conn:
+            idle = list(conn.execute(select(threads_table.c.thread_id).where(threads_table.c.updated_at < cutoff)).scalars())
+            for start in range(0, len(idle), 500):
+                batch = idle[start:start + 500]
+                for table in THREAD_TABLES:
+                    conn.execute(delete(table).where(table.c.thread_id.in_(batch)))
+        for thread_id in idle:
+            self._forget(thread_id)
+        self._stats["evicted_threads"] += len(idle)
+        return len(idle)
+
+    def snapshot_stats(self) -> dict:
+        self.setup()
+        with self.engine.connect() as conn:
+            counts = {
+                table.name: conn.execute(select(func.count()).select_from(table)).scalar()
+                for table in (threads_table, checkpoints_table, blobs_table, writes_table)
+            }
+        return {
+            "backend": self.engine.dialect.name,
+            "threads": counts["graph_threads"],
+            "checkpoints": counts["graph_checkpoints"],
+            "blobs": counts["graph_checkpoint_blobs"],
+            "writes": counts["graph_checkpoint_writes"],
+            "keep_per_thread": self.keep,
+            "ttl_seconds": self.ttl_seconds,
+            **self._stats,
+        }
+
+    def close(self):
+        self.engine.dispose()
+
+    async def aget_tuple(self, config):
+        return await run_blocking(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in await run_blocking(lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await run_blocking(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await run_blocking(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str):
+        return await run_blocking(self.delete_thread, thread_id)
+
+    def get_next_version(self, current, channel=None) -> str:
+        # Same zero-padded "<counter>.<random>" versions as MemorySaver, so they sort as strings
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets the workers read while one of them writes
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def build_checkpointer():
+    """
+    Checkpointer chosen by CHECKPOINT_URL: an SQLAlchemy URL (SQLite file by default, or Postgres
+    to share threads across hosts), or "memory" for the in-process MemorySaver.
+    """
+    url = os.getenv("CHECKPOINT_URL", DEFAULT_URL)
+    if url == "memory":
+        print("[CHECKPOINT] Using in-process MemorySaver")
+        return MemorySaver()
+    saver = SQLCheckpointSaver(
+        url,
+        keep=int(os.getenv("CHECKPOINT_KEEP", 3)),
+        ttl_seconds=float(os.getenv("CHECKPOINT_TTL", 86400)),
+        prune_every=int(os.getenv("CHECKPOINT_PRUNE_EVERY", 10)),
+    )
+    print(f"[CHECKPOINT] Using {saver.engine.dialect.name} checkpointer at {saver.engine.url.render_as_string(hide_password=True)}")
+    return saver
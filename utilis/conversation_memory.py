@@ -0,0 +1,119 @@
+import json
+import os
+import re
+
+from utilis.token_usage import estimate_tokens
+
+# Turns kept as full records; older ones are folded into the running summary
+MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", 4))
+# Token budgets of the conversation context sent to the resolver and of the running summary
+MEMORY_CONTEXT_TOKENS = int(os.getenv("MEMORY_CONTEXT_TOKENS", 600))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", 250))
+# Turns an entity survives without being mentioned again
+MEMORY_ENTITY_TURNS = int(os.getenv("MEMORY_ENTITY_TURNS", 3))
+MEMORY_MAX_ENTITIES = int(os.getenv("MEMORY_MAX_ENTITIES", 12))
+
+SQL_CHARS = 300
+GIST_CHARS = 160
+VALUE_CHARS = 80
+
+MARKDOWN = re.compile(r"[*_`#>|]+")
+
+
+def _gist(answer: str) -> str:
+    """First non-empty, non-table line of an answer, without markdown."""
+    for line in (answer or "").splitlines():
+        if line.lstrip().startswith("|"):
+            continue
+        line = MARKDOWN.sub("", line).strip(" -:")
+        if line:
+            return line[:GIST_CHARS]
+    return ""
+
+
+def turn_record(state: dict) -> dict:
+    """What later turns need to know about this one: the question, its entities and the query behind the answer."""
+    record = {
+        "question": state.get("resolved_query") or state.get("user_query", ""),
+        "entities": state.get("turn_entities") or {},
+    }
+    if state.get("route") == "SQL_QUERY" and state.get("safe_sql_query"):
+        record["sql"] = " ".join(state["safe_sql_query"].split())[:SQL_CHARS]
+        record["rows"] = len(state.get("data") or [])
+    else:
+        record["answer"] = _gist(state.get("final_response") or state.get("intent_summary") or "")
+    return record
+
+
+def summarize_turn(record: dict) -> str:
+    line = record.get("question", "")
+    if "rows" in record:
+        line += f" ({record['rows']} rows)"
+    elif record.get("answer"):
+        line += f" -> {record['answer'][:80]}"
+    return line
+
+
+def fold_summary(summary: str, record: dict, budget: int = MEMORY_SUMMARY_TOKENS) -> str:
+    """Adds one turn to the running summary, dropping its oldest lines once it exceeds the budget."""
+    lines = [line for line in (summary or "").split("\n") if line] + [summarize_turn(record)]
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > budget:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def remember_turn(history: list, summary: str, record: dict) -> tuple[list, str]:
+    # Checkpoints written before the memory records held chat messages
+    history = [turn for turn in history or [] if isinstance(turn, dict)] + [record]
+    while len(history) > MEMORY_RECENT_TURNS:
+        summary = fold_summary(summary, history.pop(0))
+    return history, summary
+
+
+def age_entities(context: dict, seen: dict, mentioned: dict, turn: int) -> tuple[dict, dict]:
+    """
+    Entities mentioned this turn are refreshed; those not mentioned for MEMORY_ENTITY_TURNS turns
+    are dropped, and only the MEMORY_MAX_ENTITIES most recent are kept.
+    """
+    seen = {**(seen or {}), **{key: turn for key in mentioned}}
+    seen = {key: last for key, last in seen.items() if key in context and turn - last < MEMORY_ENTITY_TURNS}
+    recent = sorted(seen, key=seen.get, reverse=True)[:MEMORY_MAX_ENTITIES]
+    return {key: context[key] for key in recent}, {key: seen[key] for key in recent}
+
+
+def _render_record(record: dict) -> str:
+    parts = [f"Q: {record.get('question', '')}"]
+    if record.get("entities"):
+        parts.append(f"entities: {json.dumps(record['entities'])}")
+    if record.get("sql"):
+        parts.append(f"SQL: {record['sql']}")
+        parts.append(f"rows: {record.get('rows', 0)}")
+    elif record.get("answer"):
+        parts.append(f"A: {record['answer']}")
+    return "- " + " | ".join(parts)
+
+
+def render_memory(history: list, summary: str, budget: int = MEMORY_CONTEXT_TOKENS) -> str:
+    """Newest turns first until the token budget is used, then the summary if it still fits."""
+    lines, used = [], 0
+    for record in reversed([turn for turn in history or [] if isinstance(turn, dict)]):
+        line = _render_record(record)
+        cost = estimate_tokens(line)
+        if lines and used + cost > budget:
+            break
+        lines.insert(0, line)
+        used += cost
+    text = "Recent turns (oldest first):\n" + "\n".join(lines) if lines else ""
+    if summary and used + estimate_tokens(summary) <= budget:
+        text = f"Earlier in the conversation:\n{summary}\n\n{text}"
+    return text
+
+
+def compact_entities(entities: dict) -> dict:
+    """Entities with short values only; the LLM occasionally returns whole sentences or large objects."""
+    compact = {}
+    for key, value in (entities or {}).items():
+        if value in (None, "", [], {}) or len(json.dumps(value, default=str)) > VALUE_CHARS:
+            continue
+        compact[str(key)] = value
+    return compact
@@ -0,0 +1,22 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Bounded pool for blocking libraries (yfinance, Chroma/HuggingFace, Firebase) so they never run on the event loop
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BLOCKING_POOL_SIZE", 8)),
+    thread_name_prefix="blocking"
+)
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Runs a blocking call on the shared executor, keeping the caller's context variables (e.g. the request's db)."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_EXECUTOR, functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+def shutdown_executor():
+    _EXECUTOR.shutdown(wait=False, cancel_futures=True)
@@ -1,15 +1,181 @@
 from langchain_groq import ChatGroq
 from dotenv import load_dotenv
 import os
+import threading
+
+import httpx
+
+from utilis.llm_cache import cache_for
+from utilis.token_usage import usage_callback
+from utilis.metrics import llm_timing_callback
+
 load_dotenv()
-def get_llm():
+
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+
+# (model, temperature) pairs used by the agents, built eagerly by warm_llm_clients()
+MODEL_CONFIGS = [
+    (DEFAULT_MODEL, 0.1),
+    ("openai/gpt-oss-120b", 0),
+]
+
+# One ChatGroq per (model, temperature), all sharing one pooled HTTP transport
+_CLIENTS: dict[tuple[str, float], ChatGroq] = {}
+_HTTP: dict[str, httpx.Client | httpx.AsyncClient] = {}
+_LOCK = threading.Lock()
+
+# Set by the offline benchmark to replace Groq with recorded responses: factory(agent, model, temperature)
+_OVERRIDE = None
+
+_HTTP_STATS = {"http2": False, "requests": 0, "new_connections": 0, "tls_handshakes": 0, "http_versions": {}}
+
+
+def _http2_enabled() -> bool:
+    if os.getenv("LLM_HTTP2", "true").lower() not in ("1", "true", "yes"):
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("[LLM] h2 is not installed, falling back to HTTP/1.1 keep-alive")
+        return False
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", 20)),
+        max_keepalive_connections=int(os.getenv("LLM_KEEPALIVE_CONNECTIONS", 10)),
+        keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60)),
+    )
+
+
+def _record_trace(event_name: str):
+    # httpcore only emits these events when it has to open a new connection
+    if event_name == "connection.connect_tcp.complete":
+        _HTTP_STATS["new_connections"] += 1
+    elif event_name == "connection.start_tls.complete":
+        _HTTP_STATS["tls_handshakes"] += 1
+
+
+def _trace(event_name, info):
+    _record_trace(event_name)
+
+
+async def _atrace(event_name, info):
+    _record_trace(event_name)
+
+
+def _record_response(response: httpx.Response):
+    _HTTP_STATS["requests"] += 1
+    versions = _HTTP_STATS["http_versions"]
+    versions[response.http_version] = versions.get(response.http_version, 0) + 1
+
+
+def _on_request(request: httpx.Request):
+    request.extensions["trace"] = _trace
+
+
+async def _aon_request(request: httpx.Request):
+    request.extensions["trace"] = _atrace
+
+
+async def _aon_response(response: httpx.Response):
+    _record_response(response)
+
+
+def _http_clients() -> tuple[httpx.Client, httpx.AsyncClient]:
+    """Process-wide keep-alive HTTP clients handed to every Groq client."""
+    if not _HTTP:
+        http2 = _http2_enabled()
+        _HTTP_STATS["http2"] = http2
+        _HTTP["sync"] = httpx.Client(
+            http2=http2, limits=_http_limits(),
+            event_hooks={"request": [_on_request], "response": [_record_response]}
+        )
+        _HTTP["async"] = httpx.AsyncClient(
+            http2=http2, limits=_http_limits(),
+            event_hooks={"request": [_aon_request], "response": [_aon_response]}
+        )
+    return _HTTP["sync"], _HTTP["async"]
+
+
+def _client(model: str, temperature: float) -> ChatGroq:
+    key = (model, float(temperature))
+    client = _CLIENTS.get(key)
+    if client is not None:
+        return client
+
     groq_api_key = os.getenv("GROQ_API_KEY")
     if not groq_api_key:
         raise ValueError("GROQ_API_KEY environment variable is not set")
-    
-    os.environ["GROQ_API_KEY"] = groq_api_key
-    # Default model for most agents
-    return ChatGroq(model="llama-3.3-70b-versatile", temperature=0.1)
+
+    with _LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            http_client, http_async_client = _http_clients()
+            client = ChatGroq(
+                model=model,
+                temperature=temperature,
+                api_key=groq_api_key,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+            _CLIENTS[key] = client
+    return client
+
+
+def get_llm(agent: str = "default", model: str = DEFAULT_MODEL, temperature: float = 0.1):
+    """
+    Chat model for one agent. Responses are cached on (model, temperature, prompt, bound
+    schema), so identical prompts, e.g. planner retries, are answered without calling Groq.
+    Token usage is booked on the ledger under `agent`. The underlying Groq client and its
+    HTTP connections are shared per (model, temperature).
+    """
+    client = _OVERRIDE(agent, model, temperature) if _OVERRIDE else _client(model, temperature)
+    # Shallow copy: per-agent cache, token accounting and timing without rebuilding the Groq client
+    update = {"callbacks": [usage_callback(agent), llm_timing_callback(agent)]}
+    cache = cache_for(agent)
+    if cache is not None:
+        update["cache"] = cache
+    return client.model_copy(update=update)
+
+
+def set_llm_override(factory=None):
+    """
+    Routes every get_llm call to factory(agent, model, temperature) instead of Groq; None restores
+    Groq. The caches and accounting callbacks are still attached to whatever the factory returns.
+    """
+    global _OVERRIDE
+    _OVERRIDE = factory
+
 
 def get_llm_llama():
     return get_llm()
+
+
+def warm_llm_clients():
+    """Builds the clients for every configured model at startup."""
+    for model, temperature in MODEL_CONFIGS:
+        _client(model, temperature)
+    print(f"[LLM] {len(_CLIENTS)} Groq clients ready (http2={_HTTP_STATS['http2']})")
+
+
+def llm_client_stats() -> dict:
+    """Completed request count and how many connections had to be opened for them."""
+    requests = _HTTP_STATS["requests"]
+    return {
+        "clients": [f"{model}@{temperature}" for model, temperature in _CLIENTS],
+        **_HTTP_STATS,
+        "connection_reuse_rate": round(1 - _HTTP_STATS["new_connections"] / requests, 4) if requests else 0.0,
+    }
+
+
+async def close_llm_clients():
+    """Closes the shared HTTP connections. Called on application shutdown."""
+    http = dict(_HTTP)
+    _HTTP.clear()
+    _CLIENTS.clear()
+    if "sync" in http:
+        http["sync"].close()
+    if "async" in http:
+        await http["async"].aclose()
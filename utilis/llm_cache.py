@@ -0,0 +1,156 @@
+import os
+import threading
+from collections import OrderedDict, defaultdict
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+
+from utilis.executor import run_blocking
+
+
+class LayeredLLMCache:
+    """
+    Process-wide LLM response store: a bounded in-memory LRU in front of an optional
+    SQLite file shared by every worker process. Keys are LangChain's (prompt, llm_string)
+    pair; llm_string already encodes the model, temperature and any bound tools or
+    structured-output schema.
+    """
+
+    def __init__(self, max_size: int = 1024, sqlite_path: str | None = None):
+        self.max_size = max_size
+        self._memory: OrderedDict[tuple[str, str], RETURN_VAL_TYPE] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = None
+        if sqlite_path:
+            try:
+                from langchain_community.cache import SQLiteCache
+                os.makedirs(os.path.dirname(os.path.abspath(sqlite_path)), exist_ok=True)
+                self._disk = SQLiteCache(database_path=sqlite_path)
+                print(f"[LLM CACHE] Using SQLite tier at {sqlite_path}")
+            except Exception as e:
+                print(f"[LLM CACHE] SQLite tier disabled: {e}")
+
+    @property
+    def persistent(self) -> bool:
+        return self._disk is not None
+
+    def memory_get(self, key: tuple[str, str]) -> RETURN_VAL_TYPE | None:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+            return value
+
+    def memory_put(self, key: tuple[str, str], value: RETURN_VAL_TYPE):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def disk_get(self, key: tuple[str, str]) -> RETURN_VAL_TYPE | None:
+        if self._disk is None:
+            return None
+        try:
+            return self._disk.lookup(*key)
+        except Exception as e:
+            print(f"[LLM CACHE] SQLite lookup failed: {e}")
+            return None
+
+    def disk_put(self, key: tuple[str, str], value: RETURN_VAL_TYPE):
+        if self._disk is None:
+            return
+        try:
+            self._disk.update(*key, value)
+        except Exception as e:
+            print(f"[LLM CACHE] SQLite write failed: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def size(self) -> int:
+        return len(self._memory)
+
+
+class AgentLLMCache(BaseCache):
+    """LangChain cache handed to one agent's model; counts hits per agent and delegates storage."""
+
+    def __init__(self, store: LayeredLLMCache, agent: str):
+        self.store = store
+        self.agent = agent
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = (prompt, llm_string)
+        value = self.store.memory_get(key)
+        if value is not None:
+            _count(self.agent, "memory_hits")
+            return value
+        return self._disk_lookup(key)
+
+    async def alookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = (prompt, llm_string)
+        value = self.store.memory_get(key)
+        if value is not None:
+            _count(self.agent, "memory_hits")
+            return value
+        if not self.store.persistent:
+            _count(self.agent, "misses")
+            return None
+        return await run_blocking(self._disk_lookup, key)
+
+    def _disk_lookup(self, key: tuple[str, str]) -> RETURN_VAL_TYPE | None:
+        value = self.store.disk_get(key)
+        if value is None:
+            _count(self.agent, "misses")
+            return None
+        self.store.memory_put(key, value)
+        _count(self.agent, "disk_hits")
+        return value
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = (prompt, llm_string)
+        self.store.memory_put(key, return_val)
+        self.store.disk_put(key, return_val)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = (prompt, llm_string)
+        self.store.memory_put(key, return_val)
+        if self.store.persistent:
+            await run_blocking(self.store.disk_put, key, return_val)
+
+    def clear(self, **kwargs) -> None:
+        self.store.clear()
+
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+llm_cache = LayeredLLMCache(
+    max_size=int(os.getenv("LLM_CACHE_SIZE", 1024)),
+    sqlite_path=os.getenv("LLM_CACHE_SQLITE") or None,
+)
+
+_STATS: dict[str, dict[str, int]] = defaultdict(lambda: {"memory_hits": 0, "disk_hits": 0, "misses": 0})
+_STATS_LOCK = threading.Lock()
+
+
+def _count(agent: str, field: str):
+    with _STATS_LOCK:
+        _STATS[agent][field] += 1
+
+
+def cache_for(agent: str) -> AgentLLMCache | None:
+    """Cache to pass as `cache=` to an agent's chat model, or None when caching is disabled."""
+    return AgentLLMCache(llm_cache, agent) if LLM_CACHE_ENABLED else None
+
+
+def llm_cache_stats() -> dict:
+    """Per-agent hit counters and hit rate, plus the size of the in-memory tier."""
+    with _STATS_LOCK:
+        agents = {}
+        for agent, counts in _STATS.items():
+            lookups = sum(counts.values())
+            hits = counts["memory_hits"] + counts["disk_hits"]
+            agents[agent] = {**counts, "hit_rate": round(hits / lookups, 4) if lookups else 0.0}
+    return {"enabled": LLM_CACHE_ENABLED, "size": llm_cache.size(), "agents": agents}
@@ -0,0 +1,255 @@
+import bisect
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from utilis.request_context import current_trace
+from utilis.token_usage import token_ledger
+
+PREFIX = "sql_agent"
+
+# Seconds; LLM calls and planner retries sit in the upper buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# LLM / DB seconds spent inside the node currently running in this task
+_span: ContextVar[dict | None] = ContextVar("node_span", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple, buckets: tuple = BUCKETS):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, *values):
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                # [per-bucket counts (+Inf last), sum, count]
+                series = self._series[values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, values)} {total:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.labels, values)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple):
+        self.name = f"{PREFIX}_{name}"
+        self.help = help_text
+        self.labels = labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values, amount: float = 1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, values)} {value:g}")
+        return lines
+
+
+NODE_SECONDS = Histogram("node_duration_seconds", "Wall time of one graph node run.", ("graph", "node", "outcome"))
+NODE_LLM_SECONDS = Histogram("node_llm_seconds", "LLM time of node runs that called the LLM.", ("graph", "node"))
+NODE_DB_SECONDS = Histogram("node_db_seconds", "Database time of node runs that queried Postgres.", ("graph", "node"))
+NODE_RETRIES = Counter("node_retries_total", "Node runs beyond the first within one request.", ("graph", "node"))
+LLM_SECONDS = Histogram("llm_duration_seconds", "Latency of one LLM call, cache hits included.", ("agent",))
+DB_SECONDS = Histogram("db_duration_seconds", "Latency of one database operation.", ("operation",))
+REQUEST_SECONDS = Histogram("request_duration_seconds", "End-to-end /query latency.", ("outcome",))
+REPAIRS = Counter("repairs_total", "Repair attempts by failure kind and strategy; exhausted = nothing left within budget.", ("kind", "strategy"))
+
+REGISTRY = [NODE_SECONDS, NODE_LLM_SECONDS, NODE_DB_SECONDS, NODE_RETRIES, LLM_SECONDS, DB_SECONDS, REQUEST_SECONDS, REPAIRS]
+
+
+def _add_to_span(key: str, seconds: float):
+    # Also counts towards the enclosing nodes, e.g. the main "planner" node around the planner subgraph
+    span = _span.get()
+    while span is not None:
+        span[key] += seconds
+        span = span["parent"]
+
+
+@contextmanager
+def db_timer(operation: str):
+    """Times a database round trip for the db_duration histogram and the running node."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        DB_SECONDS.observe(elapsed, operation)
+        _add_to_span("db", elapsed)
+
+
+class LLMTimingCallback(BaseCallbackHandler):
+    """Attached to each agent's model by get_llm; times every call by run id."""
+
+    run_inline = True
+
+    def __init__(self, agent: str):
+        self.agent = agent
+        self._started: dict = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def _finish(self, run_id):
+        start = self._started.pop(run_id, None)
+        if start is not None:
+            elapsed = time.perf_counter() - start
+            LLM_SECONDS.observe(elapsed, self.agent)
+            _add_to_span("llm", elapsed)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+
+_CALLBACKS: dict[str, LLMTimingCallback] = {}
+
+
+def llm_timing_callback(agent: str) -> LLMTimingCallback:
+    callback = _CALLBACKS.get(agent)
+    if callback is None:
+        callback = _CALLBACKS[agent] = LLMTimingCallback(agent)
+    return callback
+
+
+def _outcome(update) -> str:
+    # Nodes report recoverable failures (invalid SQL, rejected plan, DB error) through "error"
+    if isinstance(update, dict) and update.get("error"):
+        return "failed"
+    return "ok"
+
+
+def _record(graph: str, name: str, elapsed: float, span: dict, outcome: str):
+    NODE_SECONDS.observe(elapsed, graph, name, outcome)
+    if span["llm"]:
+        NODE_LLM_SECONDS.observe(span["llm"], graph, name)
+    if span["db"]:
+        NODE_DB_SECONDS.observe(span["db"], graph, name)
+
+    trace = current_trace()
+    if trace is None:
+        return
+    key = name if graph == "main" else f"{graph}.{name}"
+    entry = trace["nodes"].setdefault(key, {"runs": 0, "ms": 0.0, "llm_ms": 0.0, "db_ms": 0.0, "outcome": outcome})
+    if entry["runs"]:
+        NODE_RETRIES.inc(graph, name)
+    entry["runs"] += 1
+    entry["ms"] = round(entry["ms"] + elapsed * 1000, 1)
+    entry["llm_ms"] = round(entry["llm_ms"] + span["llm"] * 1000, 1)
+    entry["db_ms"] = round(entry["db_ms"] + span["db"] * 1000, 1)
+    entry["outcome"] = outcome
+
+
+def instrument_node(name: str, node, graph: str = "main"):
+    """
+    Wraps a graph node (sync or async) to record its wall time, the LLM and DB time inside it,
+    retries within the request and the outcome, both in the histograms and the request's trace.
+    """
+    if inspect.iscoroutinefunction(node):
+        async def wrapper(state):
+            span = {"llm": 0.0, "db": 0.0, "parent": _span.get()}
+            token = _span.set(span)
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                update = await node(state)
+                outcome = _outcome(update)
+                return update
+            finally:
+                _span.reset(token)
+                _record(graph, name, time.perf_counter() - start, span, outcome)
+    else:
+        def wrapper(state):
+            span = {"llm": 0.0, "db": 0.0, "parent": _span.get()}
+            token = _span.set(span)
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                update = node(state)
+                outcome = _outcome(update)
+                return update
+            finally:
+                _span.reset(token)
+                _record(graph, name, time.perf_counter() - start, span, outcome)
+    wrapper.__name__ = getattr(node, "__name__", name)
+    return wrapper
+
+
+def request_timings(state_timings: dict | None = None, outcome: str = "ok") -> dict:
+    """
+    Timing breakdown for the /query response: end-to-end milliseconds, per-node runs and
+    LLM/DB share, and the step timings nodes reported themselves (e.g. the speculative branch).
+    Also feeds the request_duration histogram.
+    """
+    trace = current_trace()
+    if trace is None:
+        return {"steps": state_timings or {}}
+    total = time.perf_counter() - trace["started"]
+    REQUEST_SECONDS.observe(total, outcome)
+    return {
+        "total_ms": round(total * 1000, 1),
+        "nodes": trace["nodes"],
+        "steps": state_timings or {},
+    }
+
+
+def _token_lines() -> list[str]:
+    name = f"{PREFIX}_llm_tokens_total"
+    lines = [f"# HELP {name} Tokens reported by Groq per agent.", f"# TYPE {name} counter"]
+    for agent, totals in sorted(token_ledger.snapshot_stats()["by_agent"].items()):
+        for kind in ("prompt", "completion"):
+            lines.append(f"{name}{_labels(('agent', 'kind'), (agent, kind))} {totals[f'{kind}_tokens']}")
+    return lines
+
+
+def render_prometheus() -> str:
+    """Every metric in the Prometheus text exposition format, served on /metrics."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(_token_lines())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,31 @@
+import time
+import uuid
+from contextvars import ContextVar
+
+# Set by the /query handlers. LangGraph and LangChain copy the context into every node task
+# and callback, so anything running on behalf of a request can find out which one it is.
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+thread_id_var: ContextVar[str | None] = ContextVar("thread_id", default=None)
+# Mutable per-request record shared by every task of the request (the context copies hold the same dict)
+request_trace_var: ContextVar[dict | None] = ContextVar("request_trace", default=None)
+
+
+def start_request(thread_id: str) -> str:
+    """Tags the current request with a fresh id and its conversation thread."""
+    request_id = uuid.uuid4().hex
+    request_id_var.set(request_id)
+    thread_id_var.set(thread_id)
+    request_trace_var.set({"started": time.perf_counter(), "nodes": {}})
+    return request_id
+
+
+def current_request_id() -> str | None:
+    return request_id_var.get()
+
+
+def current_thread_id() -> str | None:
+    return thread_id_var.get()
+
+
+def current_trace() -> dict | None:
+    return request_trace_var.get()
@@ -0,0 +1,144 @@
+import os
+import threading
+from collections import OrderedDict, defaultdict
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from utilis.request_context import current_request_id, current_thread_id
+
+# Rough size of a token for budgeting prompt sections before they are sent
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _empty() -> dict:
+    return {"calls": 0, "cached_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+
+def _add(totals: dict, prompt: int, completion: int, cached: bool):
+    totals["calls"] += 1
+    totals["cached_calls"] += int(cached)
+    totals["prompt_tokens"] += prompt
+    totals["completion_tokens"] += completion
+
+
+class TokenLedger:
+    """
+    Prompt and completion tokens reported by Groq, per agent (process lifetime), per request
+    and per conversation thread. Requests and threads are kept in bounded LRUs.
+    """
+
+    def __init__(self, max_requests: int = 1024, max_threads: int = 1024):
+        self.max_requests = max_requests
+        self.max_threads = max_threads
+        self.by_agent: dict[str, dict] = defaultdict(_empty)
+        self._requests: OrderedDict[str, dict] = OrderedDict()
+        self._threads: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bucket(self, store: OrderedDict, key: str, max_size: int) -> dict:
+        bucket = store.get(key)
+        if bucket is None:
+            bucket = store[key] = {**_empty(), "by_agent": defaultdict(_empty)}
+            while len(store) > max_size:
+                store.popitem(last=False)
+        store.move_to_end(key)
+        return bucket
+
+    def record(self, agent: str, prompt: int, completion: int, cached: bool = False,
+               request_id: str | None = None, thread_id: str | None = None):
+        with self._lock:
+            _add(self.by_agent[agent], prompt, completion, cached)
+            for store, key, max_size in ((self._requests, request_id, self.max_requests),
+                                         (self._threads, thread_id, self.max_threads)):
+                if key:
+                    bucket = self._bucket(store, key, max_size)
+                    _add(bucket, prompt, completion, cached)
+                    _add(bucket["by_agent"][agent], prompt, completion, cached)
+
+    @staticmethod
+    def _copy(bucket: dict | None) -> dict:
+        if bucket is None:
+            return {**_empty(), "by_agent": {}}
+        return {**bucket, "by_agent": {agent: dict(t) for agent, t in bucket["by_agent"].items()}}
+
+    def for_request(self, request_id: str | None) -> dict:
+        with self._lock:
+            return self._copy(self._requests.get(request_id))
+
+    def for_thread(self, thread_id: str | None) -> dict:
+        with self._lock:
+            return self._copy(self._threads.get(thread_id))
+
+    def snapshot_stats(self) -> dict:
+        with self._lock:
+            totals = _empty()
+            for agent_totals in self.by_agent.values():
+                for key in totals:
+                    totals[key] += agent_totals[key]
+            return {
+                **totals,
+                "by_agent": {agent: dict(t) for agent, t in self.by_agent.items()},
+                "tracked_requests": len(self._requests),
+                "tracked_threads": len(self._threads),
+            }
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Attached to each agent's model by get_llm; books every completion on the ledger."""
+
+    run_inline = True
+
+    def __init__(self, ledger: TokenLedger, agent: str):
+        self.ledger = ledger
+        self.agent = agent
+
+    def on_llm_end(self, response: LLMResult, **kwargs):
+        prompt = completion = 0
+        cached = False
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if not usage:
+                    continue
+                if "total_cost" in usage:
+                    # LangChain zeroes the cost of responses served from the LLM cache
+                    cached = True
+                    continue
+                prompt += usage.get("input_tokens", 0)
+                completion += usage.get("output_tokens", 0)
+        if not (prompt or completion or cached):
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt = token_usage.get("prompt_tokens", 0)
+            completion = token_usage.get("completion_tokens", 0)
+        self.ledger.record(
+            self.agent, prompt, completion, cached,
+            request_id=current_request_id(), thread_id=current_thread_id(),
+        )
+
+
+token_ledger = TokenLedger(
+    max_requests=int(os.getenv("TOKEN_LEDGER_REQUESTS", 1024)),
+    max_threads=int(os.getenv("TOKEN_LEDGER_THREADS", 1024)),
+)
+
+_CALLBACKS: dict[str, TokenUsageCallback] = {}
+
+
+def usage_callback(agent: str) -> TokenUsageCallback:
+    callback = _CALLBACKS.get(agent)
+    if callback is None:
+        callback = _CALLBACKS[agent] = TokenUsageCallback(token_ledger, agent)
+    return callback
+
+
+def token_usage_summary(thread_id: str | None = None) -> dict:
+    """Token totals of the current request and of its conversation thread."""
+    return {
+        "request": token_ledger.for_request(current_request_id()),
+        "thread": token_ledger.for_thread(thread_id or current_thread_id()),
+    }